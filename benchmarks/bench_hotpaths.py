@@ -0,0 +1,286 @@
+###############################################
+#      bench_hotpaths                         #
+# Throughput and peak memory of the skyobj    #
+# hot paths at scalar to catalog sizes, with  #
+# a JSON record to compare later runs to.     #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import tangentPlaneUtils as tp
+import closestApproach as ca
+import microlens as m
+from skyobj import skyobj, skyobjView, SKYOBJ_DTYPE
+from skycatalog import skycatalog
+
+
+SIZES = {'scalar' : 1, '1e3' : 10**3, '1e6' : 10**6, 'catalog' : 10**7}
+
+# Shortest total time of one timing sample [s], fast
+# calls are repeated until they take at least this long.
+MIN_SAMPLE = 0.05
+
+# Time after which a slow case stops taking more
+# samples [s]
+MAX_CASE_TIME = 5.0
+
+# Default slowdown over the baseline counted as a
+# regression.
+THRESHOLD = 1.25
+
+
+def _lens():
+	#LAWD 37, as in the skyobj demo
+	return skyobj(id=1, ra=176.4549073, dec=-64.84295714, pmra=2662.03572627,
+		pmdec=-345.18255501, parallax=215.782333, epoch=2015.0, Gmag=11.4)
+
+
+def _source():
+	return skyobj(id=2, ra=176.46360456, dec=-64.84329779, pmra=-19.5,
+		pmdec=-17.89999962, epoch=2015.0, Gmag=18.2)
+
+
+def _positions(n, rng):
+	#n positions within 10 arcsec of the LAWD 37 field
+	ra = 176.4549073 + rng.uniform(-10.0, 10.0, n) / 3600.0
+	dec = -64.84295714 + rng.uniform(-10.0, 10.0, n) / 3600.0
+	return ra, dec
+
+
+def _epochs(n):
+	return np.linspace(ca.GAIA_MISSION[0], ca.GAIA_MISSION[1], n) if n > 1 else 2019.5
+
+
+def _pairs(n, rng):
+	#n lens-source pairs drawn around the LAWD 37 event
+	lenses = skycatalog(ra=np.full(n, 176.4549073), dec=np.full(n, -64.84295714),
+		epoch=2015.0, pmra=2662.0 + rng.normal(0.0, 10.0, n),
+		pmdec=-345.2 + rng.normal(0.0, 10.0, n), parallax=np.full(n, 215.8))
+	ra, dec = _positions(n, rng)
+	sources = skycatalog(ra=ra, dec=dec, epoch=2015.0, pmra=rng.normal(0.0, 5.0, n),
+		pmdec=rng.normal(0.0, 5.0, n), parallax=rng.uniform(0.0, 1.0, n))
+	return lenses, sources
+
+
+# Each case builds the call to time at size n. cap is
+# the largest size run, above it the case is skipped.
+# unit is what n counts.
+def _s2tp(n, rng):
+	ra, dec = _positions(n, rng)
+	return lambda: tp.s2tp(ra, dec, 176.4549073, -64.84295714)
+
+
+def _tp2s(n, rng):
+	xi, eta = rng.uniform(-1e4, 1e4, (2, n))
+	return lambda: tp.tp2s(xi, eta, 176.4549073, -64.84295714)
+
+
+def _RdotW(n, rng):
+	ra, dec = _positions(n, rng)
+	mjd = tp.decimalYear2mjd(2019.5)
+	return lambda: tp.RdotW(mjd, ra)
+
+
+def _RdotN(n, rng):
+	ra, dec = _positions(n, rng)
+	mjd = tp.decimalYear2mjd(2019.5)
+	return lambda: tp.RdotN(mjd, ra, dec)
+
+
+def _getXiEta(n, rng):
+	lens, epochs = _lens(), _epochs(n)
+	return lambda: lens.getXiEta(epochs)
+
+
+def _getSeparation(n, rng):
+	lens, source, epochs = _lens(), _source(), _epochs(n)
+	return lambda: lens.getSeparation(epochs, source)
+
+
+def _getMinTime(n, rng):
+	lens = _lens()
+	ra, dec = _positions(n, rng)
+	sources = [skyobj(ra=ra[i], dec=dec[i], epoch=2015.0) for i in range(n)]
+	return lambda: [lens.getMinTime(s) for s in sources]
+
+
+def _getMinDist(n, rng):
+	lens = _lens()
+	ra, dec = _positions(n, rng)
+	sources = [skyobj(ra=ra[i], dec=dec[i], epoch=2015.0) for i in range(n)]
+	return lambda: [lens.getMinDist(s) for s in sources]
+
+
+def _batchMinApproach(n, rng):
+	lenses, sources = _pairs(n, rng)
+	rows = np.arange(n)
+	return lambda: ca.batchMinApproach(lenses, sources, rows, rows, 2019.0, 2021.0)
+
+
+def _centroidShift(n, rng):
+	dist = rng.uniform(5.0, 100.0, n)
+	sep = rng.uniform(10.0, 1000.0, n)
+	return lambda: m.get_centroid_shift(0.5, dist, sep)
+
+
+def _eventTable(n, rng):
+	dist = rng.uniform(5.0, 100.0, n)
+	sep = rng.uniform(10.0, 1000.0, n)
+	pm = rng.uniform(100.0, 3000.0, n)
+	return lambda: m.get_event_table(0.5, dist, sep, lensPmMag=pm, accuracy=0.1)
+
+
+def _skyobjCreate(n, rng):
+	ra, dec = _positions(n, rng)
+	ra, dec = ra.tolist(), dec.tolist()
+	return lambda: [skyobj(id=i, ra=ra[i], dec=dec[i], epoch=2015.0, pmra=1.0, pmdec=1.0,
+		parallax=1.0, Gmag=15.0) for i in range(n)]
+
+
+def _skyobjViewCreate(n, rng):
+	ra, dec = _positions(n, rng)
+	def create():
+		records = np.zeros(n, dtype=SKYOBJ_DTYPE)
+		records['ra_0'] = ra
+		records['dec_0'] = dec
+		return records, skyobjView.views(records)
+	return create
+
+
+CASES = [
+	# name, build, cap, unit
+	('s2tp', _s2tp, None, 'positions'),
+	('tp2s', _tp2s, None, 'positions'),
+	('RdotW', _RdotW, None, 'stars'),
+	('RdotN', _RdotN, None, 'stars'),
+	('skyobj.getXiEta', _getXiEta, 10**6, 'epochs'),
+	('skyobj.getSeparation', _getSeparation, 10**6, 'epochs'),
+	('skyobj.getMinTime', _getMinTime, 10**3, 'pairs'),
+	('skyobj.getMinDist', _getMinDist, 10**3, 'pairs'),
+	('batchMinApproach', _batchMinApproach, 10**5, 'pairs'),
+	('get_centroid_shift', _centroidShift, None, 'pairs'),
+	('get_event_table', _eventTable, None, 'pairs'),
+	('skyobj.create', _skyobjCreate, 10**6, 'objects'),
+	('skyobjView.create', _skyobjViewCreate, 10**6, 'objects'),
+]
+
+
+def measure(call, repeat=5):
+	"""Median wall time [s] of one call, and the peak
+	memory [bytes] traced during a separate call."""
+	t = time.perf_counter()
+	call()
+	first = time.perf_counter() - t
+
+	#repeat fast calls so a sample outlasts the timer
+	number = 1
+	while first * number < MIN_SAMPLE and number < 2**20:
+		number *= 2
+
+	#slow calls are not repeated past MAX_CASE_TIME
+	times = []
+	total = 0.0
+	while len(times) < repeat and (not times or total < MAX_CASE_TIME):
+		t = time.perf_counter()
+		for i in range(number):
+			call()
+		t = time.perf_counter() - t
+		total += t
+		times.append(t / number)
+	times.sort()
+
+	tracemalloc.start()
+	call()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	return times[len(times) // 2], peak
+
+
+def run(cases, sizes, repeat=5, seed=0):
+	"""Run every case at every size, returning
+	{case : {size : record}}."""
+	results = {}
+	for name, build, cap, unit in CASES:
+		if cases and name not in cases:
+			continue
+		results[name] = {}
+		for size in sizes:
+			n = SIZES[size]
+			if cap is not None and n > cap:
+				continue
+			call = build(n, np.random.RandomState(seed))
+			seconds, peak = measure(call, repeat)
+			results[name][size] = {'n' : n, 'unit' : unit, 'seconds' : seconds,
+				'throughput' : n / seconds, 'peak_bytes' : peak, 'bytes_per_item' : peak / n}
+			print('%-22s %-8s %12.3e s %12.3e %s/s %10.1f MB %8.0f B/item' % (name, size,
+				seconds, n / seconds, unit, peak / 2.0**20, peak / float(n)))
+			sys.stdout.flush()
+	return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+	"""(case, size, ratio) of every result slower than
+	threshold times its baseline."""
+	slower = []
+	for name, bySize in results.items():
+		for size, record in bySize.items():
+			base = baseline.get(name, {}).get(size)
+			if base is None:
+				continue
+			ratio = record['seconds'] / base['seconds']
+			if ratio > threshold:
+				slower.append((name, size, ratio))
+	return slower
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the skyobj hot paths.')
+	parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['scalar', '1e3',
+		'1e6', 'catalog'])
+	parser.add_argument('--cases', nargs='+', default=None,
+		help='run only these cases, e.g. s2tp skyobj.getMinTime')
+	parser.add_argument('--catalog-size', type=int, default=SIZES['catalog'])
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--output', help='write the results as JSON')
+	parser.add_argument('--baseline', help='JSON of an earlier run to compare with')
+	parser.add_argument('--threshold', type=float, default=THRESHOLD,
+		help='fail when a case is this many times slower than the baseline')
+	args = parser.parse_args(argv)
+
+	SIZES['catalog'] = args.catalog_size
+	order = ['scalar', '1e3', '1e6', 'catalog']
+	sizes = [s for s in order if s in args.sizes]
+
+	results = run(args.cases, sizes, args.repeat)
+
+	if args.output:
+		record = {'python' : platform.python_version(), 'numpy' : np.__version__,
+			'machine' : platform.machine(), 'results' : results}
+		with open(args.output, 'w') as f:
+			json.dump(record, f, indent=1, sort_keys=True)
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = json.load(f)['results']
+		slower = compare(results, baseline, args.threshold)
+		for name, size, ratio in slower:
+			print('REGRESSION %s %s %.2fx slower' % (name, size, ratio))
+		return 1 if slower else 0
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,75 @@
+###############################################
+#      bench_import                           #
+# Import latency of the skyobj modules, each  #
+# timed in a fresh interpreter as a worker    #
+# process would see it.                       #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['skyobj', 'skycatalog', 'tangentPlaneUtils', 'microlens',
+	'closestApproach', 'pairFinder', 'candidateSearch', 'catalogIO',
+	'eventSweep', 'streamSearch', 'resultStore', 'screening',
+	'profiling', 'predictionService', 'sharedPool',
+	'eventIndex', 'lightcurve', 'fitting']
+
+# dependencies that should only be imported when used
+HEAVY = ['astropy', 'scipy', 'matplotlib']
+
+_SNIPPET = """
+import json, sys, time
+t = time.perf_counter()
+import %s
+t = time.perf_counter() - t
+sys.stdout.write(json.dumps([t, [k for k in %r if k in sys.modules]]))
+"""
+
+
+def timeImport(module, repeat=5):
+	"""Median wall time [s] to import module in a new
+	interpreter, and the heavy dependencies it loaded."""
+	times = []
+	for i in range(repeat):
+		out = subprocess.check_output([sys.executable, '-c', _SNIPPET % (module, HEAVY)],
+			cwd=ROOT, universal_newlines=True)
+		t, loaded = json.loads(out)
+		times.append(t)
+	times.sort()
+	return times[len(times) // 2], loaded
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Time the import of each module.')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--output', help='write the results as JSON')
+	parser.add_argument('--max-ms', type=float, default=None,
+		help='fail if any module takes longer than this to import')
+	args = parser.parse_args(argv)
+
+	results = {}
+	failed = False
+	for module in MODULES:
+		t, loaded = timeImport(module, args.repeat)
+		results[module] = {'seconds' : t, 'heavy_imports' : loaded}
+		slow = args.max_ms is not None and t * 1000.0 > args.max_ms
+		failed = failed or slow or bool(loaded)
+		print('%-20s %8.1f ms %s%s' % (module, t * 1000.0, ' '.join(loaded),
+			'  SLOW' if slow else ''))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=1, sort_keys=True)
+
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
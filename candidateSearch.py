@@ -0,0 +1,460 @@
+###############################################
+#      candidateSearch                        #
+# Command line search for astrometric         #
+# microlensing events between a lens and a    #
+# source catalog, sharded over HEALPix pixels #
+# and run on a pool of processes.             #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import catalogIO
+import closestApproach as ca
+import pairFinder as pf
+import profiling as prof
+import screening as sc
+import microlens as m
+from skycatalog import skycatalog
+
+
+# Accepted column names for each skycatalog argument,
+# skyobj names first, then Gaia archive names.
+COLUMNS = {
+	'id' : ('id', 'source_id'),
+	'ra' : ('ra',),
+	'dec' : ('dec',),
+	'epoch' : ('epoch', 'ref_epoch'),
+	'pmra' : ('pmra',),
+	'pmdec' : ('pmdec',),
+	'parallax' : ('parallax',),
+	'Gmag' : ('Gmag', 'phot_g_mean_mag'),
+}
+
+RESULT_DTYPE = [('lens_id', 'i8'), ('source_id', 'i8'), ('t_min', 'f8'),
+	('min_sep', 'f8'), ('pos_angle', 'f8'), ('centroid_shift', 'f8')]
+
+
+def _readColumns(path):
+	# dict of column name -> array for a CSV, Parquet
+	# or FITS table.
+	ext = os.path.splitext(path)[1].lower()
+	if ext in ('.fits', '.fit', '.fz'):
+		from astropy.io import fits
+		data = fits.getdata(path, 1)
+		return dict((name, np.asarray(data[name])) for name in data.columns.names)
+	if ext in ('.parquet', '.pq'):
+		try:
+			import pyarrow.parquet as pq
+		except ImportError:
+			raise ImportError('reading Parquet catalogs requires pyarrow')
+		table = pq.read_table(path)
+		return dict((name, table.column(name).to_numpy()) for name in table.column_names)
+
+	data = np.genfromtxt(path, delimiter=',', names=True, dtype=None, encoding='utf-8')
+	return dict((name, np.atleast_1d(data[name])) for name in data.dtype.names)
+
+
+def readCatalog(path, epoch=None):
+	"""Read a CSV, Parquet or FITS table into a skycatalog.
+
+	Columns are matched by the names in COLUMNS, only ra
+	and dec are required. A directory written by
+	catalogIO.writeCatalog is opened memory mapped
+	instead of parsed.
+
+	Args:
+	   path (str) : Catalog file.
+
+	   epoch (float, optional) : Reference epoch used when
+				     the table has no epoch
+				     column [Decimal Years]
+
+	Returns:
+	   catalog (skycatalog)
+	"""
+
+	if os.path.isdir(path):
+		return catalogIO.openCatalog(path)
+
+	columns = _readColumns(path)
+	kwargs = {'epoch' : epoch}
+	for arg, names in COLUMNS.items():
+		for name in names:
+			if name in columns:
+				kwargs[arg] = columns[name]
+				break
+
+	if 'ra' not in kwargs or 'dec' not in kwargs:
+		raise ValueError('%s has no ra/dec columns' % path)
+	if kwargs['epoch'] is None:
+		raise ValueError('%s has no epoch column, pass --epoch' % path)
+
+	return skycatalog(**kwargs)
+
+
+def _spreadBits(v):
+	# interleave the bits of v with zeros
+	v = v.astype(np.int64)
+	out = np.zeros_like(v)
+	for bit in range(31):
+		out |= ((v >> bit) & 1) << (2 * bit)
+	return out
+
+
+def healpixNest(nside, ra, dec):
+	"""HEALPix pixel number in the NESTED scheme.
+
+	Args:
+	   nside (int) : HEALPix resolution, a power of 2.
+
+	   ra, dec (array) : Equatorial coordinates [Degrees]
+
+	Returns:
+	   pixel (array) : Nested pixel index of each position
+	"""
+
+	z = np.sin(np.radians(dec))
+	za = np.abs(z)
+	tt = np.mod(np.radians(ra) / (0.5 * np.pi), 4.0)
+
+	#equatorial region
+	temp1 = nside * (0.5 + tt)
+	temp2 = nside * z * 0.75
+	jp = (temp1 - temp2).astype(np.int64)
+	jm = (temp1 + temp2).astype(np.int64)
+	ifp = jp // nside
+	ifm = jm // nside
+	eqFace = np.where(ifp == ifm, ifp | 4, np.where(ifp < ifm, ifp, ifm + 8))
+	eqX = jm & (nside - 1)
+	eqY = nside - (jp & (nside - 1)) - 1
+
+	#polar caps
+	ntt = np.minimum(tt.astype(np.int64), 3)
+	tp = tt - ntt
+	tmp = nside * np.sqrt(3.0 * (1.0 - za))
+	pjp = np.minimum((tp * tmp).astype(np.int64), nside - 1)
+	pjm = np.minimum(((1.0 - tp) * tmp).astype(np.int64), nside - 1)
+	north = z >= 0
+	polFace = np.where(north, ntt, ntt + 8)
+	polX = np.where(north, nside - pjm - 1, pjp)
+	polY = np.where(north, nside - pjp - 1, pjm)
+
+	equatorial = za <= 2.0 / 3.0
+	face = np.where(equatorial, eqFace, polFace)
+	ix = np.where(equatorial, eqX, polX)
+	iy = np.where(equatorial, eqY, polY)
+
+	return face * nside * nside + _spreadBits(ix) + (_spreadBits(iy) << 1)
+
+
+def _centroidShift(lenses, sources, lensIdx, sourceIdx, minSep, lensMass):
+	# centroid shift at closest approach, the dark lens
+	# equation is used where a magnitude is NaN.
+	return m.get_centroid_shift(lensMass, m.get_dist(lenses.parallax[lensIdx]), minSep,
+		lensMag=lenses.gMag[lensIdx], sourceMag=sources.gMag[sourceIdx])
+
+
+def solvePairs(lenses, sources, lensIdx, sourceIdx, options):
+	"""Closest approach and centroid shift of given
+	lens-source pairs.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs.
+
+	   lensIdx, sourceIdx (array) : Row of the lens and the
+					source of each pair.
+
+	   options (argparse.Namespace) : Search options
+					  (start, end, mass).
+
+	Returns:
+	   events (np.array) : Structured array of RESULT_DTYPE
+	"""
+
+	minTime, minSep, posAngle = ca.batchMinApproach(lenses, sources, lensIdx, sourceIdx,
+		options.start, options.end)
+
+	events = np.zeros(len(lensIdx), dtype=RESULT_DTYPE)
+	events['lens_id'] = lenses.id[lensIdx]
+	events['source_id'] = sources.id[sourceIdx]
+	events['t_min'] = minTime
+	events['min_sep'] = minSep
+	events['pos_angle'] = posAngle
+	events['centroid_shift'] = _centroidShift(lenses, sources, lensIdx, sourceIdx,
+		minSep, options.mass)
+	return events
+
+
+def searchShard(lenses, sources, index, options, counts=None):
+	"""Find the events of one shard of lenses.
+
+	Candidate pairs from the source index are screened
+	(screening.screenPairs) and only the survivors
+	are solved.
+
+	Args:
+	   lenses (skycatalog) : Lenses of the shard.
+
+	   sources (skycatalog) : All sources.
+
+	   index (pairFinder.sourceIndex) : Index of sources.
+
+	   options (argparse.Namespace) : Search options
+					  (start, end, corridor,
+					  mass and optionally
+					  min_shift, the smallest
+					  shift to return).
+
+	   counts (dict, optional) : Running total of the
+				     screening counts, updated
+				     in place.
+
+	Returns:
+	   events (np.array) : Structured array of RESULT_DTYPE
+	"""
+
+	minShift = getattr(options, 'min_shift', 0.0)
+	with prof.timer('search.findPairs'):
+		lensIdx, sourceIdx = pf.findPairs(lenses, sources, options.start, options.end,
+			corridor=options.corridor, index=index)
+	with prof.timer('search.screen'):
+		keep, screened = sc.screenPairs(lenses, sources, lensIdx, sourceIdx, options.start,
+			options.end, maxSep=options.corridor, minShift=minShift, maxMass=options.mass)
+	if counts is not None:
+		sc.addCounts(counts, screened)
+
+	with prof.timer('search.solve'):
+		events = solvePairs(lenses, sources, lensIdx[keep], sourceIdx[keep], options)
+	return events[events['centroid_shift'] >= minShift]
+
+
+def shipCatalog(path, catalog):
+	"""What to send a worker process for a catalog: the
+	path of a skycat directory, which the worker maps
+	itself and so shares its pages whatever the start
+	method, else the catalog, already in memory."""
+	return path if os.path.isdir(path) else catalog
+
+
+def openSources(sources, tStart, tEnd):
+	"""Source catalog and pairFinder.sourceIndex of a
+	worker process.
+
+	Args:
+	   sources (skycatalog or str) : As given by
+					 shipCatalog. A skycat
+					 directory is opened
+					 memory mapped and
+					 indexed from its stored
+					 unit vectors.
+
+	   tStart, tEnd (float) : Search window [Decimal Years]
+
+	Returns:
+	   sources, index (skycatalog,pairFinder.sourceIndex)
+	"""
+
+	xyz = None
+	if isinstance(sources, str):
+		mapped = catalogIO.mappedCatalog(sources)
+		sources, xyz = mapped.catalog, mapped.xyz
+	return sources, pf.sourceIndex(sources, tStart, tEnd, xyz=xyz)
+
+
+# catalogs, source index and options of a worker
+# process, set by _initWorker.
+_worker = {}
+
+
+def _initWorker(lenses, sources, options):
+	if isinstance(lenses, str):
+		lenses = catalogIO.openCatalog(lenses)
+	sources, index = openSources(sources, options.start, options.end)
+	_worker.update(lenses=lenses, sources=sources, index=index, options=options)
+	prof.enable(getattr(options, 'profile', False))
+
+
+def _runShard(pixel, rows, path):
+	# search one shard and checkpoint it to path
+	w = _worker
+	counts = {}
+	prof.reset()
+	events = searchShard(w['lenses'].take(rows), w['sources'], w['index'], w['options'], counts)
+	tmp = path + '.tmp.npy'
+	np.save(tmp, events)
+	os.replace(tmp, path)
+	return pixel, len(events), counts, prof.report()
+
+
+def shardPath(outdir, pixel):
+	"""Checkpoint file of one HEALPix shard."""
+	return os.path.join(outdir, 'shard_%06d.npy' % pixel)
+
+
+# Options the shard checkpoints depend on
+MANIFEST_OPTIONS = ('start', 'end', 'corridor', 'mass', 'min_shift', 'nside')
+
+# Bytes of a column hashed at once by fingerprint
+FINGERPRINT_BLOCK = 1 << 24
+
+
+def fingerprint(path, catalog):
+	"""sha1 of a catalog, for the checkpoint manifest.
+
+	A skycat directory (see catalogIO) is known by its
+	meta.json and the size and modification time of its
+	.npy files, so none of its columns are read. Other
+	catalogs are hashed column by column, a block at a
+	time without a copy.
+
+	Args:
+	   path (str) : Catalog file or directory.
+
+	   catalog (skycatalog) : The catalog read from path.
+
+	Returns:
+	   digest (str)
+	"""
+
+	h = hashlib.sha1()
+	if os.path.isdir(path):
+		with open(os.path.join(path, 'meta.json'), 'rb') as f:
+			h.update(f.read())
+		for name in sorted(os.listdir(path)):
+			if name.endswith('.npy'):
+				st = os.stat(os.path.join(path, name))
+				h.update(('%s %d %d' % (name, st.st_size, st.st_mtime_ns)).encode())
+		return h.hexdigest()
+
+	for name in ('id', 'ra_0', 'dec_0', 'epoch_0', 'pmra', 'pmdec', 'parallax', 'gMag'):
+		col = getattr(catalog, name)
+		step = max(FINGERPRINT_BLOCK // max(col.itemsize, 1), 1)
+		for lo in range(0, len(col), step):
+			h.update(memoryview(np.ascontiguousarray(col[lo:lo + step])))
+	return h.hexdigest()
+
+
+def checkManifest(outdir, manifest):
+	"""Keep the shard checkpoints of outdir only if they
+	were written for the same options and catalogs.
+
+	The manifest is stored as manifest.json next to the
+	shards. Shards without a matching manifest are
+	deleted, then the new manifest is written.
+
+	Returns:
+	   kept (bool) : True if the checkpoints are reused.
+	"""
+
+	path = os.path.join(outdir, 'manifest.json')
+	old = None
+	if os.path.exists(path):
+		with open(path) as f:
+			old = json.load(f)
+	if old == manifest:
+		return True
+
+	for name in os.listdir(outdir):
+		if name.startswith('shard_') and name.endswith('.npy'):
+			os.remove(os.path.join(outdir, name))
+	tmp = path + '.tmp'
+	with open(tmp, 'w') as f:
+		json.dump(manifest, f, indent=1, sort_keys=True)
+	os.replace(tmp, path)
+	return False
+
+
+def run(options):
+	"""Run the full search described by the parsed
+	command line options, returning the ranked events."""
+
+	lenses = readCatalog(options.lenses, options.epoch)
+	sources = readCatalog(options.sources, options.epoch)
+
+	if not os.path.isdir(options.outdir):
+		os.makedirs(options.outdir)
+
+	#checkpoints of another search are not resumed
+	manifest = dict((k, getattr(options, k, None)) for k in MANIFEST_OPTIONS)
+	manifest['lenses'] = fingerprint(options.lenses, lenses)
+	manifest['sources'] = fingerprint(options.sources, sources)
+	if not checkManifest(options.outdir, manifest) and options.verbose:
+		print('options or catalogs changed, starting from scratch')
+
+	#shard lenses by the pixel they sit in mid window,
+	#only those with a positive parallax (a distance)
+	positive = np.nonzero(lenses.parallax > 0)[0]
+	ra, dec = lenses.take(positive).getRaDecNoPlx(0.5 * (options.start + options.end))
+	pixels = healpixNest(options.nside, ra, dec)
+	shards = [(p, positive[pixels == p]) for p in np.unique(pixels)]
+	todo = [(p, rows) for p, rows in shards if not os.path.exists(shardPath(options.outdir, p))]
+
+	#skycat catalogs go to the workers by path, the
+	#source index is built in each
+	initargs = (shipCatalog(options.lenses, lenses), shipCatalog(options.sources, sources),
+		options)
+	with ProcessPoolExecutor(max_workers=options.workers, initializer=_initWorker,
+			initargs=initargs) as pool:
+		futures = [pool.submit(_runShard, p, rows, shardPath(options.outdir, p))
+			for p, rows in todo]
+		reports = []
+		for future in futures:
+			pixel, nEvents, counts, report = future.result()
+			reports.append(report)
+			if options.verbose:
+				print('shard %d: %d events, %d pairs, pruned %s' % (pixel, nEvents,
+					counts['pairs'], ' '.join('%s %d' % (s, counts[s]) for s in sc.STAGES)))
+
+	if getattr(options, 'profile', False):
+		prof.toJSON(os.path.join(options.outdir, 'profile.json'), prof.merge(reports))
+
+	events = np.concatenate([np.zeros(0, dtype=RESULT_DTYPE)] +
+		[np.load(shardPath(options.outdir, p)) for p, rows in shards])
+	events = events[np.argsort(-events['centroid_shift'], kind='stable')]
+
+	np.savetxt(os.path.join(options.outdir, 'candidates.csv'), events, delimiter=',',
+		header=','.join(events.dtype.names), comments='',
+		fmt=['%d', '%d', '%.6f', '%.4f', '%.3f', '%.6f'])
+	return events
+
+
+def parseArgs(argv=None):
+	parser = argparse.ArgumentParser(description='Search a lens and a source catalog '
+		'for astrometric microlensing events.')
+	parser.add_argument('lenses', help='lens catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('sources', help='source catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('-o', '--outdir', default='candidates',
+		help='output and checkpoint directory')
+	parser.add_argument('--nside', type=int, default=32, help='HEALPix nside of the shards')
+	parser.add_argument('--workers', type=int, default=os.cpu_count(),
+		help='number of worker processes')
+	parser.add_argument('--start', type=float, default=ca.GAIA_MISSION[0],
+		help='start of the search window [decimal years]')
+	parser.add_argument('--end', type=float, default=ca.GAIA_MISSION[1],
+		help='end of the search window [decimal years]')
+	parser.add_argument('--corridor', type=float, default=1000.0,
+		help='largest closest approach to report [mas]')
+	parser.add_argument('--mass', type=float, default=0.5, help='lens mass [Msol]')
+	parser.add_argument('--min-shift', type=float, default=0.0,
+		help='smallest centroid shift to report [mas]')
+	parser.add_argument('--epoch', type=float, default=None,
+		help='reference epoch for catalogs without an epoch column')
+	parser.add_argument('--profile', action='store_true',
+		help='write call counts and stage timings to profile.json in outdir')
+	parser.add_argument('-v', '--verbose', action='store_true')
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	events = run(parseArgs(argv))
+	print('%d candidate events' % len(events))
+
+
+if __name__ == '__main__':
+	main()
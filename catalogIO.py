@@ -0,0 +1,226 @@
+###############################################
+#      catalogIO                              #
+# A memory mapped, columnar on-disk format    #
+# for skycatalog's, with derived columns and  #
+# a sidecar zone index for cone searches.     #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import json
+import os
+import sys
+import numpy as np
+import pairFinder as pf
+from skycatalog import skycatalog
+
+
+FORMAT = 'skycat'
+VERSION = 1
+
+# Columns taken by skyobj.__init__, stored one .npy
+# file each.
+COLUMNS = ('id', 'ra', 'dec', 'epoch', 'pmra', 'pmdec', 'parallax', 'Gmag')
+
+# Height of the declination zones of the index [Degrees]
+ZONE_HEIGHT = 0.5
+
+MAS_TO_DEG = 1.0 / (3600.0 * 1000.0)
+
+
+def _zones(dec, zoneHeight):
+	nZones = int(np.ceil(180.0 / zoneHeight))
+	return np.clip(np.floor((dec + 90.0) / zoneHeight).astype(np.int64), 0, nZones - 1), nZones
+
+
+def _save(path, name, array):
+	np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(array))
+
+
+def writeCatalog(path, catalog, zoneHeight=ZONE_HEIGHT):
+	"""Write a skycatalog to the directory path.
+
+	Each column is one .npy file, next to the derived
+	unit vectors ('xyz', shape (n,3)) and cos(dec)
+	('cosdec'). The sidecar zone index holds the rows
+	sorted by declination zone and then ra ('index_rows'),
+	their ra ('index_ra') and the first position of each
+	zone in that order ('index_zones').
+
+	Args:
+	   path (str) : Output directory, created if missing.
+
+	   catalog (skycatalog) : Catalog to write.
+
+	   zoneHeight (float, optional) : Declination height of
+					  the index zones [Degrees]
+	"""
+
+	if not os.path.isdir(path):
+		os.makedirs(path)
+
+	columns = {'id' : catalog.id.astype(np.int64), 'ra' : catalog.ra_0,
+		'dec' : catalog.dec_0, 'epoch' : catalog.epoch_0, 'pmra' : catalog.pmra,
+		'pmdec' : catalog.pmdec, 'parallax' : catalog.parallax, 'Gmag' : catalog.gMag}
+	for name in COLUMNS:
+		_save(path, name, columns[name])
+
+	_save(path, 'xyz', pf.unitVectors(catalog.ra_0, catalog.dec_0))
+	_save(path, 'cosdec', np.cos(np.radians(catalog.dec_0)))
+
+	zone, nZones = _zones(catalog.dec_0, zoneHeight)
+	ra = catalog.ra_0 % 360.0
+	rows = np.lexsort((ra, zone))
+	_save(path, 'index_rows', rows)
+	_save(path, 'index_ra', ra[rows])
+	_save(path, 'index_zones', np.searchsorted(zone[rows], np.arange(nZones + 1)))
+
+	#meta.json last, its presence marks a complete catalog
+	meta = {'format' : FORMAT, 'version' : VERSION, 'rows' : len(catalog),
+		'columns' : list(COLUMNS), 'derived' : ['xyz', 'cosdec'],
+		'zone_height' : zoneHeight}
+	with open(os.path.join(path, 'meta.json'), 'w') as f:
+		json.dump(meta, f, indent=1)
+
+
+class mappedCatalog(object):
+	"""A catalog written by writeCatalog, opened with
+	every column memory mapped read only.
+
+	Nothing is read until it is used and the pages are
+	shared through the page cache, so any number of
+	worker processes can open one multi-GB catalog for
+	the memory of one.
+	"""
+
+	def __init__(self, path):
+		"""
+		Args:
+		   path (str) : Catalog directory.
+		"""
+
+		self.path = path
+		with open(os.path.join(path, 'meta.json')) as f:
+			self.meta = json.load(f)
+		if self.meta.get('format') != FORMAT or self.meta.get('version') != VERSION:
+			raise ValueError('%s is not a version %d %s catalog' % (path, VERSION, FORMAT))
+
+		self.columns = dict((name, self._load(name)) for name in self.meta['columns'])
+		self.catalog = skycatalog.fromColumns(self.columns)
+		self.xyz = self._load('xyz')
+		self.cosDec = self._load('cosdec')
+
+		self.zoneHeight = self.meta['zone_height']
+		self.indexRows = self._load('index_rows')
+		self.indexRa = self._load('index_ra')
+		self.indexZones = self._load('index_zones')
+
+	def _load(self, name):
+		return np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+
+	def __len__(self):
+		return self.meta['rows']
+
+	def zoneRows(self, zone):
+		"""Rows of one declination zone, sorted by ra."""
+		return self.indexRows[self.indexZones[zone]:self.indexZones[zone + 1]]
+
+	def box(self, raLo, raHi, decLo, decHi):
+		"""Rows whose reference position is inside a box.
+
+		Args:
+		   raLo, raHi (float) : Right ascension range [Degrees],
+					wrapping through 0 when
+					raLo > raHi. A range of
+					360 degrees or more is
+					the whole circle.
+
+		   decLo, decHi (float) : Declination range [Degrees]
+
+		Returns:
+		   rows (array) : Catalog rows, sorted.
+		"""
+
+		if raHi - raLo >= 360.0:
+			ranges = [(0.0, 360.0)]
+		else:
+			lo = raLo % 360.0
+			hi = raHi % 360.0
+			ranges = [(lo, hi)] if lo <= hi else [(0.0, hi), (lo, 360.0)]
+
+		zone, nZones = _zones(np.array([decLo, decHi]), self.zoneHeight)
+		found = [np.zeros(0, dtype=np.int64)]
+		for z in range(zone[0], zone[1] + 1):
+			start, end = self.indexZones[z], self.indexZones[z + 1]
+			zoneRa = self.indexRa[start:end]
+			for lo, hi in ranges:
+				i = np.searchsorted(zoneRa, lo, side='left')
+				j = np.searchsorted(zoneRa, hi, side='right')
+				found.append(self.indexRows[start + i:start + j])
+		rows = np.sort(np.concatenate(found))
+
+		dec = self.columns['dec'][rows]
+		return rows[(dec >= decLo) & (dec <= decHi)]
+
+	def cone(self, ra, dec, radius):
+		"""Rows within radius of (ra,dec), at their
+		reference positions (no proper motion).
+
+		Args:
+		   ra, dec (float) : Centre of the cone [Degrees]
+
+		   radius (float) : Radius of the cone [mas]
+
+		Returns:
+		   rows (array) : Catalog rows, sorted.
+		"""
+
+		r = radius * MAS_TO_DEG
+		halfWidth = raHalfWidth(r, abs(dec) + r)
+		rows = self.box(ra - halfWidth, ra + halfWidth, dec - r, dec + r)
+
+		#exact test on the unit sphere
+		centre = pf.unitVectors(ra, dec)
+		cosR = np.cos(np.radians(r))
+		return rows[np.dot(self.xyz[rows], centre) >= cosR]
+
+
+def raHalfWidth(r, maxDec):
+	"""Half width in ra [Degrees] that holds every point
+	within r [Degrees] of a centre, when no point is
+	more polar than maxDec [Degrees]. 180 when the
+	whole circle is needed."""
+	ratio = np.sin(np.radians(r)) / np.cos(np.radians(min(maxDec, 90.0)))
+	if maxDec >= 90.0 or ratio >= 1.0:
+		return 180.0
+	return np.degrees(np.arcsin(ratio))
+
+
+def openCatalog(path):
+	"""Open a catalog written by writeCatalog as a
+	memory mapped skycatalog."""
+	return mappedCatalog(path).catalog
+
+
+def main(argv=None):
+	#convert a CSV, Parquet or FITS table
+	import argparse
+	import candidateSearch as cs
+
+	parser = argparse.ArgumentParser(description='Convert a catalog table to the '
+		'memory mapped skycat format.')
+	parser.add_argument('table', help='input catalog (csv, parquet or fits)')
+	parser.add_argument('output', help='output catalog directory')
+	parser.add_argument('--epoch', type=float, default=None,
+		help='reference epoch for tables without an epoch column')
+	parser.add_argument('--zone-height', type=float, default=ZONE_HEIGHT,
+		help='declination height of the index zones [degrees]')
+	args = parser.parse_args(argv)
+
+	catalog = cs.readCatalog(args.table, args.epoch)
+	writeCatalog(args.output, catalog, args.zone_height)
+	print('%d rows written to %s' % (len(catalog), args.output))
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,315 @@
+###############################################
+#      closestApproach                        #
+# Functions to find the time and separation   #
+# of closest approach between a lens and a    #
+# source, including the parallax wobble.      #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import numpy as np
+import tangentPlaneUtils as tp
+import profiling as prof
+
+
+# Step of the separation grid [yrs]. The parallax
+# wobble has a period of one year, so this resolves
+# every local minimum it can introduce.
+GRID_STEP = 0.01
+
+# Half width of the default search window placed
+# around the linear motion estimate [yrs].
+WINDOW_HALF_WIDTH = 1.0
+
+# Final width of the bracket around each minimum [yrs]
+TOLERANCE = 1e-7
+
+# Gaia science operations [Decimal Years]
+GAIA_MISSION = (2014.5, 2025.1)
+
+_INVPHI = (np.sqrt(5.0) - 1.0) / 2.0
+_INVPHI2 = 1.0 - _INVPHI
+
+
+def linearMinTime(dxi, deta, dpmra, dpmdec, epoch):
+	"""Time of closest approach for purely linear
+	relative motion (no parallax).
+
+	Args:
+	   dxi, deta (float or array) : Position of the source
+					relative to the lens at
+					epoch [mas]
+
+	   dpmra, dpmdec (float or array) : Proper motion of the
+					    source relative to
+					    the lens [mas/yr]
+
+	   epoch (float or array) : Reference epoch of the
+				    relative position
+				    [Decimal Years]
+
+	Returns:
+	   minTime (float or array) : Time of closest approach
+				      [Decimal Years]. Pairs with no
+				      relative motion return epoch.
+	"""
+
+	pm2 = dpmra**2 + dpmdec**2
+	moving = pm2 > 0
+	with np.errstate(divide='ignore', invalid='ignore'):
+		dt = -(dxi*dpmra + deta*dpmdec) / np.where(moving, pm2, 1.0)
+
+	return epoch + np.where(moving, dt, 0.0)
+
+
+def refineMinimum(sepFunc, lo, hi, tol=TOLERANCE):
+	"""Golden section search for the minimum of sepFunc
+	inside each bracket [lo,hi], all brackets at once.
+
+	Args:
+	   sepFunc (callable) : Separation as a function of time,
+				evaluated elementwise on an array
+				shaped like lo.
+
+	   lo, hi (array) : Bracket edges [Decimal Years]
+
+	   tol (float) : Final bracket width [yrs]
+
+	Returns:
+	   minTime (array) : Time of the minimum in each bracket
+			     [Decimal Years]
+	"""
+
+	lo = np.array(lo, dtype=float)
+	hi = np.array(hi, dtype=float)
+
+	width = np.max(hi - lo) if lo.size else 0.0
+	if width <= tol:
+		return 0.5 * (lo + hi)
+	nIter = int(np.ceil(np.log(tol / width) / np.log(_INVPHI)))
+
+	c = lo + _INVPHI2 * (hi - lo)
+	d = lo + _INVPHI * (hi - lo)
+	fc = sepFunc(c)
+	fd = sepFunc(d)
+
+	for i in range(nIter):
+		#minimum lies in [lo,d] where f(c) < f(d)
+		left = fc < fd
+		hi = np.where(left, d, hi)
+		lo = np.where(left, lo, c)
+
+		x = np.where(left, lo + _INVPHI2 * (hi - lo), lo + _INVPHI * (hi - lo))
+		fx = sepFunc(x)
+
+		c, d = np.where(left, x, d), np.where(left, c, x)
+		fc, fd = np.where(left, fx, fd), np.where(left, fc, fx)
+
+	prof.count('ca.refine_iterations', nIter)
+	prof.count('ca.sep_evaluations', nIter + 2)
+	return 0.5 * (lo + hi)
+
+
+@prof.profiled('ca.findMinima')
+def findMinima(sepFunc, tStart, tEnd, step=GRID_STEP, tol=TOLERANCE):
+	"""Find every local minimum of the separation
+	inside a time window.
+
+	The separation is sampled on a grid of spacing
+	step, each sampled minimum is bracketed by its
+	neighbouring grid points and refined with
+	refineMinimum. A window edge is returned when the
+	separation is smallest there.
+
+	Args:
+	   sepFunc (callable) : Separation as a function of time,
+				evaluated elementwise on arrays
+				[mas]
+
+	   tStart, tEnd (float) : Time window [Decimal Years]
+
+	   step (float, optional) : Grid spacing [yrs]
+
+	   tol (float, optional) : Precision of each minimum [yrs]
+
+	Returns:
+	   minTimes, minSeps (array,array) : Times [Decimal Years]
+					     and separations [mas]
+					     of the minima, in time
+					     order.
+	"""
+
+	n = max(int(np.ceil((tEnd - tStart) / step)), 2) + 1
+	t = np.linspace(tStart, tEnd, n)
+	sep = sepFunc(t)
+
+	left = np.concatenate(([np.inf], sep[:-1]))
+	right = np.concatenate((sep[1:], [np.inf]))
+	idx = np.nonzero((sep <= left) & (sep < right))[0]
+
+	lo = t[np.maximum(idx - 1, 0)]
+	hi = t[np.minimum(idx + 1, n - 1)]
+	minTimes = refineMinimum(sepFunc, lo, hi, tol)
+
+	prof.count('ca.sep_evaluations', 2)
+	return minTimes, sepFunc(minTimes)
+
+
+def _pairFactors(mjd, ra, dec):
+	# parallax factors (RdotW,RdotN) for matching
+	# elements of mjd, ra and dec.
+	R = tp.makeR(tp.lSol(mjd), tp.epsilonSol(mjd))
+	return (np.sum(tp.makeW(ra) * R, axis=0),
+		np.sum(tp.makeN(ra, dec) * R, axis=0))
+
+
+def relativeMotion(lenses, sources, lensIdx, sourceIdx):
+	"""Linear motion of each source relative to its
+	lens, in the tangent plane of the lens.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs.
+
+	   lensIdx, sourceIdx (array) : Row of the lens and the
+					source of each pair.
+
+	Returns:
+	   dxi, deta (array,array) : Source position relative to
+				     the lens at the lens reference
+				     epoch, without parallax [mas]
+
+	   dpmra, dpmdec (array,array) : Relative proper motion
+					 [mas/yr]
+
+	   epoch (array) : Lens reference epoch [Decimal Years]
+	"""
+
+	epoch = lenses.epoch_0[lensIdx]
+	xi_0, eta_0 = tp.s2tp(sources.ra_0[sourceIdx], sources.dec_0[sourceIdx],
+		lenses.ra_0[lensIdx], lenses.dec_0[lensIdx])
+	dt = epoch - sources.epoch_0[sourceIdx]
+
+	return (xi_0 + sources.pmra[sourceIdx] * dt,
+		eta_0 + sources.pmdec[sourceIdx] * dt,
+		sources.pmra[sourceIdx] - lenses.pmra[lensIdx],
+		sources.pmdec[sourceIdx] - lenses.pmdec[lensIdx],
+		epoch)
+
+
+def linearMinSep(dxi, deta, dpmra, dpmdec, epoch, tStart, tEnd):
+	"""Smallest separation of linear relative motion
+	(no parallax) inside the window [tStart,tEnd].
+
+	Args:
+	   dxi, deta, dpmra, dpmdec, epoch (array) : Relative motion,
+					as returned by
+					relativeMotion.
+
+	   tStart, tEnd (float or array) : Time window
+					   [Decimal Years]
+
+	Returns:
+	   minSep (array) : Linear motion separation at the
+			    clamped time of closest approach [mas]
+	"""
+
+	t = np.clip(linearMinTime(dxi, deta, dpmra, dpmdec, epoch), tStart, tEnd) - epoch
+	return np.hypot(dxi + dpmra * t, deta + dpmdec * t)
+
+
+@prof.profiled('ca.batchMinApproach')
+def batchMinApproach(lenses, sources, lensIdx, sourceIdx, tStart=None, tEnd=None,
+			step=GRID_STEP, tol=TOLERANCE, chunkSize=4096):
+	"""Closest approach of many lens-source pairs
+	in one vectorized call.
+
+	Pair k is lenses[lensIdx[k]] and sources[sourceIdx[k]].
+	The separation of every pair is sampled on one common
+	time grid, so the observer position is computed once
+	and, within each block of pairs, each lens's parallax
+	factors once for all of its sources. The global minimum on the grid is then
+	refined with refineMinimum.
+
+	The source parallax is applied with the parallax
+	factors of its lens. For sources within a few arcsec
+	of the lens this differs from skyobj.getSeparation by
+	< 1e-4 mas.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs,
+					  may be the same catalog.
+
+	   lensIdx, sourceIdx (array) : Row of the lens and the
+					source of each pair.
+
+	   tStart, tEnd (float, optional) : Time window
+					    [Decimal Years].
+					    Defaults to
+					    GAIA_MISSION.
+
+	   step (float, optional) : Grid spacing [yrs]
+
+	   tol (float, optional) : Precision of t_min [yrs]
+
+	   chunkSize (int, optional) : Pairs per block, bounds
+				       the grid memory to
+				       chunkSize x nEpochs.
+
+	Returns:
+	   minTime (array) : Time of closest approach [Decimal Years]
+
+	   minSep (array) : Separation at closest approach [mas]
+
+	   posAngle (array) : Position angle of the source from
+			      the lens at closest approach, east
+			      of north [Degrees]
+	"""
+
+	if tStart is None:
+		tStart = GAIA_MISSION[0]
+	if tEnd is None:
+		tEnd = GAIA_MISSION[1]
+
+	lensIdx = np.asarray(lensIdx, dtype=np.intp)
+	sourceIdx = np.asarray(sourceIdx, dtype=np.intp)
+
+	#common time grid
+	n = max(int(np.ceil((tEnd - tStart) / step)), 2) + 1
+	t = np.linspace(tStart, tEnd, n)
+	mjd = tp.decimalYear2mjd(t)
+
+	dxi, deta, dpmra, dpmdec, epochL = relativeMotion(lenses, sources, lensIdx, sourceIdx)
+	dplx = sources.parallax[sourceIdx] - lenses.parallax[lensIdx]
+
+	nPairs = len(lensIdx)
+	prof.count('ca.batch_pairs', nPairs)
+	minTime = np.empty(nPairs)
+	minSep = np.empty(nPairs)
+	posAngle = np.empty(nPairs)
+
+	for lo in range(0, nPairs, chunkSize):
+		k = slice(lo, min(lo + chunkSize, nPairs))
+
+		#parallax factors of each lens of the block, once
+		uLens, inv = np.unique(lensIdx[k], return_inverse=True)
+		gridW, gridN = tp.parallaxFactors(mjd, lenses.ra_0[uLens], lenses.dec_0[uLens])
+
+		#grid search for the global minimum
+		tt = t - epochL[k, None]
+		sep = np.hypot(dxi[k, None] + dpmra[k, None] * tt + dplx[k, None] * gridW[inv],
+			deta[k, None] + dpmdec[k, None] * tt + dplx[k, None] * gridN[inv])
+		i = np.argmin(sep, axis=1)
+
+		def offset(tq):
+			fW, fN = _pairFactors(tp.decimalYear2mjd(tq), lenses.ra_0[lensIdx[k]],
+				lenses.dec_0[lensIdx[k]])
+			return (dxi[k] + dpmra[k] * (tq - epochL[k]) + dplx[k] * fW,
+				deta[k] + dpmdec[k] * (tq - epochL[k]) + dplx[k] * fN)
+
+		minTime[k] = refineMinimum(lambda tq: np.hypot(*offset(tq)),
+			t[np.maximum(i - 1, 0)], t[np.minimum(i + 1, n - 1)], tol)
+		offXi, offEta = offset(minTime[k])
+		minSep[k] = np.hypot(offXi, offEta)
+		posAngle[k] = np.degrees(np.arctan2(offXi, offEta)) % 360.0
+
+	return minTime, minSep, posAngle
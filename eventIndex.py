@@ -0,0 +1,189 @@
+###############################################
+#      eventIndex                             #
+# A persistent, time sorted index of solved   #
+# events for queries by date and centroid     #
+# shift without re-running any solver.        #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import sys
+import numpy as np
+import microlens as m
+import candidateSearch as cs
+
+
+# candidateSearch.RESULT_DTYPE plus the event durations
+# and the window of the astrometric signal.
+INDEX_DTYPE = cs.RESULT_DTYPE + [('enstien_T', 'f8'), ('astrometric_T', 'f8'),
+	('t_start', 'f8'), ('t_end', 'f8')]
+
+# Default detection accuracy of the astrometric
+# window [mas]
+ACCURACY = 0.1
+
+
+class eventIndex(object):
+	"""Events sorted by the time of closest approach.
+
+	Each event carries the window of its astrometric
+	signal, t_min +/- astrometric_T / 2. Queries are a
+	binary search of the sorted times followed by a mask
+	of the few rows in range, so they need no solver and
+	take microseconds.
+
+	For window queries events are also grouped by the
+	length of their window, each group spanning a factor
+	of two, so a few very long windows do not widen the
+	search of every other event.
+	"""
+
+	def __init__(self, events):
+		"""
+		Args:
+		   events (np.array) : Structured array of INDEX_DTYPE,
+				       in any order.
+		"""
+
+		events = np.asarray(events, dtype=INDEX_DTYPE)
+		self.events = events[np.argsort(events['t_min'], kind='stable')]
+		self.tMin = np.ascontiguousarray(self.events['t_min'])
+		#groups of rows by half window length, each with
+		#its t_min, t_start, t_end and centroid_shift
+		#columns in t_min order and longest half window,
+		#which bounds the t_min of any of its windows
+		#that can reach a time
+		half = np.maximum(self.tMin - self.events['t_start'], self.events['t_end'] - self.tMin)
+		with np.errstate(divide='ignore'):
+			group = np.floor(np.log2(np.maximum(half, 0.0)))
+		group = np.where(np.isfinite(group), group, -np.inf)
+		self.groups = []
+		for g in np.unique(group):
+			rows = np.nonzero(group == g)[0]
+			self.groups.append((rows, self.tMin[rows], self.events['t_start'][rows],
+				self.events['t_end'][rows], self.events['centroid_shift'][rows],
+				float(np.max(half[rows]))))
+
+	@classmethod
+	def fromEvents(cls, events, lenses, sources, lensMass, accuracy=ACCURACY):
+		"""Index the events of a search.
+
+		Args:
+		   events (np.array) : Structured array of
+				       candidateSearch.RESULT_DTYPE
+
+		   lenses, sources (skycatalog) : Catalogs holding
+						  every lens and
+						  source id.
+
+		   lensMass (float or array) : Lens mass [Msol]
+
+		   accuracy (float, optional) : Detection accuracy [mas]
+						of the astrometric
+						window.
+
+		Returns:
+		   index (eventIndex)
+		"""
+
+		lensRows = lenses.rowsOf(events['lens_id'])
+		sourceRows = sources.rowsOf(events['source_id'])
+		pm = np.hypot(lenses.pmra[lensRows] - sources.pmra[sourceRows],
+			lenses.pmdec[lensRows] - sources.pmdec[sourceRows])
+		table = m.get_event_table(lensMass, m.get_dist(lenses.parallax[lensRows]),
+			events['min_sep'], lensPmMag=pm, accuracy=accuracy)
+
+		indexed = np.zeros(len(events), dtype=INDEX_DTYPE)
+		for name, fmt in cs.RESULT_DTYPE:
+			indexed[name] = events[name]
+		indexed['enstien_T'] = table['enstien_T']
+		indexed['astrometric_T'] = table['astrometric_T']
+		indexed['t_start'] = events['t_min'] - 0.5 * table['astrometric_T']
+		indexed['t_end'] = events['t_min'] + 0.5 * table['astrometric_T']
+		return cls(indexed)
+
+	def __len__(self):
+		return len(self.events)
+
+	def save(self, path):
+		"""Write the index to an .npz file."""
+		np.savez(path, events=self.events)
+
+	@classmethod
+	def load(cls, path):
+		"""Read an index written by save."""
+		with np.load(path) as data:
+			return cls(data['events'])
+
+	def peaking(self, tStart, tEnd, minShift=0.0):
+		"""Events whose closest approach falls inside
+		[tStart,tEnd] with a centroid shift of at least
+		minShift [mas], in time order."""
+		lo = np.searchsorted(self.tMin, tStart, side='left')
+		hi = np.searchsorted(self.tMin, tEnd, side='right')
+		found = self.events[lo:hi]
+		return found[found['centroid_shift'] >= minShift]
+
+	def active(self, tStart, tEnd, minShift=0.0):
+		"""Events whose astrometric window overlaps
+		[tStart,tEnd] with a centroid shift of at least
+		minShift [mas], in time order."""
+		rows = [np.zeros(0, dtype=np.intp)]
+		for groupRows, tMin, start, end, shift, maxHalf in self.groups:
+			lo = np.searchsorted(tMin, tStart - maxHalf, side='left')
+			hi = np.searchsorted(tMin, tEnd + maxHalf, side='right')
+			keep = ((start[lo:hi] <= tEnd) & (end[lo:hi] >= tStart) &
+				(shift[lo:hi] >= minShift))
+			rows.append(groupRows[lo:hi][keep])
+		return self.events[np.sort(np.concatenate(rows))]
+
+
+def parseArgs(argv=None):
+	parser = argparse.ArgumentParser(description='Build or query an index of '
+		'candidate events by date.')
+	sub = parser.add_subparsers(dest='command', required=True)
+	build = sub.add_parser('build', help='index a candidateSearch csv')
+	build.add_argument('candidates', help='candidates.csv of candidateSearch')
+	build.add_argument('lenses', help='lens catalog (csv, parquet, fits or skycat directory)')
+	build.add_argument('sources', help='source catalog (csv, parquet, fits or skycat directory)')
+	build.add_argument('-o', '--output', default='events.npz', help='output index')
+	build.add_argument('--mass', type=float, default=0.5, help='lens mass [Msol]')
+	build.add_argument('--accuracy', type=float, default=ACCURACY,
+		help='detection accuracy of the astrometric window [mas]')
+	build.add_argument('--epoch', type=float, default=None,
+		help='reference epoch for catalogs without an epoch column')
+	query = sub.add_parser('query', help='events of a time window')
+	query.add_argument('index', help='index written by build')
+	query.add_argument('start', type=float, help='start of the window [decimal years]')
+	query.add_argument('end', type=float, help='end of the window [decimal years]')
+	query.add_argument('--min-shift', type=float, default=0.0,
+		help='smallest centroid shift [mas]')
+	query.add_argument('--active', action='store_true',
+		help='events whose astrometric window overlaps, rather than that peak in, '
+		'the time window')
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	options = parseArgs(argv)
+	if options.command == 'build':
+		events = np.genfromtxt(options.candidates, delimiter=',', names=True,
+			dtype=cs.RESULT_DTYPE, ndmin=1)
+		lenses = cs.readCatalog(options.lenses, options.epoch)
+		sources = cs.readCatalog(options.sources, options.epoch)
+		index = eventIndex.fromEvents(events, lenses, sources, options.mass, options.accuracy)
+		index.save(options.output)
+		print('%d events indexed in %s' % (len(index), options.output))
+		return
+
+	index = eventIndex.load(options.index)
+	select = index.active if options.active else index.peaking
+	found = select(options.start, options.end, options.min_shift)
+	print(','.join(found.dtype.names))
+	for e in found.tolist():
+		print('%d,%d,%.6f,%.4f,%.3f,%.6f,%.4f,%.4f,%.6f,%.6f' % e)
+
+
+if __name__ == '__main__':
+	sys.exit(main())
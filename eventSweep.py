@@ -0,0 +1,200 @@
+###############################################
+#      eventSweep                             #
+# Centroid shift, Einstein radius and event   #
+# durations of one lens-source pair over a    #
+# grid of lens masses or Monte Carlo draws of #
+# the astrometric parameters.                 #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import numpy as np
+import closestApproach as ca
+import microlens as m
+from skycatalog import skycatalog
+
+
+# Quantiles reported by summarize, the median and
+# the 1 sigma range.
+QUANTILES = (0.16, 0.5, 0.84)
+
+
+def _mag(mag):
+	# skyobj magnitudes use None for unknown
+	return np.nan if mag is None else mag
+
+
+def _relativePm(lensPmra, lensPmdec, sourcePmra, sourcePmdec):
+	return np.hypot(lensPmra - sourcePmra, lensPmdec - sourcePmdec)
+
+
+def summarize(samples, quantiles=QUANTILES, weights=None):
+	"""Quantiles of every column of a table of samples.
+
+	Args:
+	   samples (dict) : Arrays of samples, as returned by
+			    massGrid or monteCarlo.
+
+	   quantiles (sequence, optional) : Quantiles to report.
+
+	   weights (array, optional) : Weight of each sample, e.g.
+				       a mass prior over a mass
+				       grid.
+
+	Returns:
+	   summary (dict) : Quantiles of each column.
+	"""
+
+	summary = {}
+	for key, values in samples.items():
+		values = np.ravel(values)
+		if weights is None:
+			summary[key] = np.quantile(values, quantiles)
+			continue
+		w = np.ravel(np.broadcast_to(weights, np.shape(samples[key])))
+		order = np.argsort(values)
+		#weighted quantile, each sample at the middle
+		#of its step of the cumulative weight
+		cdf = np.cumsum(w[order]) - 0.5 * w[order]
+		summary[key] = np.interp(np.asarray(quantiles) * np.sum(w), cdf, values[order])
+	return summary
+
+
+def massGrid(lens, source, lensMasses, tStart=None, tEnd=None, accuracy=None, sourceDist=None):
+	"""Event quantities of a lens-source pair over a grid
+	of lens masses.
+
+	The closest approach is solved once (skyobj.getMinima)
+	and every mass is then evaluated in one call to
+	microlens.get_event_table.
+
+	Args:
+	   lens, source (skyobj) : The lens and source.
+
+	   lensMasses (array) : Trial lens masses [Msol]
+
+	   tStart, tEnd (float, optional) : Time window of the closest
+					    approach, see
+					    skyobj.getMinima.
+
+	   accuracy (float, optional) : Detection accuracy [mas] for the
+					astrometric duration.
+
+	   sourceDist (float, optional) : Distance to the source [pc]
+
+	Returns:
+	   table (dict) : 'min_time' [Decimal Years], 'min_sep' [mas]
+			  and the microlens.get_event_table columns,
+			  one entry per mass.
+	"""
+
+	minTimes, minSeps = lens.getMinima(source, tStart, tEnd)
+	i = np.argmin(minSeps)
+
+	lensMasses = np.asarray(lensMasses, dtype=float)
+	table = m.get_event_table(lensMasses, m.get_dist(lens.parallax), minSeps[i],
+		sourceDist=sourceDist, lensMag=_mag(lens.gMag), sourceMag=_mag(source.gMag),
+		lensPmMag=_relativePm(lens.pmra, lens.pmdec, source.pmra, source.pmdec),
+		accuracy=accuracy)
+	table = dict((k, np.array(v)) for k, v in table.items())
+	table['min_time'] = np.full(lensMasses.shape, minTimes[i])
+	table['min_sep'] = np.full(lensMasses.shape, minSeps[i])
+	return table
+
+
+def _draw(obj, errors, nDraws, rng):
+	# skycatalog of nDraws Gaussian draws of the
+	# astrometry of a skyobj. errors maps 'ra','dec'
+	# [mas], 'pmra','pmdec' [mas/yr] and 'parallax'
+	# [mas] to standard deviations.
+	errors = errors or {}
+	def draw(value, key):
+		return value + errors.get(key, 0.0) * rng.standard_normal(nDraws)
+
+	cosDec = np.cos(np.deg2rad(obj.dec_0))
+	return skycatalog(id=np.full(nDraws, obj.id if obj.id is not None else -1),
+		ra=draw(0.0, 'ra') * obj.MAS_TO_DEG / cosDec + obj.ra_0,
+		dec=draw(0.0, 'dec') * obj.MAS_TO_DEG + obj.dec_0,
+		epoch=obj.epoch_0, pmra=draw(obj.pmra, 'pmra'), pmdec=draw(obj.pmdec, 'pmdec'),
+		parallax=draw(obj.parallax, 'parallax'), Gmag=_mag(obj.gMag))
+
+
+def monteCarlo(lens, source, lensMass, lensErrors=None, sourceErrors=None, nDraws=1000,
+		tStart=None, tEnd=None, accuracy=None, sourceDist=None, seed=None):
+	"""Event quantities of a lens-source pair over Monte
+	Carlo draws of the astrometric parameters and mass.
+
+	Every draw is one row of a pair of catalogs, so all
+	draws are solved together by one call to
+	closestApproach.batchMinApproach rather than one
+	solve per draw. Draws with a non-positive lens
+	parallax have no distance and are dropped.
+
+	Args:
+	   lens, source (skyobj) : The lens and source.
+
+	   lensMass (float or array) : Lens mass [Msol], or samples of
+				       it (e.g. from a mass prior)
+				       that are drawn from with
+				       replacement.
+
+	   lensErrors, sourceErrors (dict, optional) : Standard deviations
+					of 'ra','dec' [mas],
+					'pmra','pmdec' [mas/yr] and
+					'parallax' [mas]. Missing
+					keys are held fixed.
+
+	   nDraws (int, optional) : Number of draws.
+
+	   tStart, tEnd (float, optional) : Time window of the closest
+					    approach. Defaults to the
+					    nominal time of closest
+					    approach +/-
+					    closestApproach.WINDOW_HALF_WIDTH.
+
+	   accuracy (float, optional) : Detection accuracy [mas] for the
+					astrometric duration.
+
+	   sourceDist (float, optional) : Distance to the source [pc]
+
+	   seed (int, optional) : Seed of the random draws.
+
+	Returns:
+	   samples (dict) : 'lens_mass', 'min_time', 'min_sep' and the
+			    microlens.get_event_table columns, one
+			    entry per kept draw. Pass to summarize
+			    for quantiles.
+	"""
+
+	rng = np.random.RandomState(seed)
+
+	if tStart is None or tEnd is None:
+		minTime = lens.getMinTime(source)
+		if tStart is None:
+			tStart = minTime - ca.WINDOW_HALF_WIDTH
+		if tEnd is None:
+			tEnd = minTime + ca.WINDOW_HALF_WIDTH
+
+	lenses = _draw(lens, lensErrors, nDraws, rng)
+	sources = _draw(source, sourceErrors, nDraws, rng)
+	keep = lenses.parallax > 0
+	lenses = lenses.take(keep)
+	sources = sources.take(keep)
+
+	masses = np.asarray(lensMass, dtype=float)
+	if masses.ndim:
+		masses = masses[rng.randint(0, len(masses), len(lenses))]
+	masses = np.broadcast_to(masses, (len(lenses),))
+
+	rows = np.arange(len(lenses))
+	minTime, minSep, posAngle = ca.batchMinApproach(lenses, sources, rows, rows, tStart, tEnd)
+
+	table = m.get_event_table(masses, m.get_dist(lenses.parallax), minSep,
+		sourceDist=sourceDist, lensMag=lenses.gMag, sourceMag=sources.gMag,
+		lensPmMag=_relativePm(lenses.pmra, lenses.pmdec, sources.pmra, sources.pmdec),
+		accuracy=accuracy)
+	samples = dict((k, np.array(v)) for k, v in table.items())
+	samples['lens_mass'] = np.array(masses)
+	samples['min_time'] = minTime
+	samples['min_sep'] = minSep
+	return samples
@@ -0,0 +1,279 @@
+###############################################
+#      fitting                                #
+# Batched Levenberg-Marquardt fits of source  #
+# astrometry and lens mass to observed        #
+# astrometric microlensing time series.       #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import numpy as np
+import microlens as m
+import tangentPlaneUtils as tp
+
+
+# Fitted parameters, in order: the source reference
+# position offset from its catalog position [mas],
+# proper motion [mas/yr], parallax [mas] and the lens
+# mass [Msol]
+PARAMS = ('xi_0', 'eta_0', 'pmra', 'pmdec', 'parallax', 'mass')
+
+# Largest number of Levenberg-Marquardt iterations
+MAX_ITER = 50
+
+# Relative change of chi^2 at which a fit has converged
+TOLERANCE = 1e-8
+
+# Damping limits, a fit whose damping grows past
+# LAMBDA_MAX can not be improved further.
+LAMBDA_0 = 1e-3
+LAMBDA_MAX = 1e10
+
+
+def thetaE2(lensMass, lensParallax):
+	"""Squared Einstein radius [mas^2] of a lens,
+	microlens.get_enstien_R squared for a source at
+	infinity."""
+	return m.get_enstien_R(lensMass, m.get_dist(lensParallax))**2
+
+
+def prepare(lenses, sources, epochs):
+	"""Everything about a set of events that does not
+	depend on the fitted parameters.
+
+	Positions are in the tangent plane of each source's
+	catalog position. The lens, whose astrometry is held
+	fixed, follows its catalog motion there, offset by
+	its catalog separation as in skycatalog.getSeparation.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source of each
+					  event, one row each.
+
+	   epochs (array) : Epochs of the observations, shared by
+			    every event [Decimal Years]
+
+	Returns:
+	   data (dict) : 'dt' [yrs], the source parallax factors
+			 'fW' and 'fN', the lens path 'lensXi' and
+			 'lensEta' [mas] and 'kappa', thetaE2 per
+			 unit mass [mas^2/Msol]. Per event arrays
+			 have shape (nEvents, nEpochs).
+	"""
+
+	epochs = np.atleast_1d(np.asarray(epochs, dtype=float))
+	mjd = tp.decimalYear2mjd(epochs)
+	fW, fN = tp.parallaxFactors(mjd, sources.ra_0, sources.dec_0)
+
+	lensXi, lensEta = lenses.getXiEta(epochs)
+	offXi, offEta = tp.s2tp(lenses.ra_0, lenses.dec_0, sources.ra_0, sources.dec_0)
+
+	return {'dt' : epochs - sources.epoch_0[:, None], 'fW' : fW, 'fN' : fN,
+		'lensXi' : lensXi + offXi[:, None], 'lensEta' : lensEta + offEta[:, None],
+		'kappa' : thetaE2(1.0, lenses.parallax)[:, None]}
+
+
+def model(params, data, jacobian=False):
+	"""Observed (lensed) source centroid of every event at
+	every epoch.
+
+	The unlensed source moves linearly with parallax,
+	and the dark lens shifts its centroid by
+
+	   delta = d q / (|d|^2 + 2 q)
+
+	with d the source - lens offset and q = thetaE^2.
+
+	Args:
+	   params (array) : Parameters of each event, in PARAMS
+			    order, shape (nEvents, 6).
+
+	   data (dict) : As returned by prepare.
+
+	   jacobian (bool, optional) : Also return the analytic
+				       derivatives.
+
+	Returns:
+	   xi, eta (array,array) : Centroid [mas], shape
+				   (nEvents, nEpochs).
+
+	   jac (array) : If jacobian, d(xi,eta)/d(params) of shape
+			 (nEvents, nEpochs, 2, 6).
+	"""
+
+	p = [params[:, i:i + 1] for i in range(len(PARAMS))]
+	dt = data['dt']
+	sXi = p[0] + p[2] * dt + p[4] * data['fW']
+	sEta = p[1] + p[3] * dt + p[4] * data['fN']
+
+	dXi = sXi - data['lensXi']
+	dEta = sEta - data['lensEta']
+	q = data['kappa'] * p[5]
+	r2 = dXi**2 + dEta**2
+	D = r2 + 2.0 * q
+
+	xi = sXi + dXi * q / D
+	eta = sEta + dEta * q / D
+	if not jacobian:
+		return xi, eta
+
+	#d(obs)/d(source) = (1 + q/D) I - 2 q d d^T / D^2,
+	#D = |d|^2 + 2q
+	a = 1.0 + q / D
+	b = -2.0 * q / D**2
+	dxx = a + b * dXi**2
+	dxy = b * dXi * dEta
+	dyy = a + b * dEta**2
+
+	#d(source)/d(linear params), the same for xi and eta
+	ones = np.ones_like(dt)
+	zeros = np.zeros_like(dt)
+	dsXi = (ones, zeros, dt, zeros, data['fW'])
+	dsEta = (zeros, ones, zeros, dt, data['fN'])
+
+	jac = np.empty(dt.shape + (2, len(PARAMS)))
+	for i in range(5):
+		jac[..., 0, i] = dxx * dsXi[i] + dxy * dsEta[i]
+		jac[..., 1, i] = dxy * dsXi[i] + dyy * dsEta[i]
+	#d(delta)/dq = d |d|^2 / D^2, dq/dM = kappa
+	dq = data['kappa'] * r2 / D**2
+	jac[..., 0, 5] = dXi * dq
+	jac[..., 1, 5] = dEta * dq
+	return xi, eta, jac
+
+
+def _normal(params, data, xi, eta, weight):
+	# chi^2, J^T W J and J^T W r of every event
+	mXi, mEta, jac = model(params, data, jacobian=True)
+	res = np.stack((xi - mXi, eta - mEta), axis=-1)
+	res = np.where(weight > 0, res, 0.0)
+	chi2 = np.sum(weight * res**2, axis=(1, 2))
+	return (chi2,) + _normalMatrices(jac, weight, res)
+
+
+def _normalMatrices(jac, weight, res):
+	# J^T W J and J^T W r, as stacked matrix products
+	# over the flattened epochs and coordinates
+	n, nParams = len(jac), jac.shape[-1]
+	jac = jac.reshape(n, -1, nParams)
+	jw = jac * weight.reshape(n, -1, 1)
+	return (np.matmul(jw.transpose(0, 2, 1), jac),
+		np.matmul(jw.transpose(0, 2, 1), res.reshape(n, -1, 1))[..., 0])
+
+
+def _chi2(params, data, xi, eta, weight):
+	mXi, mEta = model(params, data)
+	res = np.stack((xi - mXi, eta - mEta), axis=-1)
+	return np.sum(weight * np.where(weight > 0, res, 0.0)**2, axis=(1, 2))
+
+
+def _linearStart(data, xi, eta, weight):
+	# best unlensed source astrometry, a linear least
+	# squares fit of the first five parameters.
+	dt = data['dt']
+	ones = np.ones_like(dt)
+	zeros = np.zeros_like(dt)
+	design = np.stack((np.stack((ones, zeros, dt, zeros, data['fW']), axis=-1),
+		np.stack((zeros, ones, zeros, dt, data['fN']), axis=-1)), axis=-2)
+	obs = np.where(weight > 0, np.stack((xi, eta), axis=-1), 0.0)
+	A, g = _normalMatrices(design, weight, obs)
+	return np.linalg.solve(A + 1e-12 * np.eye(5), g[..., None])[..., 0]
+
+
+def fitEvents(lenses, sources, epochs, xi, eta, sigma=1.0, mass=0.5, maxIter=MAX_ITER,
+		tol=TOLERANCE):
+	"""Fit the source astrometry and lens mass of many
+	events at once.
+
+	Every event is fitted by its own Levenberg-Marquardt
+	iteration with analytic Jacobians (see model), all
+	events advancing together as stacked arrays. The
+	fits start from a linear fit of the unlensed source
+	motion and the given mass. The lens astrometry is
+	held at its catalog values.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source of each
+					  event, one row each.
+					  The source position is
+					  the tangent point.
+
+	   epochs (array) : Observation epochs [Decimal Years]
+
+	   xi, eta (array) : Observed source centroid in the
+			     tangent plane of its catalog
+			     position, shape (nEvents, nEpochs)
+			     [mas]. NaN marks a missing
+			     observation.
+
+	   sigma (float or array, optional) : Uncertainty of each
+					      coordinate [mas],
+					      broadcast like xi.
+
+	   mass (float or array, optional) : Starting lens mass
+					     [Msol]
+
+	   maxIter (int, optional) : Largest number of iterations.
+
+	   tol (float, optional) : Relative chi^2 change at
+				   convergence.
+
+	Returns:
+	   fit (dict) : 'params' (nEvents, 6) in PARAMS order,
+			'errors' their 1 sigma uncertainties,
+			'covariance' (nEvents, 6, 6), 'ra' and 'dec'
+			of the fitted reference position
+			[Degrees], 'chi2', 'nIter' and 'converged'
+			per event.
+	"""
+
+	data = prepare(lenses, sources, epochs)
+	xi = np.asarray(xi, dtype=float)
+	eta = np.asarray(eta, dtype=float)
+	sigma = np.broadcast_to(np.asarray(sigma, dtype=float), xi.shape)
+	good = ~(np.isnan(xi) | np.isnan(eta))
+	weight = np.where(good, 1.0 / sigma**2, 0.0)
+	weight = np.stack((weight, weight), axis=-1)
+	xi = np.where(good, xi, 0.0)
+	eta = np.where(good, eta, 0.0)
+
+	nEvents = len(xi)
+	params = np.empty((nEvents, len(PARAMS)))
+	params[:, :5] = _linearStart(data, xi, eta, weight)
+	params[:, 5] = mass
+
+	lam = np.full(nEvents, LAMBDA_0)
+	nIter = np.zeros(nEvents, dtype=int)
+	active = np.ones(nEvents, dtype=bool)
+	chi2, A, g = _normal(params, data, xi, eta, weight)
+	eye = np.eye(len(PARAMS))
+	for it in range(maxIter):
+		if not active.any():
+			break
+		nIter[active] += 1
+		#damped normal equations, scaled by the diagonal
+		diag = np.einsum('npp->np', A)
+		damp = lam[:, None] * diag + 1e-12 * diag.max(axis=1, keepdims=True) + 1e-300
+		damped = A + damp[:, :, None] * eye
+		step = np.linalg.solve(damped, g[..., None])[..., 0]
+		trial = params + np.where(active[:, None], step, 0.0)
+		#a mass can not be negative
+		trial[:, 5] = np.maximum(trial[:, 5], 0.0)
+		trialChi2 = _chi2(trial, data, xi, eta, weight)
+
+		better = active & (trialChi2 <= chi2)
+		done = better & (chi2 - trialChi2 <= tol * np.maximum(chi2, 1e-300))
+		params[better] = trial[better]
+		lam = np.where(better, lam / 10.0, lam * 10.0)
+		if better.any():
+			newChi2, newA, newG = _normal(params, data, xi, eta, weight)
+			chi2 = np.where(better, newChi2, chi2)
+			A[better] = newA[better]
+			g[better] = newG[better]
+		active &= ~done & (lam < LAMBDA_MAX)
+
+	covariance = np.linalg.pinv(A)
+	ra, dec = tp.tp2s(params[:, 0], params[:, 1], sources.ra_0, sources.dec_0)
+	return {'params' : params, 'covariance' : covariance,
+		'errors' : np.sqrt(np.maximum(np.einsum('npp->np', covariance), 0.0)),
+		'ra' : ra, 'dec' : dec, 'chi2' : chi2, 'nIter' : nIter, 'converged' : ~active}
@@ -0,0 +1,207 @@
+###############################################
+#      lightcurve                             #
+# Photometric light curves of many candidate  #
+# events over many epochs, in memory or       #
+# streamed to disk in chunks.                 #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import sys
+import numpy as np
+import closestApproach as ca
+import microlens as m
+import candidateSearch as cs
+
+
+# Largest number of pair x epoch samples evaluated at
+# once by iterLightCurves
+CHUNK_SIZE = 1000000
+
+# Columns written by writeLightCurves
+CURVE_DTYPE = [('lens_id', 'i8'), ('source_id', 'i8'), ('epoch', 'f8'), ('sep', 'f8'),
+	('magnification', 'f8'), ('dmag', 'f8')]
+
+
+def magnification(lenses, sources, sep, lensMass, sourceDist=None):
+	"""Blended PSPL magnification of each pair at each
+	epoch, from an already computed separation series.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source of each
+					  pair, one row each.
+
+	   sep (array) : Separation of each pair at each epoch,
+			 shape (nPairs, nEpochs) [mas]
+
+	   lensMass (float or array) : Lens mass [Msol]
+
+	   sourceDist (float or array, optional) : Source distance
+						   [pc], None for
+						   infinity.
+
+	Returns:
+	   magnification (array) : Magnification of the lens and
+				   source light, shaped like sep.
+				   A lens with a NaN magnitude
+				   is dark.
+	"""
+
+	def column(values):
+		return None if values is None else np.asarray(values, dtype=float).reshape(-1, 1)
+
+	return m.get_blended_magnification(column(lensMass), column(m.get_dist(lenses.parallax)),
+		sep, sourceDist=column(sourceDist), lensMag=column(lenses.gMag),
+		sourceMag=column(sources.gMag))
+
+
+def lightCurves(lenses, sources, epochs, lensMass, sourceDist=None):
+	"""Light curves of many pairs in one call.
+
+	The separation of every pair at every epoch is one
+	skycatalog.getSeparation call and the magnification
+	is evaluated on it, no position is computed per
+	epoch.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source of each
+					  pair, one row each.
+
+	   epochs (array) : Epochs [Decimal Years]
+
+	   lensMass (float or array) : Lens mass [Msol], one or
+				       one per pair.
+
+	   sourceDist (float or array, optional) : Source distance
+						   [pc]
+
+	Returns:
+	   sep, magnification (array,array) : Separation [mas] and
+					      blended magnification,
+					      shape (nPairs, nEpochs).
+	"""
+
+	epochs = np.atleast_1d(np.asarray(epochs, dtype=float))
+	sep = lenses.getSeparation(epochs, sources)
+	return sep, magnification(lenses, sources, sep, lensMass, sourceDist)
+
+
+def iterLightCurves(lenses, sources, lensIdx, sourceIdx, epochs, lensMass, sourceDist=None,
+		chunkSize=CHUNK_SIZE):
+	"""Light curves of pairs of catalog rows, a chunk of
+	pairs at a time, so memory is bounded by chunkSize
+	rather than nPairs x nEpochs.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs.
+
+	   lensIdx, sourceIdx (array) : Row of the lens and the
+					source of each pair.
+
+	   epochs (array) : Epochs [Decimal Years]
+
+	   lensMass (float or array) : Lens mass [Msol], one or
+				       one per pair.
+
+	   sourceDist (float or array, optional) : Source distance
+						   [pc], one or one
+						   per pair.
+
+	   chunkSize (int, optional) : Largest number of samples
+				       (pairs x epochs) per chunk.
+
+	Yields:
+	   rows, sep, magnification (slice,array,array) : Pairs of
+						  the chunk and
+						  their light
+						  curves, see
+						  lightCurves.
+	"""
+
+	lensIdx = np.asarray(lensIdx, dtype=np.intp)
+	sourceIdx = np.asarray(sourceIdx, dtype=np.intp)
+	epochs = np.atleast_1d(np.asarray(epochs, dtype=float))
+	step = max(chunkSize // max(len(epochs), 1), 1)
+
+	def perPair(values, rows):
+		if values is None or np.ndim(values) == 0:
+			return values
+		return np.asarray(values)[rows]
+
+	for lo in range(0, len(lensIdx), step):
+		rows = slice(lo, min(lo + step, len(lensIdx)))
+		sep, mag = lightCurves(lenses.take(lensIdx[rows]), sources.take(sourceIdx[rows]),
+			epochs, perPair(lensMass, rows), perPair(sourceDist, rows))
+		yield rows, sep, mag
+
+
+def writeLightCurves(path, lenses, sources, lensIdx, sourceIdx, epochs, lensMass,
+		sourceDist=None, chunkSize=CHUNK_SIZE):
+	"""Stream light curves to a csv file, one row of
+	CURVE_DTYPE per pair and epoch, each chunk written
+	as soon as it is computed (see iterLightCurves).
+	dmag is the change of the combined magnitude,
+	-2.5 log10(magnification).
+
+	Returns:
+	   nRows (int) : Number of rows written.
+	"""
+
+	lensIdx = np.asarray(lensIdx, dtype=np.intp)
+	sourceIdx = np.asarray(sourceIdx, dtype=np.intp)
+	epochs = np.atleast_1d(np.asarray(epochs, dtype=float))
+
+	nRows = 0
+	with open(path, 'w') as f:
+		f.write(','.join(name for name, fmt in CURVE_DTYPE) + '\n')
+		for rows, sep, mag in iterLightCurves(lenses, sources, lensIdx, sourceIdx, epochs,
+				lensMass, sourceDist, chunkSize):
+			curves = np.zeros(sep.shape, dtype=CURVE_DTYPE)
+			curves['lens_id'] = lenses.id[lensIdx[rows]].reshape(-1, 1)
+			curves['source_id'] = sources.id[sourceIdx[rows]].reshape(-1, 1)
+			curves['epoch'] = epochs
+			curves['sep'] = sep
+			curves['magnification'] = mag
+			curves['dmag'] = -2.5 * np.log10(mag)
+			np.savetxt(f, curves.ravel(), delimiter=',',
+				fmt=['%d', '%d', '%.6f', '%.4f', '%.8f', '%.6f'])
+			nRows += curves.size
+	return nRows
+
+
+def parseArgs(argv=None):
+	parser = argparse.ArgumentParser(description='Write the light curves of the '
+		'events found by candidateSearch.')
+	parser.add_argument('candidates', help='candidates.csv of candidateSearch')
+	parser.add_argument('lenses', help='lens catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('sources', help='source catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('-o', '--output', default='lightcurves.csv', help='output csv')
+	parser.add_argument('--start', type=float, default=ca.GAIA_MISSION[0],
+		help='first epoch [decimal years]')
+	parser.add_argument('--end', type=float, default=ca.GAIA_MISSION[1],
+		help='last epoch [decimal years]')
+	parser.add_argument('--step', type=float, default=1.0 / 365.25,
+		help='epoch spacing [yrs]')
+	parser.add_argument('--mass', type=float, default=0.5, help='lens mass [Msol]')
+	parser.add_argument('--epoch', type=float, default=None,
+		help='reference epoch for catalogs without an epoch column')
+	parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+		help='largest number of pair x epoch samples held at once')
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	options = parseArgs(argv)
+	events = np.genfromtxt(options.candidates, delimiter=',', names=True,
+		dtype=cs.RESULT_DTYPE, ndmin=1)
+	lenses = cs.readCatalog(options.lenses, options.epoch)
+	sources = cs.readCatalog(options.sources, options.epoch)
+	epochs = np.arange(options.start, options.end, options.step)
+	nRows = writeLightCurves(options.output, lenses, sources, lenses.rowsOf(events['lens_id']),
+		sources.rowsOf(events['source_id']), epochs, options.mass, chunkSize=options.chunk_size)
+	print('%d light curve points written to %s' % (nRows, options.output))
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -59,10 +59,10 @@ def get_centroid_shift(lensMass,lensDist,minSep,sourceDist=None,
 			    abd source [mas]
 
 	   lensMag (float,optional) : Magnitude of the lens. Defaults to None.
-				      If none will assume the dark lens equation.
+				      If none (or NaN) will assume the dark lens equation.
 
 	   sourceMag (float,optional) : Magnitude of the source. Defaults to None.
-					If none will assume the dark lens eqution.
+					If none (or NaN) will assume the dark lens eqution.
 
 	 Returns:
 	    centriodShift (float) : The expected centriod shift [mas]
@@ -71,13 +71,30 @@ def get_centroid_shift(lensMass,lensDist,minSep,sourceDist=None,
 	EnstienR = get_enstien_R(lensMass,lensDist,sourceDist)	
 	mu = minSep / EnstienR
 
-	if lensMag is None and sourceMag is None:
-	
-		return (mu * EnstienR) / (mu**2 +2)
-	
-	else:
-		lumFactor = 1+(10** ((lensMag - sourceMag) / (-2.5)))
-		return (mu * EnstienR) / ((mu**2 + 2)*lumFactor) 
+	return (mu * EnstienR) / ((mu**2 + 2)*get_lum_factor(lensMag,sourceMag))
+
+def get_lum_factor(lensMag=None,sourceMag=None):
+	"""Calculates the factor a luminous lens reduces the
+	centroid shift by, 1 + f_lens / f_source.
+
+	Args:
+	   lensMag (float or array,optional) : Magnitude of the lens.
+					       None or NaN for a
+					       dark lens.
+
+	   sourceMag (float or array,optional) : Magnitude of the source.
+						 None or NaN for the
+						 dark lens equation.
+
+	Returns:
+	   lumFactor (float or array) : 1 for a dark lens.
+	"""
+
+	if lensMag is None or sourceMag is None:
+		return 1.0
+
+	lumFactor = 1+(10** ((np.asarray(lensMag,dtype=float) - sourceMag) / (-2.5)))
+	return np.where(np.isnan(lumFactor),1.0,lumFactor)[()]
 
 def get_enstien_T(lensMass,lensDist,minSep,lensPmMag,sourceDist=None):
 	"""Calculates the enstien time, or duration of the photo
@@ -188,7 +205,134 @@ def get_source_centriod_shift(lensMass,lensDist,sep,sourceDist=None):
 
 	return 0.5 * (np.sqrt(u**2 +4)-u) * einstienR
 
+def get_magnification(lensMass,lensDist,sep,sourceDist=None):
+	"""Calculates the point source point lens (PSPL)
+	magnification of the source.
+
+	Args:
+           lensMass (float or array) : Mass of the foreground
+                              lens object [Msol]
+
+           lensDist (float or array) : Distance to the lens
+                              [pc]
+
+	   sep (float or array) : Angular separation between the lens
+				  and source [mas]
+
+           SourceDist (float,optional) : Distance to the source.
+                                         defaults to None. If none,
+                                         caculation will assume sourceDist
+                                         to be at infinity. [pc]
+
+	Returns:
+	   magnification (float or array) : Total magnification of both
+					    images, A = (u^2+2)/(u sqrt(u^2+4))
+	"""
+
+	einstienR = get_enstien_R(lensMass,lensDist,sourceDist)
+	u = sep / einstienR
+
+	return (u**2 + 2) / (u * np.sqrt(u**2 + 4))
+
+def get_blended_magnification(lensMass,lensDist,sep,sourceDist=None,
+				lensMag=None,sourceMag=None):
+	"""Calculates the PSPL magnification of the combined
+	light of a luminous lens and the source,
+	(A + f_lens / f_source) / (1 + f_lens / f_source).
+
+	Args:
+           lensMass (float or array) : Mass of the foreground
+                              lens object [Msol]
+
+           lensDist (float or array) : Distance to the lens
+                              [pc]
+
+	   sep (float or array) : Angular separation between the lens
+				  and source [mas]
+
+           SourceDist (float,optional) : Distance to the source.
+                                         defaults to None. If none,
+                                         caculation will assume sourceDist
+                                         to be at infinity. [pc]
 
+	   lensMag (float or array,optional) : Magnitude of the lens.
+					       None or NaN for a
+					       dark lens.
+
+	   sourceMag (float or array,optional) : Magnitude of the source.
+						 None or NaN for no
+						 blending.
+
+	Returns:
+	   magnification (float or array) : Magnification of the lens
+					    and source light, that of
+					    get_magnification for a
+					    dark lens.
+	"""
 
+	lumFactor = get_lum_factor(lensMag,sourceMag)
 
- 	
+	return (get_magnification(lensMass,lensDist,sep,sourceDist) + lumFactor - 1) / lumFactor
+
+def get_event_table(lensMass,lensDist,minSep,sourceDist=None,lensMag=None,
+			sourceMag=None,lensPmMag=None,accuracy=None):
+	"""Calculates every derived quantity of many events
+	in one pass.
+
+	All arguments are columns (arrays or floats) that are
+	broadcast against each other, e.g. lensMass[:,None]
+	against per candidate columns gives a trial mass x
+	candidate table.
+
+	Args:
+	   lensMass (array) : Mass of the foreground lens [Msol]
+
+	   lensDist (array) : Distance to the lens [pc]
+
+	   minSep (array) : Minimum angular separation between the
+			    lens and source [mas]
+
+	   sourceDist (array,optional) : Distance to the source [pc].
+					 None, NaN or inf for a
+					 source at infinity.
+
+	   lensMag, sourceMag (array,optional) : Magnitudes of the lens
+						 and source. NaN for a
+						 dark lens.
+
+	   lensPmMag (array,optional) : Magnitude of Lens Proper motion
+					[mas/yr], needed for the
+					durations.
+
+	   accuracy (array,optional) : Minimum detection accuracy [mas],
+				       needed for the astrometric
+				       duration.
+
+	Returns:
+	   table (dict) : Arrays of 'enstien_R' [mas], 'centroid_shift'
+			  [mas], 'source_centroid_shift' [mas] and, when
+			  lensPmMag is given, 'enstien_T' [yrs] and
+			  'astrometric_T' [yrs].
+	"""
+
+	if sourceDist is None:
+		sourceDist = np.inf
+	sourceDist = np.asarray(sourceDist,dtype=float)
+	sourceDist = np.where(np.isnan(sourceDist),np.inf,sourceDist)
+
+	enstienR = get_enstien_R(lensMass,np.asarray(lensDist,dtype=float),sourceDist)
+	u = minSep / enstienR
+
+	table = {}
+	table['enstien_R'] = enstienR
+	table['centroid_shift'] = (u * enstienR) / ((u**2 + 2)*get_lum_factor(lensMag,sourceMag))
+	table['source_centroid_shift'] = 0.5 * (np.sqrt(u**2 + 4) - u) * enstienR
+
+	if lensPmMag is not None:
+		table['enstien_T'] = enstienR / lensPmMag
+		if accuracy is not None:
+			table['astrometric_T'] = (np.pi / 2.0) * ((table['enstien_T'] * enstienR) / accuracy)
+
+	shape = np.broadcast(*[np.asarray(v) for v in (lensMass,lensDist,minSep,sourceDist,
+		lensMag,sourceMag,lensPmMag,accuracy) if v is not None]).shape
+	return dict((k,np.broadcast_to(v,shape)) for k,v in table.items())
@@ -0,0 +1,213 @@
+###############################################
+#      pairFinder                             #
+# Find the background sources a lens passes   #
+# close to, using a spatial index of the      #
+# sources instead of testing every pair.      #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import numpy as np
+import closestApproach as ca
+
+
+MAS_TO_RAD = np.radians(1.0 / (3600.0 * 1000.0))
+
+# Sources are indexed in bins of how far they can move
+# within the window, the slowest bin holding motions up
+# to MOTION_BIN_MIN [mas] and each next bin
+# MOTION_BIN_FACTOR times more.
+MOTION_BIN_MIN = 100.0
+MOTION_BIN_FACTOR = 4.0
+
+
+def unitVectors(ra, dec):
+	"""Cartesian unit vectors of equatorial coordinates.
+
+	Args:
+	   ra, dec (array) : Right ascension, Declination
+			     [Degrees]
+
+	Returns:
+	   xyz (array) : Unit vectors, shape ra.shape + (3,)
+	"""
+
+	rar = np.radians(ra)
+	decr = np.radians(dec)
+	cdec = np.cos(decr)
+	return np.stack((cdec * np.cos(rar), cdec * np.sin(rar), np.sin(decr)), axis=-1)
+
+
+def _chord(angle):
+	# chord length on the unit sphere of an angle [mas]
+	return 2.0 * np.sin(0.5 * np.minimum(angle * MAS_TO_RAD, np.pi))
+
+
+class sourceIndex(object):
+	"""k-d trees over the unit vectors of a source
+	catalog at its reference positions, padded by how
+	far a source can move from there within a time
+	window.
+
+	Sources are split into bins by that distance, one
+	tree each padded by its own envelope, so a few fast
+	or near stars do not widen the search around every
+	lens.
+	"""
+
+	def __init__(self, sources, tStart, tEnd, xyz=None):
+		"""
+		Args:
+		   sources (skycatalog) : Sources to index.
+
+		   tStart, tEnd (float) : Time window the index
+					  is valid for [Decimal Years]
+
+		   xyz (array, optional) : Unit vectors of the
+					   reference positions,
+					   e.g. the stored xyz
+					   column of a catalogIO
+					   catalog. Computed if
+					   not given.
+		"""
+
+		self.sources = sources
+		self.tStart = tStart
+		self.tEnd = tEnd
+
+		from scipy.spatial import cKDTree
+
+		if xyz is None:
+			xyz = unitVectors(sources.ra_0, sources.dec_0)
+
+		#largest distance of each source from its
+		#reference position within the window [mas]
+		dt = np.maximum(np.abs(tStart - sources.epoch_0), np.abs(tEnd - sources.epoch_0))
+		motion = dt * np.hypot(sources.pmra, sources.pmdec) + np.abs(sources.parallax)
+		motionBin = np.ceil(np.log(np.maximum(motion, MOTION_BIN_MIN) / MOTION_BIN_MIN) /
+			np.log(MOTION_BIN_FACTOR))
+
+		#(rows, tree, envelope) of each bin, slowest
+		#first, and the envelope of the slowest bin
+		self.bins = []
+		for b in np.unique(motionBin):
+			rows = np.nonzero(motionBin == b)[0]
+			self.bins.append((rows, cKDTree(xyz[rows]), float(motion[rows].max())))
+		self.envelope = self.bins[0][2] if self.bins else 0.0
+
+	def query(self, xyz, radius):
+		"""Every source within radius [mas] of the unit
+		vectors in xyz.
+
+		Args:
+		   xyz (array) : Unit vectors, shape (n,3)
+
+		   radius (float or array) : Search radius [mas], one
+					     or one per vector, to
+					     which each bin adds
+					     its envelope.
+
+		Returns:
+		   which, rows (array,array) : Vector and source row of
+					       each match.
+		"""
+
+		which = [np.zeros(0, dtype=np.intp)]
+		rows = [np.zeros(0, dtype=np.intp)]
+		for binRows, tree, envelope in self.bins:
+			found = tree.query_ball_point(xyz, _chord(radius + envelope))
+			counts = np.fromiter(map(len, found), dtype=np.intp, count=len(found))
+			if counts.sum() == 0:
+				continue
+			which.append(np.repeat(np.arange(len(found)), counts))
+			rows.append(binRows[np.concatenate([f for f in found if len(f)])])
+		return np.concatenate(which), np.concatenate(rows)
+
+
+def findPairs(lenses, sources, tStart=None, tEnd=None, corridor=1000.0, index=None):
+	"""Find every lens-source pair whose separation can
+	drop below corridor inside the window [tStart,tEnd].
+
+	Each lens's path without parallax (getRaDecNoPlx) is
+	sampled at intervals no longer than the search radius
+	and the source index is queried around every sample.
+	The search radius is the corridor plus the lens
+	parallax plus the motion envelope of each source
+	bin (see sourceIndex), so no pair is missed. Candidates are then kept only if their
+	linear motion separation, less the largest parallax
+	displacement of lens and source, is inside the
+	corridor.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs.
+					  A star is not paired
+					  with itself, i.e. a
+					  lens and source of the
+					  same id.
+
+	   tStart, tEnd (float, optional) : Time window
+					    [Decimal Years]. Defaults
+					    to closestApproach.GAIA_MISSION.
+
+	   corridor (float, optional) : Half width of the corridor
+					along each lens path [mas]
+
+	   index (sourceIndex, optional) : A prebuilt index of
+					   sources, for reuse
+					   between calls.
+
+	Returns:
+	   lensIdx, sourceIdx (array,array) : Rows of the lens and
+					      source of each pair,
+					      sorted by lens.
+	"""
+
+	if tStart is None:
+		tStart = ca.GAIA_MISSION[0]
+	if tEnd is None:
+		tEnd = ca.GAIA_MISSION[1]
+	if index is None:
+		index = sourceIndex(sources, tStart, tEnd)
+
+	#sample each lens path at intervals of at most
+	#the search radius of the slowest sources, a query
+	#half an interval wider around each sample then
+	#covers the whole path.
+	radius = corridor + lenses.parallax
+	spacing = radius + index.envelope
+	pathLength = np.hypot(lenses.pmra, lenses.pmdec) * (tEnd - tStart)
+	nSamples = np.ceil(pathLength / spacing).astype(int) + 1
+
+	lensOfSample = np.repeat(np.arange(len(lenses)), nSamples)
+	first = np.cumsum(nSamples) - nSamples
+	step = np.arange(nSamples.sum()) - np.repeat(first, nSamples)
+	frac = step / np.maximum(nSamples - 1, 1)[lensOfSample]
+	epoch = tStart + frac * (tEnd - tStart)
+
+	#getRaDecNoPlx of the sampled lens at each epoch
+	dt = epoch - lenses.epoch_0[lensOfSample]
+	dec = lenses.dec_0[lensOfSample] + dt * lenses.pmdec[lensOfSample] * lenses.MAS_TO_DEG
+	ra = lenses.ra_0[lensOfSample] + dt * (lenses.pmra[lensOfSample] /
+		np.cos(np.deg2rad(lenses.dec_0[lensOfSample]))) * lenses.MAS_TO_DEG
+	xyz = unitVectors(ra, dec)
+
+	which, sourceIdx = index.query(xyz, (radius + 0.5 * spacing)[lensOfSample])
+	if len(sourceIdx) == 0:
+		return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+	lensIdx = lensOfSample[which]
+
+	#one entry per pair
+	key = np.unique(lensIdx * np.int64(len(sources)) + sourceIdx)
+	lensIdx = (key // len(sources)).astype(np.intp)
+	sourceIdx = (key % len(sources)).astype(np.intp)
+	#by id, as the catalogs are often the same file
+	#read twice or shards of it
+	keep = lenses.id[lensIdx] != sources.id[sourceIdx]
+	lensIdx, sourceIdx = lensIdx[keep], sourceIdx[keep]
+
+	#linear motion separation less the parallax envelope
+	linSep = ca.linearMinSep(*ca.relativeMotion(lenses, sources, lensIdx, sourceIdx),
+		tStart=tStart, tEnd=tEnd)
+	keep = (linSep - lenses.parallax[lensIdx] - sources.parallax[sourceIdx]) <= corridor
+
+	return lensIdx[keep], sourceIdx[keep]
@@ -0,0 +1,378 @@
+###############################################
+#      predictionService                      #
+# A long running local service answering     #
+# event prediction queries, with an asyncio   #
+# JSON lines front end over a warm pool of    #
+# processes.                                  #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from argparse import Namespace
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import closestApproach as ca
+import candidateSearch as cs
+from skycatalog import skycatalog
+
+
+# Number of solved lenses kept in the result cache
+CACHE_SIZE = 10000
+
+# Time a query waits for others to share its batch [s]
+BATCH_WAIT = 0.005
+
+# Largest number of lenses solved in one batch
+MAX_BATCH = 1000
+
+# Astrometry of a lens given by coordinates, in the
+# order of a lens key.
+LENS_FIELDS = ('ra', 'dec', 'epoch', 'pmra', 'pmdec', 'parallax', 'Gmag')
+
+# Fields of each returned event
+EVENT_FIELDS = tuple(name for name, fmt in cs.RESULT_DTYPE)
+
+
+# Sources and their index, loaded once in each
+# worker process by _initWorker.
+_worker = {}
+
+
+def _initWorker(sources, tStart, tEnd):
+	sources, index = cs.openSources(sources, tStart, tEnd)
+	_worker.update(sources=sources, index=index)
+
+
+def _magnitude(gMag):
+	# a magnitude for a lens key, None when missing as
+	# NaN never compares equal.
+	return None if gMag is None or np.isnan(gMag) else float(gMag)
+
+
+def _solveBatch(ids, columns, options):
+	# search a batch of lenses, each id once, against
+	# the preloaded sources.
+	lenses = skycatalog(id=ids, **columns)
+	return cs.searchShard(lenses, _worker['sources'], _worker['index'], options)
+
+
+class predictionService(object):
+	"""Event predictions for single lenses against a
+	preloaded source catalog.
+
+	The source catalog is shipped to a pool of worker
+	processes when the service starts, a skycat
+	directory by its path, and each worker builds its
+	pairFinder.sourceIndex once. Each query names
+	lenses, by catalog id or by their astrometry, and
+	gets back their events in the window. Solved lenses
+	are kept in an LRU cache, a lens already being solved
+	for another query is waited on rather than solved
+	again, and the lenses of queries arriving within
+	batchWait of each other are solved together in one
+	candidateSearch.searchShard (one batchMinApproach).
+	"""
+
+	def __init__(self, lenses, sources, options, workers=1, cacheSize=CACHE_SIZE,
+			batchWait=BATCH_WAIT, maxBatch=MAX_BATCH):
+		"""
+		Args:
+		   lenses (skycatalog) : Catalog of lenses queried by id.
+
+		   sources (skycatalog or str) : Source catalog, or
+						 the path of a skycat
+						 directory which each
+						 worker maps itself
+						 (see candidateSearch.
+						 shipCatalog).
+
+		   options (argparse.Namespace) : Default search options
+						  (start, end, corridor,
+						  mass, min_shift). The
+						  window bounds every
+						  query's window.
+
+		   workers (int, optional) : Number of worker processes.
+
+		   cacheSize (int, optional) : Lenses kept in the result
+					       cache.
+
+		   batchWait (float, optional) : Time a query waits to
+						 be batched [s]
+
+		   maxBatch (int, optional) : Largest number of lenses
+					      per batch.
+		"""
+
+		self.lenses = lenses
+		self.sources = sources
+		self.options = options
+		self.workers = workers
+		self.cacheSize = cacheSize
+		self.batchWait = batchWait
+		self.maxBatch = maxBatch
+
+		self.pool = None
+		self._cache = OrderedDict()
+		self._inflight = {}
+		self._pending = []
+		self._timer = None
+		self.stats = {'queries' : 0, 'lenses' : 0, 'cache_hits' : 0, 'solved' : 0, 'batches' : 0}
+
+	def start(self):
+		"""Start the worker processes."""
+		if self.pool is None:
+			self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_initWorker,
+				initargs=(self.sources, self.options.start, self.options.end))
+
+	def close(self):
+		"""Stop the worker processes."""
+		if self.pool is not None:
+			self.pool.shutdown()
+			self.pool = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _window(self, query):
+		# search options of a query, its window inside
+		# the service window.
+		o = self.options
+		start = float(query.get('start', o.start))
+		end = float(query['end']) if 'end' in query else (
+			start + float(query['years']) if 'years' in query else o.end)
+		if not o.start <= start < end <= o.end:
+			raise ValueError('window [%g,%g] is not inside the service window [%g,%g]'
+				% (start, end, o.start, o.end))
+		return (start, end, float(query.get('corridor', o.corridor)),
+			float(query.get('mass', o.mass)), float(query.get('min_shift', getattr(o, 'min_shift', 0.0))))
+
+	def _lensKeys(self, query):
+		# (id, astrometry) of every lens of a query
+		keys = []
+		for lensId in query.get('lens_id', []):
+			try:
+				row = self.lenses.rowsOf(lensId)
+			except ValueError:
+				raise ValueError('unknown lens id %s' % lensId)
+			lens = self.lenses
+			keys.append((int(lensId), (float(lens.ra_0[row]), float(lens.dec_0[row]),
+				float(lens.epoch_0[row]), float(lens.pmra[row]), float(lens.pmdec[row]),
+				float(lens.parallax[row]), _magnitude(lens.gMag[row]))))
+		for lens in query.get('lenses', []):
+			#missing motions are zero and a missing
+			#magnitude a dark lens, as in skycatalog
+			keys.append((int(lens.get('id', -1)), (float(lens['ra']), float(lens['dec']),
+				float(lens.get('epoch', getattr(self.options, 'epoch', None))),
+				float(lens.get('pmra', 0.0)), float(lens.get('pmdec', 0.0)),
+				float(lens['parallax']), _magnitude(lens.get('Gmag')))))
+		if not keys:
+			raise ValueError('a query needs lens_id or lenses')
+		for lensId, astrometry in keys:
+			if not astrometry[5] > 0:
+				raise ValueError('lens %s needs a positive parallax' % lensId)
+		return keys
+
+	async def predict(self, query):
+		"""Events of the lenses of one query.
+
+		Args:
+		   query (dict) : 'lens_id', a list of catalog ids,
+				  and/or 'lenses', a list of dicts
+				  of LENS_FIELDS (parallax
+				  required). Optional 'start' and
+				  'end' (or 'years' from start)
+				  [Decimal Years], 'corridor' [mas],
+				  'mass' [Msol] and 'min_shift' [mas]
+				  override the service options.
+
+		Returns:
+		   events (list) : A dict of EVENT_FIELDS per event,
+				   ranked by centroid shift.
+		"""
+
+		window = self._window(query)
+		keys = self._lensKeys(query)
+		self.stats['queries'] += 1
+		self.stats['lenses'] += len(keys)
+
+		results = []
+		for lensId, astrometry in keys:
+			#the id is part of the key, a lens is not
+			#paired with the source of its own id
+			key = (lensId,) + astrometry + window
+			if key in self._cache:
+				self._cache.move_to_end(key)
+				self.stats['cache_hits'] += 1
+				results.append(self._cache[key])
+				continue
+			if key not in self._inflight:
+				self._inflight[key] = self._enqueue(key)
+			results.append(self._inflight[key])
+
+		events = []
+		for (lensId, astrometry), result in zip(keys, results):
+			if isinstance(result, asyncio.Future):
+				result = await asyncio.shield(result)
+			events.extend(dict(e) for e in result)
+		events.sort(key=lambda e: -e['centroid_shift'])
+		return events
+
+	def _enqueue(self, key):
+		# queue a lens to be solved in the next batch
+		future = asyncio.get_running_loop().create_future()
+		self._pending.append((key, future))
+		if len(self._pending) >= self.maxBatch:
+			self._flush()
+		elif self._timer is None:
+			self._timer = asyncio.get_running_loop().call_later(self.batchWait, self._flush)
+		return future
+
+	def _flush(self):
+		# solve the pending lenses, one batch per window
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		pending, self._pending = self._pending, []
+		batches = OrderedDict()
+		seen = {}
+		for key, future in pending:
+			#events are split back by lens id, so a lens
+			#id repeated in a window, e.g. -1 of lenses
+			#given by coordinates, starts a new batch
+			window = key[len(LENS_FIELDS) + 1:]
+			n = seen.get((key[0], window), 0)
+			seen[key[0], window] = n + 1
+			batches.setdefault((window, n), []).append((key, future))
+		for (window, n), batch in batches.items():
+			asyncio.ensure_future(self._solve(window, batch))
+
+	async def _solve(self, window, batch):
+		start, end, corridor, mass, minShift = window
+		keys = [key for key, future in batch]
+		ids = np.array([key[0] for key in keys], dtype=np.int64)
+		columns = dict((name, np.array([key[i + 1] for key in keys], dtype=float))
+			for i, name in enumerate(LENS_FIELDS))
+		options = Namespace(start=start, end=end, corridor=corridor, mass=mass, min_shift=minShift)
+		self.stats['batches'] += 1
+		try:
+			events = await asyncio.get_running_loop().run_in_executor(self.pool,
+				_solveBatch, ids, columns, options)
+		except Exception as exc:
+			for key, future in batch:
+				del self._inflight[key]
+				future.set_exception(exc)
+			return
+
+		#split the events back by lens id
+		events = events[np.argsort(events['lens_id'], kind='stable')]
+		lo = np.searchsorted(events['lens_id'], ids, side='left')
+		hi = np.searchsorted(events['lens_id'], ids, side='right')
+		for row, (key, future) in enumerate(batch):
+			result = [dict(zip(EVENT_FIELDS, e)) for e in events[lo[row]:hi[row]].tolist()]
+			self._store(key, result)
+			del self._inflight[key]
+			future.set_result(result)
+		self.stats['solved'] += len(batch)
+
+	def _store(self, key, result):
+		self._cache[key] = result
+		while len(self._cache) > self.cacheSize:
+			self._cache.popitem(last=False)
+
+	async def handle(self, reader, writer):
+		"""Answer the JSON queries of one connection, one
+		per line, each answered by a line of
+		{'id', 'events'} or {'id', 'error'}. A query of
+		{'stats' : true} is answered by the service
+		counters."""
+		try:
+			while True:
+				line = await reader.readline()
+				if not line:
+					break
+				query = {}
+				try:
+					query = json.loads(line)
+					if query.get('stats'):
+						reply = {'stats' : self.stats}
+					else:
+						reply = {'events' : await self.predict(query)}
+				except Exception as exc:
+					#bad queries and failed solves are
+					#answered, not fatal to the connection
+					query = query if isinstance(query, dict) else {}
+					reply = {'error' : '%s: %s' % (type(exc).__name__, exc)}
+				reply['id'] = query.get('id')
+				writer.write((json.dumps(reply) + '\n').encode())
+				await writer.drain()
+		finally:
+			writer.close()
+
+	async def serve(self, host='127.0.0.1', port=8765, ready=None):
+		"""Serve queries on host:port until cancelled.
+		ready, an asyncio.Future, is given the bound
+		port once the service is listening."""
+		self.start()
+		server = await asyncio.start_server(self.handle, host, port)
+		if ready is not None:
+			ready.set_result(server.sockets[0].getsockname()[1])
+		async with server:
+			await server.serve_forever()
+
+
+def parseArgs(argv=None):
+	parser = argparse.ArgumentParser(description='Serve event predictions for lenses '
+		'against a preloaded source catalog.')
+	parser.add_argument('lenses', help='lens catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('sources', help='source catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+	parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+	parser.add_argument('--workers', type=int, default=os.cpu_count(),
+		help='number of worker processes')
+	parser.add_argument('--start', type=float, default=ca.GAIA_MISSION[0],
+		help='start of the service window [decimal years]')
+	parser.add_argument('--end', type=float, default=ca.GAIA_MISSION[1],
+		help='end of the service window [decimal years]')
+	parser.add_argument('--corridor', type=float, default=1000.0,
+		help='default largest closest approach to report [mas]')
+	parser.add_argument('--mass', type=float, default=0.5, help='default lens mass [Msol]')
+	parser.add_argument('--min-shift', type=float, default=0.0,
+		help='default smallest centroid shift to report [mas]')
+	parser.add_argument('--epoch', type=float, default=2015.5,
+		help='reference epoch for catalogs and lenses without one')
+	parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+		help='number of solved lenses to cache')
+	parser.add_argument('--batch-wait', type=float, default=BATCH_WAIT,
+		help='time a query waits to be batched [s]')
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	options = parseArgs(argv)
+	lenses = cs.readCatalog(options.lenses, options.epoch)
+	sources = cs.readCatalog(options.sources, options.epoch)
+	service = predictionService(lenses, cs.shipCatalog(options.sources, sources), options,
+		workers=options.workers, cacheSize=options.cache_size, batchWait=options.batch_wait)
+	print('serving %d lenses and %d sources on %s:%d' % (len(lenses), len(sources),
+		options.host, options.port))
+	try:
+		asyncio.run(service.serve(options.host, options.port))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		service.close()
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,135 @@
+###############################################
+#      profiling                              #
+# Opt-in counters and stage timers for the    #
+# skyobj computation paths.                   #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import functools
+import json
+import time
+
+
+# Off by default. While off every hook is a single
+# flag test, so the instrumented code runs at full
+# speed.
+ENABLED = False
+
+_counters = {}
+_timers = {}
+
+
+def enable(on=True):
+	"""Turn profiling on (or off with on=False)."""
+	global ENABLED
+	ENABLED = on
+
+
+def disable():
+	enable(False)
+
+
+def reset():
+	"""Zero every counter and timer."""
+	_counters.clear()
+	_timers.clear()
+
+
+def count(name, n=1):
+	"""Add n to the counter name, e.g. cache hits or
+	optimizer function evaluations."""
+	if ENABLED:
+		_counters[name] = _counters.get(name, 0) + n
+
+
+def _record(name, seconds):
+	calls, total = _timers.get(name, (0, 0.0))
+	_timers[name] = (calls + 1, total + seconds)
+
+
+class _stageTimer(object):
+
+	__slots__ = ('name', 'start')
+
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		_record(self.name, time.perf_counter() - self.start)
+
+
+class _nullTimer(object):
+
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		pass
+
+
+_NULL_TIMER = _nullTimer()
+
+
+def timer(name):
+	"""Context manager adding the wall time of its
+	block to the stage name."""
+	return _stageTimer(name) if ENABLED else _NULL_TIMER
+
+
+def profiled(name):
+	"""Decorator counting the calls of a function and
+	their cumulative wall time under name. Times are
+	inclusive of any profiled functions called
+	inside."""
+	def wrap(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			if not ENABLED:
+				return func(*args, **kwargs)
+			start = time.perf_counter()
+			try:
+				return func(*args, **kwargs)
+			finally:
+				_record(name, time.perf_counter() - start)
+		return wrapper
+	return wrap
+
+
+def report():
+	"""The counters and timers so far, as a dict of
+	{'counters' : {name : n},
+	 'timers' : {name : {'calls' : n, 'seconds' : s}}}"""
+	return {'counters' : dict(_counters),
+		'timers' : dict((name, {'calls' : calls, 'seconds' : seconds})
+			for name, (calls, seconds) in _timers.items())}
+
+
+def merge(reports):
+	"""Sum reports, e.g. from several worker
+	processes, into one."""
+	total = {'counters' : {}, 'timers' : {}}
+	for r in reports:
+		for name, n in r['counters'].items():
+			total['counters'][name] = total['counters'].get(name, 0) + n
+		for name, t in r['timers'].items():
+			old = total['timers'].get(name, {'calls' : 0, 'seconds' : 0.0})
+			total['timers'][name] = {'calls' : old['calls'] + t['calls'],
+				'seconds' : old['seconds'] + t['seconds']}
+	return total
+
+
+def toJSON(path=None, data=None):
+	"""Write a report (by default the current one) as
+	JSON to path, or return it as a string."""
+	text = json.dumps(report() if data is None else data, indent=1, sort_keys=True)
+	if path is None:
+		return text
+	with open(path, 'w') as f:
+		f.write(text)
@@ -0,0 +1,255 @@
+###############################################
+#      resultStore                            #
+# A persistent (sqlite) store of candidate    #
+# events, updated incrementally when the      #
+# catalog astrometry changes.                 #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import json
+import sqlite3
+import sys
+import numpy as np
+import closestApproach as ca
+import pairFinder as pf
+import candidateSearch as cs
+
+
+# Astrometry a row hash covers, the skyobj.__init__
+# fields other than id.
+HASH_COLUMNS = ('ra_0', 'dec_0', 'epoch_0', 'pmra', 'pmdec', 'parallax', 'gMag')
+
+# Search options the stored events depend on
+OPTIONS = ('start', 'end', 'corridor', 'mass')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS lenses (id INTEGER PRIMARY KEY, hash INTEGER);
+CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, hash INTEGER);
+CREATE TABLE IF NOT EXISTS events (lens_id INTEGER, source_id INTEGER,
+	lens_hash INTEGER, source_hash INTEGER, t_min REAL, min_sep REAL,
+	pos_angle REAL, centroid_shift REAL, PRIMARY KEY (lens_id, source_id));
+CREATE INDEX IF NOT EXISTS events_source ON events (source_id);
+"""
+
+_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(h):
+	# splitmix64 finaliser, wrapping uint64 arithmetic
+	h = h ^ (h >> np.uint64(30))
+	h = h * np.uint64(0xBF58476D1CE4E5B9)
+	h = h ^ (h >> np.uint64(27))
+	h = h * np.uint64(0x94D049BB133111EB)
+	return h ^ (h >> np.uint64(31))
+
+
+def rowHash(catalog):
+	"""64 bit hash of the astrometry of every catalog
+	row (HASH_COLUMNS), computed column by column.
+
+	Args:
+	   catalog (skycatalog)
+
+	Returns:
+	   hash (array) : int64 hash of each row
+	"""
+
+	h = np.zeros(len(catalog), dtype=np.uint64)
+	with np.errstate(over='ignore'):
+		for name in HASH_COLUMNS:
+			col = np.ascontiguousarray(getattr(catalog, name), dtype=np.float64)
+			#one bit pattern for every NaN
+			col = np.where(np.isnan(col), np.nan, col)
+			h = _mix((h ^ col.view(np.uint64)) * _MULT)
+	return h.view(np.int64)
+
+
+def _changed(ids, hashes, storedIds, storedHashes):
+	# mask of catalog rows that are new or whose hash
+	# differs from the stored one
+	if len(storedIds) == 0:
+		return np.ones(len(ids), dtype=bool)
+	order = np.argsort(storedIds)
+	storedIds = storedIds[order]
+	storedHashes = storedHashes[order]
+	pos = np.minimum(np.searchsorted(storedIds, ids), len(storedIds) - 1)
+	return (storedIds[pos] != ids) | (storedHashes[pos] != hashes)
+
+
+class resultStore(object):
+	"""Events of a lens and a source catalog kept in an
+	sqlite database, keyed by lens and source id.
+
+	Each event is stored with the hashes of its lens and
+	source astrometry, and each catalog row's hash is
+	kept, so update recomputes only the pairs whose
+	inputs changed.
+	"""
+
+	def __init__(self, path):
+		"""
+		Args:
+		   path (str) : sqlite database file, created if
+				missing.
+		"""
+
+		self.path = path
+		self.db = sqlite3.connect(path)
+		self.db.executescript(_SCHEMA)
+
+	def close(self):
+		self.db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _ids(self, table):
+		rows = self.db.execute('SELECT id, hash FROM %s' % table).fetchall()
+		data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+		return data[:, 0], data[:, 1]
+
+	def _options(self):
+		row = self.db.execute("SELECT value FROM meta WHERE key = 'options'").fetchone()
+		return None if row is None else json.loads(row[0])
+
+	def _forget(self, table, column, ids):
+		# delete rows of table whose column is in ids
+		self.db.executemany('DELETE FROM %s WHERE %s = ?' % (table, column),
+			[(i,) for i in ids.tolist()])
+
+	def update(self, lenses, sources, options):
+		"""Bring the store up to date with the catalogs.
+
+		Only pairs with a new or changed lens or source
+		are searched for (pairFinder.findPairs) and solved
+		(candidateSearch.solvePairs). Events of stars that
+		changed or left a catalog are dropped first. A
+		change of the search options recomputes every pair.
+
+		Args:
+		   lenses, sources (skycatalog) : Current catalogs.
+
+		   options (argparse.Namespace) : Search options
+						  (start, end, corridor,
+						  mass).
+
+		Returns:
+		   counts (dict) : Number of changed lenses and
+				   sources, removed stars, events
+				   dropped, pairs recomputed and
+				   events now stored.
+		"""
+
+		opts = dict((k, getattr(options, k)) for k in OPTIONS)
+		if self._options() != opts:
+			for table in ('lenses', 'sources', 'events'):
+				self.db.execute('DELETE FROM %s' % table)
+			self.db.execute("INSERT OR REPLACE INTO meta VALUES ('options', ?)",
+				(json.dumps(opts),))
+
+		lensHash = rowHash(lenses)
+		sourceHash = rowHash(sources)
+		storedL = self._ids('lenses')
+		storedS = self._ids('sources')
+		lensNew = _changed(lenses.id, lensHash, *storedL)
+		sourceNew = _changed(sources.id, sourceHash, *storedS)
+		goneL = np.setdiff1d(storedL[0], lenses.id)
+		goneS = np.setdiff1d(storedS[0], sources.id)
+
+		before = self.db.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+		self._forget('events', 'lens_id', np.concatenate((lenses.id[lensNew], goneL)))
+		self._forget('events', 'source_id', np.concatenate((sources.id[sourceNew], goneS)))
+		dropped = before - self.db.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+		self._forget('lenses', 'id', goneL)
+		self._forget('sources', 'id', goneS)
+
+		#changed lenses against every source, every lens
+		#against changed sources
+		positive = lenses.parallax > 0
+		lensIdx = []
+		sourceIdx = []
+		rowsL = np.nonzero(lensNew & positive)[0]
+		if len(rowsL) and len(sources):
+			l, s = pf.findPairs(lenses.take(rowsL), sources, options.start, options.end,
+				corridor=options.corridor)
+			lensIdx.append(rowsL[l])
+			sourceIdx.append(s)
+		rowsS = np.nonzero(sourceNew)[0]
+		rowsP = np.nonzero(positive)[0]
+		if len(rowsS) and len(rowsP):
+			l, s = pf.findPairs(lenses.take(rowsP), sources.take(rowsS), options.start,
+				options.end, corridor=options.corridor)
+			lensIdx.append(rowsP[l])
+			sourceIdx.append(rowsS[s])
+
+		events = np.zeros(0, dtype=cs.RESULT_DTYPE)
+		if lensIdx:
+			key = np.unique(np.concatenate(lensIdx) * np.int64(len(sources)) +
+				np.concatenate(sourceIdx))
+			lensIdx = key // len(sources)
+			sourceIdx = key % len(sources)
+			events = cs.solvePairs(lenses, sources, lensIdx, sourceIdx, options)
+
+		rows = zip(events['lens_id'].tolist(), events['source_id'].tolist(),
+			lensHash[lensIdx].tolist() if len(events) else [],
+			sourceHash[sourceIdx].tolist() if len(events) else [],
+			events['t_min'].tolist(), events['min_sep'].tolist(),
+			events['pos_angle'].tolist(), events['centroid_shift'].tolist())
+		self.db.executemany('INSERT OR REPLACE INTO events VALUES (?,?,?,?,?,?,?,?)', rows)
+
+		self.db.executemany('INSERT OR REPLACE INTO lenses VALUES (?,?)',
+			zip(lenses.id[lensNew].tolist(), lensHash[lensNew].tolist()))
+		self.db.executemany('INSERT OR REPLACE INTO sources VALUES (?,?)',
+			zip(sources.id[sourceNew].tolist(), sourceHash[sourceNew].tolist()))
+		self.db.commit()
+
+		return {'lenses_changed' : int(lensNew.sum()), 'sources_changed' : int(sourceNew.sum()),
+			'lenses_removed' : len(goneL), 'sources_removed' : len(goneS),
+			'events_dropped' : dropped, 'pairs_recomputed' : len(events),
+			'events' : self.db.execute('SELECT COUNT(*) FROM events').fetchone()[0]}
+
+	def events(self):
+		"""Every stored event as a structured array of
+		candidateSearch.RESULT_DTYPE, ranked by centroid
+		shift."""
+		rows = self.db.execute('SELECT lens_id, source_id, t_min, min_sep, pos_angle, '
+			'centroid_shift FROM events ORDER BY centroid_shift DESC').fetchall()
+		return np.array(rows, dtype=cs.RESULT_DTYPE)
+
+
+def parseArgs(argv=None):
+	parser = argparse.ArgumentParser(description='Update a store of candidate events '
+		'from new lens and source catalogs.')
+	parser.add_argument('store', help='sqlite result store')
+	parser.add_argument('lenses', help='lens catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('sources', help='source catalog (csv, parquet, fits or skycat directory)')
+	parser.add_argument('--start', type=float, default=ca.GAIA_MISSION[0],
+		help='start of the search window [decimal years]')
+	parser.add_argument('--end', type=float, default=ca.GAIA_MISSION[1],
+		help='end of the search window [decimal years]')
+	parser.add_argument('--corridor', type=float, default=1000.0,
+		help='largest closest approach to report [mas]')
+	parser.add_argument('--mass', type=float, default=0.5, help='lens mass [Msol]')
+	parser.add_argument('--epoch', type=float, default=None,
+		help='reference epoch for catalogs without an epoch column')
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	options = parseArgs(argv)
+	lenses = cs.readCatalog(options.lenses, options.epoch)
+	sources = cs.readCatalog(options.sources, options.epoch)
+	with resultStore(options.store) as store:
+		counts = store.update(lenses, sources, options)
+	for key in sorted(counts):
+		print('%-18s %d' % (key, counts[key]))
+
+
+if __name__ == '__main__':
+	sys.exit(main())
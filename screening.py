@@ -0,0 +1,146 @@
+###############################################
+#      screening                              #
+# Cheap, conservative bounds that reject      #
+# lens-source pairs before the full closest   #
+# approach solve.                             #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import numpy as np
+import closestApproach as ca
+import microlens as m
+
+
+# Largest plausible lens mass [Msol], used for the
+# shift bound when no mass is given.
+MAX_MASS = 1.4
+
+# Screening stages, in the order they are applied
+STAGES = ('parallax', 'separation', 'shift')
+
+
+def separationLowerBound(lenses, sources, lensIdx, sourceIdx, tStart, tEnd):
+	"""A lower bound on the separation of each pair
+	inside [tStart,tEnd] [mas]
+
+	The separation is the linear motion separation plus
+	the parallax displacements of lens and source, each
+	no larger than its parallax, so it is never below
+	the smallest linear separation in the window less
+	|plxL| + |plxS|.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs.
+
+	   lensIdx, sourceIdx (array) : Row of the lens and the
+					source of each pair.
+
+	   tStart, tEnd (float) : Time window [Decimal Years]
+
+	Returns:
+	   sepBound (array) : Lower bound on the separation,
+			      0 where none can be given [mas]
+	"""
+
+	linSep = ca.linearMinSep(*ca.relativeMotion(lenses, sources, lensIdx, sourceIdx),
+		tStart=tStart, tEnd=tEnd)
+	plx = np.abs(lenses.parallax[lensIdx]) + np.abs(sources.parallax[sourceIdx])
+	return np.maximum(linSep - plx, 0.0)
+
+
+def shiftUpperBound(lensParallax, sepBound, maxMass=MAX_MASS):
+	"""An upper bound on the centroid shift of each pair
+	[mas]
+
+	The dark lens shift u thetaE / (u^2 + 2), with
+	u = sep / thetaE, peaks at thetaE / (2 sqrt 2) for
+	u = sqrt 2 and falls beyond it. A luminous lens only
+	lowers it. So the bound is the peak when the
+	separation bound is within sqrt(2) thetaE and the
+	shift at the separation bound otherwise.
+
+	Args:
+	   lensParallax (array) : Lens parallax [mas], must be
+				  positive.
+
+	   sepBound (array) : Lower bound on the separation [mas]
+
+	   maxMass (float or array, optional) : Largest lens mass
+						considered [Msol]
+
+	Returns:
+	   shiftBound (array) : Upper bound on the centroid shift
+				[mas]
+	"""
+
+	thetaE = m.get_enstien_R(maxMass, m.get_dist(lensParallax))
+	u = sepBound / thetaE
+	return np.where(u <= np.sqrt(2.0), thetaE / (2.0 * np.sqrt(2.0)), u * thetaE / (u**2 + 2.0))
+
+
+def screenPairs(lenses, sources, lensIdx, sourceIdx, tStart, tEnd, maxSep=np.inf,
+		minShift=0.0, maxMass=MAX_MASS):
+	"""Reject pairs that provably miss the thresholds.
+
+	Stages, each on the survivors of the last:
+
+	   parallax   : the lens has a positive parallax, so a
+			distance.
+	   separation : separationLowerBound <= maxSep.
+	   shift      : shiftUpperBound >= minShift.
+
+	Every rejection is rigorous, so survivors are a
+	superset of the pairs the full solve would keep.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs.
+
+	   lensIdx, sourceIdx (array) : Row of the lens and the
+					source of each pair.
+
+	   tStart, tEnd (float) : Time window [Decimal Years]
+
+	   maxSep (float, optional) : Largest separation of
+				      interest [mas]
+
+	   minShift (float, optional) : Smallest detectable
+					centroid shift [mas]
+
+	   maxMass (float, optional) : Largest lens mass [Msol]
+
+	Returns:
+	   keep (array) : Mask of the surviving pairs.
+
+	   counts (dict) : 'pairs', the number of pairs in, and
+			   the number pruned by each stage.
+	"""
+
+	lensIdx = np.asarray(lensIdx, dtype=np.intp)
+	sourceIdx = np.asarray(sourceIdx, dtype=np.intp)
+	counts = {'pairs' : len(lensIdx)}
+
+	keep = lenses.parallax[lensIdx] > 0
+	counts['parallax'] = len(lensIdx) - int(keep.sum())
+
+	rows = np.nonzero(keep)[0]
+	sepBound = separationLowerBound(lenses, sources, lensIdx[rows], sourceIdx[rows], tStart, tEnd)
+	near = sepBound <= maxSep
+	keep[rows[~near]] = False
+	counts['separation'] = len(rows) - int(near.sum())
+
+	rows = rows[near]
+	shiftBound = shiftUpperBound(lenses.parallax[lensIdx[rows]], sepBound[near], maxMass)
+	strong = shiftBound >= minShift
+	keep[rows[~strong]] = False
+	counts['shift'] = len(rows) - int(strong.sum())
+
+	return keep, counts
+
+
+def addCounts(total, counts):
+	"""Add the screening counts of one call to a
+	running total."""
+	for key, value in counts.items():
+		total[key] = total.get(key, 0) + value
+	return total
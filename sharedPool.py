@@ -0,0 +1,207 @@
+###############################################
+#      sharedPool                             #
+# Closest approach solves on a pool of        #
+# processes sharing the catalog columns and   #
+# results through shared memory.              #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import os
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import candidateSearch as cs
+from skycatalog import skycatalog
+
+
+# Pairs solved by one task
+CHUNK_SIZE = 10000
+
+# skycatalog.fromColumns keys and the attribute each
+# is read from.
+COLUMNS = (('id', 'id'), ('ra', 'ra_0'), ('dec', 'dec_0'), ('epoch', 'epoch_0'),
+	('pmra', 'pmra'), ('pmdec', 'pmdec'), ('parallax', 'parallax'), ('Gmag', 'gMag'))
+
+
+def attach(spec):
+	"""Open a shared array in another process.
+
+	Args:
+	   spec (tuple) : (name, shape, dtype) of the block, as
+			  returned by sharedArrays.
+
+	Returns:
+	   block, array (SharedMemory,array) : The block, which
+					       must outlive the
+					       array, and the
+					       array on it.
+	"""
+
+	name, shape, dtype = spec
+	block = shared_memory.SharedMemory(name=name)
+	return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+class sharedArrays(object):
+	"""Owner of a set of shared memory blocks.
+
+	Blocks are made by share and empty, and every one
+	is unlinked by close, or on leaving a with block
+	however it is left, e.g. by a BrokenProcessPool
+	after a worker crash. Workers only attach.
+	"""
+
+	def __init__(self):
+		self.blocks = []
+
+	def empty(self, shape, dtype):
+		"""A new shared array and its spec.
+
+		Args:
+		   shape (tuple or int) : Array shape.
+
+		   dtype (np.dtype) : Array dtype, may be structured.
+
+		Returns:
+		   array, spec (array,tuple) : The array and the spec to
+					       attach it with.
+		"""
+
+		shape = tuple(np.atleast_1d(shape))
+		dtype = np.dtype(dtype)
+		nbytes = int(np.prod(shape)) * dtype.itemsize
+		#a block can not be empty
+		block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+		self.blocks.append(block)
+		return np.ndarray(shape, dtype=dtype, buffer=block.buf), (block.name, shape, dtype)
+
+	def share(self, array):
+		"""Copy array into a new shared block, returning
+		its spec."""
+		array = np.asarray(array)
+		shared, spec = self.empty(array.shape, array.dtype)
+		shared[...] = array
+		return spec
+
+	def shareCatalog(self, catalog):
+		"""Copy the columns of a skycatalog into shared
+		blocks, returning their specs (see
+		attachCatalog)."""
+		return dict((key, self.share(getattr(catalog, name))) for key, name in COLUMNS)
+
+	def close(self):
+		"""Unlink every block."""
+		blocks, self.blocks = self.blocks, []
+		for block in blocks:
+			try:
+				block.unlink()
+			except FileNotFoundError:
+				pass
+			try:
+				block.close()
+			except BufferError:
+				#an array still views it, the memory
+				#goes with the last reference
+				pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def attachCatalog(specs):
+	"""Open a catalog shared by sharedArrays.shareCatalog,
+	without copying it.
+
+	Returns:
+	   blocks, catalog (list,skycatalog) : The blocks, which
+					       must outlive the
+					       catalog, and the
+					       catalog.
+	"""
+
+	blocks = []
+	columns = {}
+	for key, spec in specs.items():
+		block, columns[key] = attach(spec)
+		blocks.append(block)
+	return blocks, skycatalog.fromColumns(columns)
+
+
+# Shared arrays of the current solve, attached once in
+# each worker process by _initWorker.
+_worker = {}
+
+
+def _initWorker(lensSpecs, sourceSpecs, lensIdxSpec, sourceIdxSpec, outSpec, options):
+	blocks, lenses = attachCatalog(lensSpecs)
+	more, sources = attachCatalog(sourceSpecs)
+	blocks += more
+	arrays = []
+	for spec in (lensIdxSpec, sourceIdxSpec, outSpec):
+		block, array = attach(spec)
+		blocks.append(block)
+		arrays.append(array)
+	_worker.update(blocks=blocks, lenses=lenses, sources=sources, lensIdx=arrays[0],
+		sourceIdx=arrays[1], out=arrays[2], options=options)
+
+
+def _solveRange(lo, hi):
+	# solve pairs [lo,hi) into the shared output
+	w = _worker
+	w['out'][lo:hi] = cs.solvePairs(w['lenses'], w['sources'], w['lensIdx'][lo:hi],
+		w['sourceIdx'][lo:hi], w['options'])
+	return hi - lo
+
+
+def solvePairs(lenses, sources, lensIdx, sourceIdx, options, workers=None, chunkSize=CHUNK_SIZE):
+	"""candidateSearch.solvePairs on a pool of processes.
+
+	The catalog columns, the pair rows and the output are
+	put in shared memory once. Tasks are only a range of
+	pairs, each worker writing its events straight into
+	the shared output, so neither catalogs nor results
+	are pickled. The shared blocks are unlinked when the
+	solve ends, whether or not it succeeds.
+
+	Args:
+	   lenses, sources (skycatalog) : Lens and source catalogs.
+
+	   lensIdx, sourceIdx (array) : Row of the lens and the
+					source of each pair.
+
+	   options (argparse.Namespace) : Search options
+					  (start, end, mass).
+
+	   workers (int, optional) : Number of worker processes,
+				     by default one per cpu.
+
+	   chunkSize (int, optional) : Pairs solved per task.
+
+	Returns:
+	   events (np.array) : Structured array of
+			       candidateSearch.RESULT_DTYPE
+	"""
+
+	lensIdx = np.asarray(lensIdx, dtype=np.intp)
+	sourceIdx = np.asarray(sourceIdx, dtype=np.intp)
+	options = Namespace(start=options.start, end=options.end, mass=options.mass)
+	nPairs = len(lensIdx)
+
+	with sharedArrays() as shared:
+		out, outSpec = shared.empty(nPairs, cs.RESULT_DTYPE)
+		initargs = (shared.shareCatalog(lenses), shared.shareCatalog(sources),
+			shared.share(lensIdx), shared.share(sourceIdx), outSpec, options)
+		with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_initWorker,
+				initargs=initargs) as pool:
+			bounds = list(range(0, nPairs, chunkSize))
+			#results arrive through out, map only
+			#raises any worker error
+			list(pool.map(_solveRange, bounds, [min(lo + chunkSize, nPairs) for lo in bounds]))
+		events = out.copy()
+		del out
+	return events
@@ -0,0 +1,286 @@
+#############################
+##      skycatalog         ##
+##  A columnar catalog of  ##
+##  skyobj's, vectorized   ##
+##  over stars and epochs  ##
+## @author Peter McGill    ##
+## @email pm625@cam.ac.uk  ##
+#############################
+
+import numpy as np
+import tangentPlaneUtils as tp
+import profiling as prof
+from skyobj import skyobj
+
+
+class skycatalog(object):
+	"""A struct-of-arrays companion to skyobj.
+
+	Every attribute of skyobj is held as a NumPy column
+	(one entry per star) and every method is evaluated for
+	all stars at once. When epoch is an array the results
+	have shape (nStars, nEpochs), when it is a scalar they
+	have shape (nStars,).
+	"""
+
+	MAS_TO_DEG = skyobj.MAS_TO_DEG
+
+	def __init__(self,id=None,ra=None,dec=None,epoch=None,pmra=None,pmdec=None,parallax=None,Gmag=None):
+		"""
+		Args:
+		   id (array_like, optional) : Source identifiers.
+
+		   ra, dec (array_like) : Equatorial coordinates at
+					  epoch [Degrees]
+
+		   epoch (array_like or float) : Reference epoch of
+						 the astrometry [Decimal Years]
+
+		   pmra, pmdec (array_like, optional) : Proper motions
+							[mas/yr]. Missing
+							(None or NaN)
+							values are set
+							to zero.
+
+		   parallax (array_like, optional) : Parallax [mas].
+						     Missing values
+						     are set to zero.
+
+		   Gmag (array_like, optional) : G magnitude. Missing
+						 values are NaN (dark).
+		"""
+
+		self.ra_0 = np.atleast_1d(np.asarray(ra,dtype=float))
+		self.dec_0 = self._column(dec,np.nan)
+
+		self.id = (np.arange(len(self)) if id is None
+			else np.atleast_1d(np.asarray(id)))
+		self.epoch_0 = self._column(epoch,np.nan)
+
+		#set proper motions and parallax to zero if
+		#not specified, as skyobj does.
+		self.pmra = self._column(pmra,0.0)
+		self.pmdec = self._column(pmdec,0.0)
+		self.parallax = self._column(parallax,0.0)
+
+		self.gMag = self._column(Gmag,np.nan)
+
+		#every star is its own tangent point.
+		self.xi_0 = np.zeros(len(self))
+		self.eta_0 = np.zeros(len(self))
+
+	def _column(self,values,default):
+		#broadcast a column to the catalog length,
+		#replacing missing values by default.
+		if values is None:
+			return np.full(len(self),default)
+		col = np.asarray(values,dtype=float)
+		if col.shape != self.ra_0.shape:
+			col = np.broadcast_to(col,self.ra_0.shape).copy()
+		missing = np.isnan(col)
+		if missing.any():
+			col = np.where(missing,default,col)
+		return col
+
+	@classmethod
+	def fromSkyobjs(cls,objs):
+		"""Build a catalog from a sequence of skyobj's."""
+		objs = list(objs)
+		def col(name):
+			return [np.nan if getattr(o,name) is None else getattr(o,name) for o in objs]
+
+		return cls(id=[o.id for o in objs],ra=col('ra_0'),dec=col('dec_0'),
+			epoch=col('epoch_0'),pmra=col('pmra'),pmdec=col('pmdec'),
+			parallax=col('parallax'),Gmag=col('gMag'))
+
+	@classmethod
+	def fromColumns(cls,columns):
+		"""Wrap complete columns without copying them,
+		e.g. memory mapped arrays (see catalogIO).
+
+		Args:
+		   columns (dict) : Full length float64 arrays for
+				    'ra', 'dec', 'epoch', 'pmra',
+				    'pmdec', 'parallax' and 'Gmag',
+				    with missing values already
+				    filled in as __init__ does,
+				    plus 'id'.
+
+		Returns:
+		   catalog (skycatalog)
+		"""
+		cat = cls.__new__(cls)
+		cat.ra_0 = columns['ra']
+		cat.dec_0 = columns['dec']
+		cat.id = columns['id']
+		cat.epoch_0 = columns['epoch']
+		cat.pmra = columns['pmra']
+		cat.pmdec = columns['pmdec']
+		cat.parallax = columns['parallax']
+		cat.gMag = columns['Gmag']
+		cat.xi_0 = np.zeros(len(cat))
+		cat.eta_0 = np.zeros(len(cat))
+		return cat
+
+	def __len__(self):
+		return self.ra_0.shape[0]
+
+	def take(self,rows):
+		"""Return the catalog rows (index array, mask
+		or slice) as a new skycatalog."""
+		return skycatalog(id=self.id[rows],ra=self.ra_0[rows],dec=self.dec_0[rows],
+			epoch=self.epoch_0[rows],pmra=self.pmra[rows],pmdec=self.pmdec[rows],
+			parallax=self.parallax[rows],Gmag=self.gMag[rows])
+
+	def rowsOf(self,ids):
+		"""Catalog rows of the given ids.
+
+		The ids of the catalog are sorted once, on the
+		first call, and looked up by binary search.
+
+		Args:
+		   ids (array_like) : Source identifiers.
+
+		Returns:
+		   rows (array) : Row of each id, shaped like ids.
+
+		Raises:
+		   ValueError : If an id is not in the catalog.
+		"""
+		ids = np.asarray(ids)
+		if getattr(self,'_idOrder',None) is None:
+			self._idOrder = np.argsort(self.id,kind='stable')
+			self._sortedIds = self.id[self._idOrder]
+		if len(self._idOrder) == 0:
+			if ids.size:
+				raise ValueError('ids missing from the catalog')
+			return np.zeros(ids.shape,dtype=np.intp)
+		pos = np.minimum(np.searchsorted(self._sortedIds,ids),len(self._idOrder) - 1)
+		if (self._sortedIds[pos] != ids).any():
+			raise ValueError('ids missing from the catalog')
+		return self._idOrder[pos]
+
+	def getObj(self,i):
+		"""Return row i of the catalog as a skyobj."""
+		gMag = None if np.isnan(self.gMag[i]) else float(self.gMag[i])
+		return skyobj(id=self.id[i],ra=float(self.ra_0[i]),dec=float(self.dec_0[i]),
+			epoch=float(self.epoch_0[i]),pmra=float(self.pmra[i]),
+			pmdec=float(self.pmdec[i]),parallax=float(self.parallax[i]),Gmag=gMag)
+
+	def _expand(self,col,epoch):
+		#add trailing axes to a column so it broadcasts
+		#against an array of epochs.
+		return col.reshape(col.shape + (1,) * np.ndim(epoch))
+
+	def getRaDecNoPlx(self,epoch):
+		"""
+		Get Equtorial coordinates of every star at
+		epoch time - does not take into account parallax.
+
+		Args:
+			epoch (float or array): Decimal Julian Year
+						time(s).
+
+		Returns:
+			ra,dec (array,array): Right ascesnion,
+					      Declination
+					      [Degrees]
+		"""
+
+		epoch = np.asarray(epoch,dtype=float)
+		dt = epoch - self._expand(self.epoch_0,epoch)
+
+		decfinal = (self._expand(self.dec_0,epoch) + dt *
+			self._expand(self.pmdec,epoch) * self.MAS_TO_DEG)
+		rafinal = (self._expand(self.ra_0,epoch) + dt *
+			self._expand(self.pmra / np.cos(np.deg2rad(self.dec_0)),epoch) * self.MAS_TO_DEG)
+
+		return rafinal, decfinal
+
+	def getRaDec(self,epoch):
+		"""Get Equtorial coordinates of every star
+		at time epoch, taking into acount parallax.
+
+		Args:
+		   epoch (float or array) : Decimal Julian Years time(s).
+
+		Returns:
+		   ra, dec, (array,array): Right ascesnion,Declination
+					   [Degrees]
+		"""
+
+		Xi,Eta = self.getXiEta(epoch)
+
+		return tp.tp2s(Xi,Eta,self._expand(self.ra_0,epoch),
+			self._expand(self.dec_0,epoch))
+
+	@prof.profiled('skycatalog.getXiEta')
+	def getXiEta(self,epoch):
+		"""
+		Get Tangent Plane coordinates (Xi,Eta) of every
+		star at time epoch, each defined from the star's
+		own reference position.
+
+		Args:
+			epoch (float or array): Decimal Julian Year
+						Time(s).
+
+		Returns:
+			Xi,Eta (array,array): Tangent Plane
+					      coordinates [mas]
+		"""
+
+		epoch = np.asarray(epoch,dtype=float)
+		mjd = tp.decimalYear2mjd(epoch)
+
+		return self._xiEta(epoch,mjd,self.xi_0,self.eta_0)
+
+	def _xiEta(self,epoch,mjd,xi_0,eta_0):
+		#tangent plane motion of every star from the
+		#offsets (xi_0,eta_0), shared by getXiEta
+		#and getSeparation.
+		dt = epoch - self._expand(self.epoch_0,epoch)
+		plx = self._expand(self.parallax,epoch)
+
+		#W and N of every star against the cached R(t)
+		fW,fN = tp.parallaxFactors(mjd,self.ra_0,self.dec_0)
+
+		EtaFinal = (plx * fN +
+			self._expand(self.pmdec,epoch) * dt + self._expand(eta_0,epoch))
+		XiFinal = (plx * fW +
+			self._expand(self.pmra,epoch) * dt + self._expand(xi_0,epoch))
+
+		return XiFinal, EtaFinal
+
+	@prof.profiled('skycatalog.getSeparation')
+	def getSeparation(self,epoch,source):
+		"""
+		Get angular separation between each star (lens)
+		and the matching row of source at time epoch,
+		in the tangent plane of the lens.
+
+		Args:
+			epoch (float or array): Decimal Julian Year
+						Time(s)
+
+			source (skycatalog): sources, either one
+					     per star or a single
+					     row shared by all
+					     stars.
+
+		Returns:
+			separation (array): Angular Separation
+					    [mas]
+		"""
+
+		epoch = np.asarray(epoch,dtype=float)
+		mjd = tp.decimalYear2mjd(epoch)
+
+		lens_xi,lens_eta = self._xiEta(epoch,mjd,self.xi_0,self.eta_0)
+
+		#source tangent plane coords defined by the
+		#lens reference position.
+		xi_0,eta_0 = tp.s2tp(source.ra_0,source.dec_0,self.ra_0,self.dec_0)
+		source_xi,source_eta = source._xiEta(epoch,mjd,xi_0,eta_0)
+
+		return np.hypot(lens_xi-source_xi, lens_eta-source_eta)
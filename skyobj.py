@@ -7,40 +7,32 @@
 #############################
 
 import numpy as np
-from astropy.time import Time
-from scipy.optimize import minimize_scalar
 import tangentPlaneUtils as tp
+import closestApproach as ca
 import microlens as m
-import matplotlib.pylab as plt
-from astropy.time import Time
-
-class skyobj(object):
+import profiling as prof
+
+# Record layout of a skyobj in a shared structured array,
+# see skyobjView. A missing id is stored as -1 and a
+# missing G magnitude as NaN.
+SKYOBJ_DTYPE = np.dtype([('id', 'i8'), ('ra_0', 'f8'), ('dec_0', 'f8'), ('epoch_0', 'f8'),
+	('pmra', 'f8'), ('pmdec', 'f8'), ('parallax', 'f8'), ('gMag', 'f8'),
+	('xi_0', 'f8'), ('eta_0', 'f8')])
+
+# Fields of skyobj.trajectory, one record per epoch.
+# Source fields are in the tangent plane of the lens.
+TRAJECTORY_DTYPE = np.dtype([('epoch', 'f8'), ('xi', 'f8'), ('eta', 'f8'), ('ra', 'f8'),
+	('dec', 'f8'), ('source_xi', 'f8'), ('source_eta', 'f8'), ('sep', 'f8'),
+	('shift', 'f8'), ('magnification', 'f8')])
+
+class _skyobjMethods(object):
+	#the methods of skyobj, shared with skyobjView.
+	#they only read the public attributes, so neither
+	#class needs storage here.
 
 	MAS_TO_DEG = 1.0 / (3600.0 * 1000.0)
 
-	def __init__(self,id=None,ra=None,dec=None,epoch=None,pmra=None,pmdec=None,parallax=None,Gmag=None):
-		"""
-
-		
-
-		"""
-		
-		
-		self.id  = id
-		self.ra_0 = ra
-		self.dec_0 = dec
-		self.epoch_0 = epoch
-
-		self.xi_0,self.eta_0 = tp.s2tp(ra,dec,ra,dec)
-		
-		self.gMag = Gmag
-				
-		#set proper motions and parallax to zero if
-		#not specified.
-		self.pmra = pmra if pmra else 0.0
-		self.pmdec = pmdec if pmdec else 0.0
-		self.parallax = parallax if parallax else 0.0
-		
+	__slots__ = ()
 
 	def getRaDecNoPlx(self,epoch):	
 		"""
@@ -70,11 +62,12 @@ class skyobj(object):
                 at time epoch, taking into acount parallax.
 
 		Args:
-		   epoch (float) : Decimal Julian Years time.
+		   epoch (float or array) : Decimal Julian Years time.
 
 		Returns:
 		   ra, dec, (float,float): Right ascesnion,Declination
-					   [Degrees]
+					   [Degrees], arrays if epoch
+					   is an array.
 
 		"""
 
@@ -84,6 +77,7 @@ class skyobj(object):
 		
 		return ra,dec 
 	
+	@prof.profiled('skyobj.getXiEta')
 	def getXiEta(self,epoch):
 		"""	
 		Get Tangent Plane coordinations 
@@ -101,21 +95,30 @@ class skyobj(object):
 					      coordinatea [mas]
 		"""
 		
-		mjd = Time(epoch, format='decimalyear').mjd
+		return self._xiEta(epoch,self.xi_0,self.eta_0)
+
+	def _xiEta(self,epoch,xi_0,eta_0):
+		#tangent plane motion of the skyobj from the
+		#offsets (xi_0,eta_0), shared by getXiEta and
+		#pairContext.
+		mjd = tp.decimalYear2mjd(epoch)
 		
 		EtaFinal = ((self.parallax) *tp.RdotN(mjd, self.ra_0, self.dec_0) + 
-			(self.pmdec) * (epoch - self.epoch_0) + self.eta_0)
+			(self.pmdec) * (epoch - self.epoch_0) + eta_0)
 		XiFinal = ((self.parallax)* tp.RdotW(mjd, self.ra_0) + 
-			(self.pmra) * (epoch - self.epoch_0) + self.xi_0)
+			(self.pmra) * (epoch - self.epoch_0) + xi_0)
 
 		return XiFinal, EtaFinal
 
-	def getSeparation(self,epoch,source):
+	def getSeparation(self,epoch,source,context=None):
 		"""
 		Get angular separation of two skyobj
 		(self,source) at time epoch, in tangent
 		plane coordinates.
 
+		Neither skyobj is modified, so one source
+		can be shared between lenses (and threads).
+
 		Args: 
 			epoch (float): Decimal Julian Year
 				       Time
@@ -123,24 +126,171 @@ class skyobj(object):
 			source (skyobj): source to find separation
 					 between.
 
+			context (pairContext, optional): The
+					 pair's lens-relative
+					 source coordinates, from
+					 getContext. Pass it when
+					 evaluating the same pair
+					 repeatedly.
+
 		Returns: 
 			separation (float): Angular Separation
 					    [mas]
 			
 		"""
 
-		lens_xi ,lens_eta = self.getXiEta(epoch)
-	
-		#set the source tanget plane coords
-		#defined by the lens reference position.
-		source.xi_0,source.eta_0 = tp.s2tp(source.ra_0,source.dec_0,self.ra_0,self.dec_0)
+		if context is None:
+			context = pairContext(self,source)
+		elif context.lens is not self or context.source is not source:
+			raise ValueError('context was made for a different lens-source pair')
 
-		source_xi,source_eta = source.getXiEta(epoch)
-	
-  
-		return np.hypot(lens_xi-source_xi, lens_eta-source_eta)
+		return context.getSeparation(epoch)
+
+	def getContext(self,source):
+		"""Return the pairContext of the skyobj (lens)
+		and source, for repeated calls to
+		getSeparation."""
+		return pairContext(self,source)
 	
-	def getMinTime(self,source):
+	def trajectory(self,epochs,source=None,lensMass=None,context=None,out=None):
+		"""
+		Get the path of the skyobj, and optionally of
+		an event with a source, at every epoch in one
+		vectorized call.
+
+		Args:
+			epochs (array): Decimal Julian Year
+					Times.
+
+			source (skyobj, optional): Source to
+					 follow. Without one the
+					 source fields are NaN.
+
+			lensMass (float, optional): Mass of the
+					 skyobj (lens) [Msol]. Without
+					 one shift and magnification
+					 are NaN.
+
+			context (pairContext, optional): See
+					 getSeparation.
+
+			out (np.array, optional): Structured
+					 array of TRAJECTORY_DTYPE
+					 shaped like epochs to
+					 fill in.
+
+		Returns:
+			track (np.array): Structured array of
+					  TRAJECTORY_DTYPE, the
+					  tangent plane position
+					  [mas], ra, dec [Degrees],
+					  source position and
+					  separation [mas], centroid
+					  shift [mas] and blended
+					  PSPL magnification at
+					  each epoch, both with the
+					  lens and source gMag.
+		"""
+
+		epochs = np.asarray(epochs,dtype=float)
+		if out is None:
+			out = np.empty(epochs.shape,dtype=TRAJECTORY_DTYPE)
+		elif out.shape != epochs.shape or out.dtype != TRAJECTORY_DTYPE:
+			raise ValueError('out must be a TRAJECTORY_DTYPE array shaped like epochs')
+
+		xi,eta = self.getXiEta(epochs)
+		out['epoch'] = epochs
+		out['xi'] = xi
+		out['eta'] = eta
+		out['ra'],out['dec'] = tp.tp2s(xi,eta,self.ra_0,self.dec_0)
+
+		if source is None:
+			for name in ('source_xi','source_eta','sep','shift','magnification'):
+				out[name] = np.nan
+			return out
+
+		if context is None:
+			context = pairContext(self,source)
+		sourceXi,sourceEta = context.getXiEta(epochs)
+		out['source_xi'] = sourceXi
+		out['source_eta'] = sourceEta
+		out['sep'] = np.hypot(xi-sourceXi, eta-sourceEta)
+
+		if lensMass is None:
+			out['shift'] = np.nan
+			out['magnification'] = np.nan
+		else:
+			lensDist = m.get_dist(self.parallax)
+			out['shift'] = m.get_centroid_shift(lensMass,lensDist,out['sep'],
+				lensMag=self.gMag,sourceMag=source.gMag)
+			out['magnification'] = m.get_blended_magnification(lensMass,lensDist,out['sep'],
+				lensMag=self.gMag,sourceMag=source.gMag)
+
+		return out
+
+	def getLinearMinTime(self,source):
+		"""
+		Get the time of closest approach between
+		the skyobj and a source ignoring parallax,
+		i.e. for linear relative motion.
+
+		Args:
+			source (skyobj): source skyobj to
+					 to get closest approach
+					 time for.
+
+		Returns:
+			minTime (float): The linear motion time
+					 of closest approach.
+					 [Decimal Years]
+		"""
+
+		context = pairContext(self,source)
+
+		#source position relative to the lens
+		#at the lens reference epoch.
+		dt = self.epoch_0 - source.epoch_0
+		dxi = context.xi_0 + source.pmra * dt
+		deta = context.eta_0 + source.pmdec * dt
+
+		return ca.linearMinTime(dxi,deta,source.pmra - self.pmra,
+			source.pmdec - self.pmdec,self.epoch_0)
+
+	@prof.profiled('skyobj.getMinima')
+	def getMinima(self,source,tStart=None,tEnd=None):
+		"""
+		Get every local minimum of the separation
+		between the skyobj and a source inside a
+		time window.
+
+		Args:
+			source (skyobj): source skyobj to
+					 get minima for.
+
+			tStart, tEnd (float, optional): Time window
+					 [Decimal Years]. Defaults to
+					 the linear motion time of
+					 closest approach +/-
+					 closestApproach.WINDOW_HALF_WIDTH.
+
+		Returns:
+			minTimes, minSeps (array,array): Times
+					 [Decimal Years] and
+					 separations [mas]
+					 of the minima.
+		"""
+
+		if tStart is None or tEnd is None:
+			linTime = self.getLinearMinTime(source)
+			if tStart is None:
+				tStart = linTime - ca.WINDOW_HALF_WIDTH
+			if tEnd is None:
+				tEnd = linTime + ca.WINDOW_HALF_WIDTH
+
+		context = pairContext(self,source)
+		return ca.findMinima(context.getSeparation,tStart,tEnd)
+
+	def getMinTime(self,source,tStart=None,tEnd=None):
 		"""
 		Get the time of closest approach between 
 		the skyobj and a source.
@@ -149,16 +299,22 @@ class skyobj(object):
 			source (skyobj): source skyobj to 
 					 to get closest approach
 					 time for.
+
+			tStart, tEnd (float, optional): Time window
+					 to search [Decimal Years],
+					 see getMinima. Pass
+					 closestApproach.GAIA_MISSION
+					 to search the Gaia mission.
 					
 		Returns: 
 			minTime (float): The time of closest
 					 approach. [Decimal Years]
 		"""
 	
-		minimum = minimize_scalar(self.getSeparation,args=(source))
-		return minimum.x
+		minTimes,minSeps = self.getMinima(source,tStart,tEnd)
+		return minTimes[np.argmin(minSeps)]
 
-	def getMinDist(self,source):
+	def getMinDist(self,source,tStart=None,tEnd=None):
 		"""
                 Get the closest approach
 		separation between the skyobj 
@@ -168,14 +324,18 @@ class skyobj(object):
 			source (skyobj): source skyobj to
                                          to get closest separation
                                          distance for.
+
+			tStart, tEnd (float, optional): Time window
+					 to search [Decimal Years],
+					 see getMinima.
 		Returns:
 
 			minDist (float): Distance of Closest
 					 Approach [mas]
 		"""
 
-		minTime = self.getMinTime(source)
-		return self.getSeparation(minTime,source)
+		minTimes,minSeps = self.getMinima(source,tStart,tEnd)
+		return np.min(minSeps)
 
 	def getCentroidShift(self,source,lensMass):
 		"""Calculates the astrometric centroid 
@@ -195,58 +355,236 @@ class skyobj(object):
 		return m.get_centroid_shift(lensMass,lensDist,sep,lensMag=self.gMag,sourceMag=source.gMag)	
 	
 
-refepoch = Time(2015.0,format='jyear')
-print(refepoch.jd)
+
+class skyobj(_skyobjMethods):
+
+	#no per instance __dict__, millions of sources
+	#are held in memory at once.
+	__slots__ = ('id','ra_0','dec_0','epoch_0','xi_0','eta_0','gMag','pmra','pmdec','parallax')
+
+	def __init__(self,id=None,ra=None,dec=None,epoch=None,pmra=None,pmdec=None,parallax=None,Gmag=None):
+		"""
+
+		
+
+		"""
+		
+		
+		self.id  = id
+		self.ra_0 = ra
+		self.dec_0 = dec
+		self.epoch_0 = epoch
+
+		self.xi_0,self.eta_0 = tp.s2tp(ra,dec,ra,dec)
+		
+		self.gMag = Gmag
+				
+		#set proper motions and parallax to zero if
+		#not specified.
+		self.pmra = pmra if pmra else 0.0
+		self.pmdec = pmdec if pmdec else 0.0
+		self.parallax = parallax if parallax else 0.0
+
+
+class pairContext(object):
+	"""The tangent plane offsets of a source from the
+	reference position of a lens, computed once and
+	reused for every separation of that pair.
+
+	The source skyobj is never modified, its own
+	xi_0 and eta_0 stay defined from its own
+	reference position.
+	"""
+
+	__slots__ = ('lens','source','xi_0','eta_0')
+
+	def __init__(self,lens,source):
+		"""
+		Args:
+			lens, source (skyobj): The pair.
+		"""
+
+		self.lens = lens
+		self.source = source
+
+		#source tangent plane coords defined
+		#by the lens reference position.
+		self.xi_0,self.eta_0 = tp.s2tp(source.ra_0,source.dec_0,lens.ra_0,lens.dec_0)
+
+	def getXiEta(self,epoch):
+		"""
+		Get Tangent Plane coordinates of the source
+		at time epoch, in the tangent plane of the
+		lens.
+
+		Args:
+			epoch (float or array): Decimal Julian
+					        Year Time(s)
+
+		Returns:
+			Xi,Eta (float,float): Tangent Plane
+					      coordinates [mas]
+		"""
+		return self.source._xiEta(epoch,self.xi_0,self.eta_0)
+
+	def getSeparation(self,epoch):
+		"""
+		Get angular separation of the lens and source
+		at time epoch [mas], see skyobj.getSeparation.
+		"""
+
+		lens_xi,lens_eta = self.lens.getXiEta(epoch)
+		source_xi,source_eta = self.getXiEta(epoch)
+
+		return np.hypot(lens_xi-source_xi, lens_eta-source_eta)
+
+
+def toRecords(objs):
+	"""
+	Pack skyobj's into a structured array of
+	SKYOBJ_DTYPE, one record per skyobj.
+
+	Args:
+		objs (sequence of skyobj)
+
+	Returns:
+		records (np.array): Structured array
+				    of SKYOBJ_DTYPE
+	"""
+
+	objs = list(objs)
+	records = np.zeros(len(objs),dtype=SKYOBJ_DTYPE)
+	for name in SKYOBJ_DTYPE.names:
+		missing = -1 if name == 'id' else np.nan
+		records[name] = [missing if getattr(o,name) is None else getattr(o,name) for o in objs]
+	return records
+
+
+def _recordField(name):
+	#property reading and writing one field of the
+	#skyobjView's record.
+	def get(self):
+		return self._records[name][self._row]
+
+	def set(self,value):
+		self._records[name][self._row] = value
+
+	return property(get,set)
+
+
+class skyobjView(_skyobjMethods):
+	"""A skyobj whose attributes live in one record of
+	a shared structured array (SKYOBJ_DTYPE) rather
+	than on the instance.
+
+	A view holds only the array and its row, so
+	millions of sources cost one record each plus a
+	small object. Attributes and methods are those
+	of skyobj, and setting an attribute writes
+	through to the array.
+	"""
+
+	__slots__ = ('_records','_row')
+
+	def __init__(self,records,row):
+		"""
+		Args:
+			records (np.array): Structured array of
+					    SKYOBJ_DTYPE
+
+			row (int): Record of this skyobj.
+		"""
+
+		self._records = records
+		self._row = row
+
+	@classmethod
+	def views(cls,records):
+		"""Return a skyobjView of every record."""
+		return [cls(records,i) for i in range(len(records))]
+
+	ra_0 = _recordField('ra_0')
+	dec_0 = _recordField('dec_0')
+	epoch_0 = _recordField('epoch_0')
+	pmra = _recordField('pmra')
+	pmdec = _recordField('pmdec')
+	parallax = _recordField('parallax')
+	xi_0 = _recordField('xi_0')
+	eta_0 = _recordField('eta_0')
+
+	@property
+	def id(self):
+		id = self._records['id'][self._row]
+		return None if id == -1 else id
+
+	@id.setter
+	def id(self,value):
+		self._records['id'][self._row] = -1 if value is None else value
+
+	@property
+	def gMag(self):
+		gMag = self._records['gMag'][self._row]
+		return None if np.isnan(gMag) else gMag
+
+	@gMag.setter
+	def gMag(self,value):
+		self._records['gMag'][self._row] = np.nan if value is None else value
+
+
+def main():
+	#Demo: LAWD 37 and its 2019 source.
+	from astropy.time import Time
+
+	refepoch = Time(2015.0,format='jyear')
+	print(refepoch.jd)
+
+
+	lens = skyobj(id=1,ra=176.4549073, dec=-64.84295714, pmra=2662.03572627, pmdec=-345.18255501, parallax=215.782333,epoch=2015.0)
+	source1 = skyobj(id=2,ra=176.46360456, dec=-64.84329779, pmra=-19.5, pmdec=-17.89999962,epoch=2015.0)
 
 
-lens = skyobj(id=1,ra=176.4549073, dec=-64.84295714, pmra=2662.03572627, pmdec=-345.18255501, parallax=215.782333,epoch=2015.0)
-source1 = skyobj(id=2,ra=176.46360456, dec=-64.84329779, pmra=-19.5, pmdec=-17.89999962,epoch=2015.0)
 
+	refposRa,refposDec = lens.getRaDec(refepoch.decimalyear)
 
+	print(refposRa)
+	print(refposDec)
 
-refposRa,refposDec = lens.getRaDec(refepoch.decimalyear)
+	time = np.linspace(2018.86480945,2020.893842442573,num=1000)
+	astrotime = Time(time,format='jyear')
+	print(astrotime.jd)
 
-print(refposRa)
-print(refposDec)
+	#lens and source paths over every epoch at once
+	track = lens.trajectory(time,source1,lensMass=0.65)
+	ras,decs = track['ra'],track['dec']
+	raSources,decSources = source1.getRaDec(time)
+	print(track['shift'].max())
 
-time = np.linspace(2018.86480945,2020.893842442573,num=1000)
-astrotime = Time(time,format='jyear')
-print(astrotime.jd)
 
-ras = np.array([])
-decs = np.array([])
-raSources = np.array([])
-decSources = np.array([])
+	#import matplotlib.pylab as plt
+	#plt.plot((ras-refposRa)*3600.0,(decs-refposDec)*3600.0,label='lens')
+	#plt.plot((raSources-refposRa)*3600.0*np.cos(np.deg2rad(refposDec)),(decSources-refposDec)*3600.0*np.cos(np.deg2rad(refposDec)),label='source')
 
-#for t in time:
-#	ra,dec = lens.getRaDec(t)
-#	raSource,decSource = source.getRaDec(t)
-#	ras = np.append(ras,ra)
-#	decs = np.append(decs,dec)
-#	raSources = np.append(raSources,raSource)
-#	decSources = np.append(decSources,decSource)
+	#plt.xlabel('relative ra*cos(dec) position [arcseconds]')
+	#plt.ylabel('relative dec position [arcseconds]')
+	#plt.ylim(-0.6,0.6)
+	#plt.title('lawd37 2019.9pm1yr')
+	#plt.legend()
+	#plt.show()
 
 
-#plt.plot((ras-refposRa)*3600.0,(decs-refposDec)*3600.0,label='lens')
-#plt.plot((raSources-refposRa)*3600.0*np.cos(np.deg2rad(refposDec)),(decSources-refposDec)*3600.0*np.cos(np.deg2rad(refposDec)),label='source')
 
-#plt.xlabel('relative ra*cos(dec) position [arcseconds]')
-#plt.ylabel('relative dec position [arcseconds]')
-#plt.ylim(-0.6,0.6)
-#plt.title('lawd37 2019.9pm1yr')
-#plt.legend()
-#plt.show()
 
 
- 
+	#lens = skyobj(id=1,ra=176.454907296219, dec=-64.842957135494, pmra=2662.03572627, pmdec=-345.18255501, parallax=215.78,epoch=2015.0)
+	#source = skyobj(id=2,ra=176.46360456073, dec=-64.8432977866831, pmra=-19.5, pmdec=-17.89999962,epoch=2015.0)
 
+	print(lens.getMinTime(source1))
+	print(lens.getMinDist(source1))
 
-#lens = skyobj(id=1,ra=176.454907296219, dec=-64.842957135494, pmra=2662.03572627, pmdec=-345.18255501, parallax=215.78,epoch=2015.0)
-#source = skyobj(id=2,ra=176.46360456073, dec=-64.8432977866831, pmra=-19.5, pmdec=-17.89999962,epoch=2015.0)
 
-print(lens.getMinTime(source1))
-print(lens.getMinDist(source1))
+	#print("Centroid Shift a Closest Approach: "+ str(lens.getCentroidShift(source,0.75)))
+	#print("Centriod Shift at 300 mas: " + str(lens.getCentriodShift_at(source,0.75,300.0)))
 
 
-#print("Centroid Shift a Closest Approach: "+ str(lens.getCentroidShift(source,0.75)))
-#print("Centriod Shift at 300 mas: " + str(lens.getCentriodShift_at(source,0.75,300.0)))
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,212 @@
+###############################################
+#      streamSearch                           #
+# Candidate search over catalogs larger than  #
+# memory, streamed in bounded spatial chunks  #
+# of lenses with a halo of sources.           #
+# @author Peter McGill                        #
+# @email pm625@cam.ac.uk                      #
+###############################################
+
+import argparse
+import sys
+import numpy as np
+import catalogIO
+import closestApproach as ca
+import pairFinder as pf
+import candidateSearch as cs
+
+
+# Largest number of lenses in one chunk
+CHUNK_SIZE = 10000
+
+# Largest number of halo sources in one chunk, a lens
+# chunk with more is split in two until it fits.
+MAX_SOURCES = 2000000
+
+# Rows read at once when scanning a whole column
+BLOCK_SIZE = 1000000
+
+
+def _scanMax(catalog, func, blockSize=BLOCK_SIZE):
+	# largest value of func(rows) over the catalog,
+	# read one block of rows at a time.
+	best = 0.0
+	for lo in range(0, len(catalog), blockSize):
+		rows = slice(lo, min(lo + blockSize, len(catalog)))
+		best = max(best, float(np.max(func(rows))))
+	return best
+
+
+def _reach(catalog, rows, tStart, tEnd):
+	# distance each row of catalog can move from its
+	# reference position inside [tStart,tEnd] [mas]
+	dt = np.maximum(np.abs(tStart - catalog.epoch_0[rows]), np.abs(tEnd - catalog.epoch_0[rows]))
+	return np.hypot(catalog.pmra[rows], catalog.pmdec[rows]) * dt + catalog.parallax[rows]
+
+
+def sourceReach(sources, tStart, tEnd, blockSize=BLOCK_SIZE):
+	"""Largest distance any source moves from its
+	reference position inside [tStart,tEnd] [mas]"""
+	return _scanMax(sources, lambda rows: _reach(sources, rows, tStart, tEnd), blockSize)
+
+
+def _lensChunks(lenses, chunkSize):
+	# disjoint chunks of lens rows, each a run of one
+	# declination zone in ra order.
+	nZones = len(lenses.indexZones) - 1
+	for zone in range(nZones):
+		rows = lenses.zoneRows(zone)
+		for lo in range(0, len(rows), chunkSize):
+			yield np.array(rows[lo:lo + chunkSize])
+
+
+def _haloRows(lensRows, lenses, sources, tStart, tEnd, corridor, sourceHalo):
+	# rows of every source a chunk of lenses can pass
+	# within corridor of inside the window.
+	cat = lenses.catalog
+	ra = cat.ra_0[lensRows] % 360.0
+	dec = cat.dec_0[lensRows]
+	halo = corridor + sourceHalo + np.max(_reach(cat, lensRows, tStart, tEnd))
+	halo = halo * catalogIO.MAS_TO_DEG
+
+	decLo = np.min(dec) - halo
+	decHi = np.max(dec) + halo
+	halfWidth = catalogIO.raHalfWidth(halo, max(abs(decLo), abs(decHi)))
+	if halfWidth >= 180.0:
+		return sources.box(0.0, 360.0, decLo, decHi)
+	return sources.box(np.min(ra) - halfWidth, np.max(ra) + halfWidth, decLo, decHi)
+
+
+def iterChunks(lenses, sources, tStart, tEnd, corridor=1000.0, chunkSize=CHUNK_SIZE,
+		maxSources=MAX_SOURCES):
+	"""Split a search into bounded chunks.
+
+	Lenses are split into disjoint chunks of at most
+	chunkSize rows, each from one declination zone of
+	the lens index. Each chunk is given every source
+	that any of its lenses can pass within corridor of,
+	i.e. its footprint padded by a halo of the corridor
+	plus the largest lens and source motion (proper
+	motion and parallax) inside the window. Halos of
+	neighbouring chunks overlap, so no pair is lost,
+	and each pair belongs to the one chunk holding its
+	lens, so none is found twice.
+
+	Args:
+	   lenses, sources (catalogIO.mappedCatalog) : Catalogs,
+					 read only as each
+					 chunk needs them.
+
+	   tStart, tEnd (float) : Time window [Decimal Years]
+
+	   corridor (float, optional) : Largest closest approach
+					searched for [mas]
+
+	   chunkSize (int, optional) : Largest number of lenses
+				       per chunk.
+
+	   maxSources (int, optional) : Largest number of sources
+					per chunk. Chunks with more
+					are split, down to single
+					lenses.
+
+	Yields:
+	   lensRows, sourceRows (array,array) : Catalog rows of the
+						lenses and the halo
+						sources of a chunk.
+	"""
+
+	sourceHalo = sourceReach(sources.catalog, tStart, tEnd)
+	for rows in _lensChunks(lenses, chunkSize):
+		todo = [rows]
+		while todo:
+			lensRows = todo.pop()
+			sourceRows = _haloRows(lensRows, lenses, sources, tStart, tEnd, corridor, sourceHalo)
+			if len(sourceRows) > maxSources and len(lensRows) > 1:
+				half = len(lensRows) // 2
+				todo.extend([lensRows[half:], lensRows[:half]])
+				continue
+			yield lensRows, sourceRows
+
+
+def streamEvents(lenses, sources, options, chunkSize=CHUNK_SIZE, maxSources=MAX_SOURCES):
+	"""Run the candidate search one chunk at a time.
+
+	Each chunk's lenses and halo sources are copied out
+	of the memory mapped catalogs, projected, searched
+	(candidateSearch.searchShard) and released before
+	the next chunk, so memory use is set by chunkSize
+	and maxSources rather than the catalog sizes.
+
+	Args:
+	   lenses, sources (catalogIO.mappedCatalog) : Catalogs.
+
+	   options (argparse.Namespace) : Search options (start,
+					  end, corridor, mass), as
+					  for candidateSearch.
+
+	   chunkSize, maxSources (int, optional) : Chunk bounds,
+						   see iterChunks.
+
+	Yields:
+	   events (np.array) : Structured array of
+			       candidateSearch.RESULT_DTYPE, the
+			       events of one chunk.
+	"""
+
+	for lensRows, sourceRows in iterChunks(lenses, sources, options.start, options.end,
+			options.corridor, chunkSize, maxSources):
+		lensChunk = lenses.catalog.take(lensRows)
+		#lenses need a positive parallax for a distance
+		lensChunk = lensChunk.take(lensChunk.parallax > 0)
+		if len(lensChunk) == 0 or len(sourceRows) == 0:
+			continue
+		sourceChunk = sources.catalog.take(sourceRows)
+		index = pf.sourceIndex(sourceChunk, options.start, options.end)
+		events = cs.searchShard(lensChunk, sourceChunk, index, options)
+		if len(events):
+			yield events
+
+
+def parseArgs(argv=None):
+	parser = argparse.ArgumentParser(description='Stream a search of two catalogs '
+		'in the catalogIO format for astrometric microlensing events.')
+	parser.add_argument('lenses', help='lens catalog directory (see catalogIO)')
+	parser.add_argument('sources', help='source catalog directory (see catalogIO)')
+	parser.add_argument('-o', '--output', default='candidates.csv', help='output csv')
+	parser.add_argument('--start', type=float, default=ca.GAIA_MISSION[0],
+		help='start of the search window [decimal years]')
+	parser.add_argument('--end', type=float, default=ca.GAIA_MISSION[1],
+		help='end of the search window [decimal years]')
+	parser.add_argument('--corridor', type=float, default=1000.0,
+		help='largest closest approach to report [mas]')
+	parser.add_argument('--mass', type=float, default=0.5, help='lens mass [Msol]')
+	parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+		help='largest number of lenses per chunk')
+	parser.add_argument('--max-sources', type=int, default=MAX_SOURCES,
+		help='largest number of sources per chunk')
+	parser.add_argument('-v', '--verbose', action='store_true')
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	options = parseArgs(argv)
+	lenses = catalogIO.mappedCatalog(options.lenses)
+	sources = catalogIO.mappedCatalog(options.sources)
+
+	#events are written as each chunk finishes
+	nEvents = 0
+	with open(options.output, 'w') as f:
+		f.write(','.join(name for name, fmt in cs.RESULT_DTYPE) + '\n')
+		for events in streamEvents(lenses, sources, options, options.chunk_size,
+				options.max_sources):
+			np.savetxt(f, events, delimiter=',', fmt=['%d', '%d', '%.6f', '%.4f', '%.3f', '%.6f'])
+			f.flush()
+			nEvents += len(events)
+			if options.verbose:
+				print('%d events' % nEvents)
+	print('%d candidate events' % nEvents)
+
+
+if __name__ == '__main__':
+	sys.exit(main())
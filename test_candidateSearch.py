@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import catalogIO
+import candidateSearch as cs
+import unittest
+
+class TestcandidateSearch(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		#LAWD 37 and its 2019 source, plus a far away pair
+		self.lensPath = os.path.join(self.dir,'lenses.csv')
+		with open(self.lensPath,'w') as f:
+			f.write('source_id,ra,dec,ref_epoch,pmra,pmdec,parallax,phot_g_mean_mag\n')
+			f.write('1,176.4549073,-64.84295714,2015.0,2662.03572627,-345.18255501,215.782333,11.4\n')
+			f.write('3,10.0,10.0,2015.0,1000.0,0.0,100.0,\n')
+		self.sourcePath = os.path.join(self.dir,'sources.csv')
+		with open(self.sourcePath,'w') as f:
+			f.write('source_id,ra,dec,ref_epoch,pmra,pmdec,parallax,phot_g_mean_mag\n')
+			f.write('2,176.46360456,-64.84329779,2015.0,-19.5,-17.89999962,,18.9\n')
+			f.write('4,10.001,10.0,2015.0,0.0,0.0,0.5,\n')
+			f.write('5,200.0,-20.0,2015.0,0.0,0.0,0.5,17.0\n')
+		self.outdir = os.path.join(self.dir,'out')
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_healpixNest(self):
+		self.assertEqual(cs.healpixNest(1,0.0,0.0),4)
+		self.assertEqual(cs.healpixNest(2,0.0,90.0),3)
+		self.assertEqual(cs.healpixNest(2,0.0,-90.0),32)
+
+		#equal area pixels
+		rng = np.random.RandomState(1)
+		ra = rng.uniform(0.0,360.0,480000)
+		dec = np.degrees(np.arcsin(rng.uniform(-1.0,1.0,480000)))
+		counts = np.bincount(cs.healpixNest(4,ra,dec),minlength=192)
+		self.assertEqual(len(counts),192)
+		self.assertLess(np.abs(counts-2500).max(),250)
+
+	def test_readCatalog(self):
+		cat = cs.readCatalog(self.sourcePath)
+		self.assertEqual(len(cat),3)
+		self.assertEqual(cat.id[1],4)
+		self.assertEqual(cat.parallax[0],0.0)
+		self.assertTrue(np.isnan(cat.gMag[1]))
+
+	def test_run_and_resume(self):
+		argv = [self.lensPath,self.sourcePath,'-o',self.outdir,'--workers','2']
+		events = cs.run(cs.parseArgs(argv))
+		self.assertEqual(list(events['source_id']),[4,2])
+		lawd = events[events['lens_id'] == 1][0]
+		self.assertAlmostEqual(lawd['t_min'],2019.86,places=2)
+		self.assertAlmostEqual(lawd['min_sep'],279.34,places=1)
+
+		#a resumed run reuses the shard checkpoints
+		shards = [f for f in os.listdir(self.outdir) if f.startswith('shard_')]
+		self.assertEqual(len(shards),2)
+		for f in shards:
+			np.save(os.path.join(self.outdir,f),np.load(os.path.join(self.outdir,f))[:0])
+		self.assertEqual(len(cs.run(cs.parseArgs(argv))),0)
+
+	def test_fingerprint(self):
+		cat = cs.readCatalog(self.sourcePath)
+		digest = cs.fingerprint(self.sourcePath,cat)
+		self.assertEqual(cs.fingerprint(self.sourcePath,cs.readCatalog(self.sourcePath)),digest)
+		#hashed in blocks, the same digest
+		block = cs.FINGERPRINT_BLOCK
+		cs.FINGERPRINT_BLOCK = 8
+		try:
+			self.assertEqual(cs.fingerprint(self.sourcePath,cat),digest)
+		finally:
+			cs.FINGERPRINT_BLOCK = block
+		cat.pmra[2] = 1.0
+		self.assertNotEqual(cs.fingerprint(self.sourcePath,cat),digest)
+
+		#a skycat directory is known by its files
+		path = os.path.join(self.dir,'sources.skycat')
+		catalogIO.writeCatalog(path,cat)
+		digest = cs.fingerprint(path,cs.readCatalog(path))
+		self.assertEqual(cs.fingerprint(path,None),digest)
+		stat = os.stat(os.path.join(path,'pmra.npy'))
+		os.utime(os.path.join(path,'pmra.npy'),ns=(stat.st_atime_ns,stat.st_mtime_ns + 10**9))
+		self.assertNotEqual(cs.fingerprint(path,None),digest)
+
+	def test_same_catalog(self):
+		#lenses searched against their own catalog file
+		#are not paired with themselves
+		path = os.path.join(self.dir,'stars.csv')
+		with open(path,'w') as f:
+			f.write('source_id,ra,dec,ref_epoch,pmra,pmdec,parallax,phot_g_mean_mag\n')
+			f.write('1,176.4549073,-64.84295714,2015.0,2662.03572627,-345.18255501,215.782333,11.4\n')
+			f.write('2,176.46360456,-64.84329779,2015.0,-19.5,-17.89999962,,18.9\n')
+			f.write('3,10.0,10.0,2015.0,0.0,0.0,100.0,\n')
+		events = cs.run(cs.parseArgs([path,path,'-o',self.outdir,'--workers','1']))
+		self.assertFalse((events['lens_id'] == events['source_id']).any())
+		self.assertEqual([(e['lens_id'],e['source_id']) for e in events],[(1,2)])
+
+	def test_run_skycat(self):
+		#memory mapped catalogs go to the workers by path
+		#and find the same events
+		argv = ['-o',self.outdir,'--workers','2']
+		expected = cs.run(cs.parseArgs([self.lensPath,self.sourcePath] + argv))
+		paths = []
+		for path in (self.lensPath,self.sourcePath):
+			paths.append(path + '.skycat')
+			catalogIO.writeCatalog(paths[-1],cs.readCatalog(path))
+			self.assertEqual(cs.shipCatalog(paths[-1],None),paths[-1])
+		events = cs.run(cs.parseArgs(paths + argv))
+		np.testing.assert_array_equal(events,expected)
+
+		sources,index = cs.openSources(paths[1],2014.5,2025.1)
+		self.assertEqual(len(sources),3)
+		self.assertEqual(sum(len(rows) for rows,tree,env in index.bins),3)
+
+	def test_changed_options_restart(self):
+		argv = [self.lensPath,self.sourcePath,'-o',self.outdir,'--workers','1']
+		self.assertEqual(len(cs.run(cs.parseArgs(argv))),2)
+		#emptied checkpoints are only reused for the same search
+		for f in os.listdir(self.outdir):
+			if f.startswith('shard_'):
+				np.save(os.path.join(self.outdir,f),np.load(os.path.join(self.outdir,f))[:0])
+		events = cs.run(cs.parseArgs(argv + ['--corridor','500.0']))
+		self.assertEqual(list(events['source_id']),[4,2])
+
+		#a new nside leaves no shard of the old pixels behind
+		cs.run(cs.parseArgs(argv + ['--corridor','500.0','--nside','4']))
+		shards = sorted(f for f in os.listdir(self.outdir) if f.startswith('shard_'))
+		pixels = cs.healpixNest(4,np.array([176.4549073,10.0]),np.array([-64.84295714,10.0]))
+		self.assertEqual(shards,sorted(os.path.basename(cs.shardPath('',p)) for p in set(pixels)))
+
+	def test_profile(self):
+		argv = [self.lensPath,self.sourcePath,'-o',self.outdir,'--workers','1','--profile']
+		cs.run(cs.parseArgs(argv))
+		with open(os.path.join(self.outdir,'profile.json')) as f:
+			report = json.load(f)
+		self.assertEqual(report['timers']['search.solve']['calls'],2)
+		self.assertGreater(report['counters']['ca.batch_pairs'],0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import catalogIO
+import pairFinder as pf
+import candidateSearch as cs
+from skycatalog import skycatalog
+import unittest
+
+class TestcatalogIO(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir,'cat.skycat')
+		rng = np.random.RandomState(3)
+		n = 20000
+		ra = rng.uniform(0.0,360.0,n)
+		dec = np.degrees(np.arcsin(rng.uniform(-1.0,1.0,n)))
+		#a cluster straddling ra=0 and one at the pole
+		ra[:200] = rng.uniform(-0.01,0.01,200) % 360.0
+		dec[:200] = rng.uniform(-0.01,0.01,200)
+		dec[200:300] = rng.uniform(89.99,90.0,100)
+		gMag = rng.uniform(10.0,20.0,n)
+		gMag[::7] = np.nan
+		self.cat = skycatalog(id=np.arange(n)+10,ra=ra,dec=dec,epoch=2016.0,
+			pmra=rng.normal(0.0,10.0,n),pmdec=rng.normal(0.0,10.0,n),
+			parallax=rng.uniform(0.0,5.0,n),Gmag=gMag)
+		catalogIO.writeCatalog(self.path,self.cat)
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_round_trip(self):
+		mapped = catalogIO.mappedCatalog(self.path)
+		cat = mapped.catalog
+		self.assertEqual(len(cat),len(self.cat))
+		for name in ('id','ra_0','dec_0','epoch_0','pmra','pmdec','parallax','gMag'):
+			np.testing.assert_array_equal(getattr(cat,name),getattr(self.cat,name))
+			#columns are memory mapped, not copied
+			self.assertIsInstance(getattr(cat,name),np.memmap)
+		np.testing.assert_allclose(mapped.cosDec,np.cos(np.radians(self.cat.dec_0)))
+		np.testing.assert_allclose(np.linalg.norm(mapped.xyz,axis=1),1.0)
+		np.testing.assert_allclose(cat.getXiEta(2017.0)[0],self.cat.getXiEta(2017.0)[0])
+
+	def brute(self,ra,dec,radius):
+		x = pf.unitVectors(self.cat.ra_0,self.cat.dec_0)
+		cosSep = np.dot(x,pf.unitVectors(ra,dec))
+		return np.nonzero(cosSep >= np.cos(np.radians(radius*catalogIO.MAS_TO_DEG)))[0]
+
+	def test_cone(self):
+		mapped = catalogIO.mappedCatalog(self.path)
+		for ra,dec,radius in [(0.0,0.0,3.6e4),(359.995,0.005,2e4),(45.0,89.995,5e4),
+				(120.0,-30.0,3.6e6),(200.0,10.0,1.0)]:
+			np.testing.assert_array_equal(mapped.cone(ra,dec,radius),self.brute(ra,dec,radius))
+		#the whole cluster, from both sides of ra=0
+		self.assertTrue(np.isin(np.arange(200),mapped.cone(0.0,0.0,7.2e4)).all())
+
+	def test_readCatalog(self):
+		cat = cs.readCatalog(self.path)
+		np.testing.assert_array_equal(cat.id,self.cat.id)
+
+	def test_version(self):
+		with open(os.path.join(self.path,'meta.json'),'w') as f:
+			f.write('{"format" : "skycat", "version" : 99}')
+		self.assertRaises(ValueError,catalogIO.mappedCatalog,self.path)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,72 @@
+import numpy as np
+import closestApproach as ca
+from skyobj import skyobj
+from skycatalog import skycatalog
+import unittest
+
+class TestclosestApproach(unittest.TestCase):
+
+	def setUp(self):
+		#LAWD 37 and its 2019 source, as in the skyobj demo
+		self.lens = skyobj(id=1,ra=176.4549073,dec=-64.84295714,pmra=2662.03572627,
+			pmdec=-345.18255501,parallax=215.782333,epoch=2015.0)
+		self.source = skyobj(id=2,ra=176.46360456,dec=-64.84329779,pmra=-19.5,
+			pmdec=-17.89999962,epoch=2015.0)
+		#a slow, parallax dominated lens passing the same source
+		self.slowLens = skyobj(id=3,ra=176.4634,dec=-64.8432,pmra=20.0,
+			pmdec=5.0,parallax=300.0,epoch=2015.0)
+
+	def test_linearMinTime(self):
+		self.assertAlmostEqual(ca.linearMinTime(-10.0,0.0,2.0,0.0,2015.0),2020.0)
+		self.assertAlmostEqual(ca.linearMinTime(3.0,4.0,0.0,0.0,2015.0),2015.0)
+
+	def test_refineMinimum(self):
+		tMin = ca.refineMinimum(lambda t: (t-np.array([2016.3,2019.1]))**2,
+			[2016.0,2019.0],[2017.0,2020.0])
+		self.assertAlmostEqual(tMin[0],2016.3,places=6)
+		self.assertAlmostEqual(tMin[1],2019.1,places=6)
+
+	def test_findMinima(self):
+		sepFunc = lambda t: np.abs(np.sin(2*np.pi*t)) + 0.1*(t-2015.2)**2
+		minTimes,minSeps = ca.findMinima(sepFunc,2014.1,2016.9)
+		#both window edges are lower than their neighbours
+		np.testing.assert_allclose(minTimes,[2014.1,2014.5,2015.0,2015.5,2016.0,2016.5,2016.9],atol=0.02)
+
+	def test_getMinTime_fast_lens(self):
+		#matches the linear estimate to within the parallax wobble
+		minTime = self.lens.getMinTime(self.source)
+		self.assertAlmostEqual(minTime,2019.8648,places=3)
+		self.assertLess(abs(minTime-self.lens.getLinearMinTime(self.source)),0.1)
+
+	def test_getMinTime_parallax_dominated(self):
+		tStart,tEnd = ca.GAIA_MISSION
+		minTimes,minSeps = self.slowLens.getMinima(self.source,tStart,tEnd)
+		self.assertGreater(len(minTimes),1)
+
+		#brute force check of the global minimum
+		t = np.linspace(tStart,tEnd,200001)
+		sep = self.slowLens.getSeparation(t,self.source)
+		minTime = self.slowLens.getMinTime(self.source,tStart,tEnd)
+		self.assertAlmostEqual(minTime,t[np.argmin(sep)],places=3)
+		self.assertLessEqual(self.slowLens.getSeparation(minTime,self.source),sep.min())
+
+	def test_batchMinApproach(self):
+		lenses = skycatalog.fromSkyobjs([self.lens,self.slowLens])
+		sources = skycatalog.fromSkyobjs([self.source])
+		minTime,minSep,posAngle = ca.batchMinApproach(lenses,sources,[0,1,0],[0,0,0])
+		for k,lens in enumerate([self.lens,self.slowLens,self.lens]):
+			self.assertAlmostEqual(minTime[k],lens.getMinTime(self.source,*ca.GAIA_MISSION),places=5)
+			self.assertAlmostEqual(minSep[k],lens.getMinDist(self.source,*ca.GAIA_MISSION),places=4)
+
+		lensXi,lensEta = self.lens.getXiEta(minTime[0])
+		sourceXi,sourceEta = self.lens.getContext(self.source).getXiEta(minTime[0])
+		self.assertAlmostEqual(posAngle[0],np.degrees(np.arctan2(sourceXi-lensXi,sourceEta-lensEta)),places=3)
+
+		#blocks of pairs give the same answer
+		blocked = ca.batchMinApproach(lenses,sources,[0,1,0],[0,0,0],chunkSize=2)
+		np.testing.assert_array_equal(blocked[0],minTime)
+		np.testing.assert_array_equal(blocked[1],minSep)
+
+
+if __name__ == '__main__':
+	unittest.main()
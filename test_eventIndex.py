@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import timeit
+import numpy as np
+import candidateSearch as cs
+import eventIndex as ei
+import microlens as m
+from skycatalog import skycatalog
+import unittest
+
+class TesteventIndex(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.RandomState(3)
+		n = 5000
+		self.lenses = skycatalog(id=np.arange(n)+10,ra=rng.uniform(0,360,n),
+			dec=rng.uniform(-60,60,n),epoch=2015.0,pmra=rng.normal(0.0,300.0,n),
+			pmdec=rng.normal(0.0,300.0,n),parallax=rng.uniform(1.0,200.0,n))
+		self.sources = skycatalog(id=np.arange(n)+10**6,ra=self.lenses.ra_0,
+			dec=self.lenses.dec_0,epoch=2015.0,pmra=rng.normal(0.0,5.0,n),
+			pmdec=rng.normal(0.0,5.0,n),parallax=0.5)
+		events = np.zeros(n,dtype=cs.RESULT_DTYPE)
+		events['lens_id'] = self.lenses.id[::-1]
+		events['source_id'] = self.sources.id[::-1]
+		events['t_min'] = rng.uniform(2014.5,2025.0,n)
+		events['min_sep'] = rng.uniform(10.0,1000.0,n)
+		events['centroid_shift'] = rng.uniform(0.0,2.0,n)
+		self.events = events
+		self.index = ei.eventIndex.fromEvents(events,self.lenses,self.sources,0.5,0.1)
+
+	def brute(self,tStart,tEnd,minShift,active):
+		e = self.index.events
+		if active:
+			keep = (e['t_start'] <= tEnd) & (e['t_end'] >= tStart)
+		else:
+			keep = (e['t_min'] >= tStart) & (e['t_min'] <= tEnd)
+		return e[keep & (e['centroid_shift'] >= minShift)]
+
+	def test_windows(self):
+		e = self.index.events
+		self.assertEqual(len(e),len(self.events))
+		self.assertTrue((np.diff(e['t_min']) >= 0).all())
+		i = 17
+		rows = np.nonzero(self.lenses.id == e['lens_id'][i])[0][0]
+		srow = np.nonzero(self.sources.id == e['source_id'][i])[0][0]
+		pm = np.hypot(self.lenses.pmra[rows]-self.sources.pmra[srow],
+			self.lenses.pmdec[rows]-self.sources.pmdec[srow])
+		T = m.get_astrometric_T(0.5,m.get_dist(self.lenses.parallax[rows]),e['min_sep'][i],0.1,pm)
+		self.assertAlmostEqual(e['astrometric_T'][i],T)
+		self.assertAlmostEqual(e['t_end'][i] - e['t_start'][i],T)
+
+	def test_queries(self):
+		for tStart,tEnd,minShift in [(2016.0,2016.08,0.0),(2019.5,2020.5,1.2),(2030.0,2031.0,0.0)]:
+			for active in (False,True):
+				select = self.index.active if active else self.index.peaking
+				found = select(tStart,tEnd,minShift)
+				expected = self.brute(tStart,tEnd,minShift,active)
+				self.assertEqual(sorted(found['lens_id']),sorted(expected['lens_id']))
+		self.assertEqual(len(self.index.peaking(2030.0,2031.0)),0)
+
+	def test_query_time(self):
+		best = min(timeit.repeat(lambda: self.index.peaking(2019.5,2019.58,1.0),number=100,repeat=3))
+		self.assertLess(best / 100,1e-3)
+
+	def test_long_window(self):
+		#one slow event with a window of centuries
+		events = self.index.events.copy()
+		events['t_start'][100] = events['t_min'][100] - 150.0
+		events['t_end'][100] = events['t_min'][100] + 150.0
+		self.index = ei.eventIndex(events)
+		for tStart,tEnd in [(2016.0,2016.08),(1900.0,1901.0),(2019.5,2020.5)]:
+			found = self.index.active(tStart,tEnd)
+			expected = self.brute(tStart,tEnd,0.0,True)
+			self.assertEqual(sorted(found['lens_id']),sorted(expected['lens_id']))
+			self.assertIn(events['lens_id'][100],found['lens_id'])
+		best = min(timeit.repeat(lambda: self.index.active(2019.5,2019.58,1.0),number=100,repeat=3))
+		self.assertLess(best / 100,1e-3)
+
+	def test_save_load(self):
+		tmp = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmp,'events.npz')
+			self.index.save(path)
+			loaded = ei.eventIndex.load(path)
+			np.testing.assert_array_equal(loaded.events,self.index.events)
+			self.assertEqual(len(loaded.groups),len(self.index.groups))
+		finally:
+			shutil.rmtree(tmp)
+
+	def test_missing_id(self):
+		events = self.events.copy()
+		events['lens_id'][0] = -5
+		with self.assertRaises(ValueError):
+			ei.eventIndex.fromEvents(events,self.lenses,self.sources,0.5)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,53 @@
+import numpy as np
+import eventSweep as es
+import microlens as m
+from skyobj import skyobj
+import unittest
+
+class TesteventSweep(unittest.TestCase):
+
+	def setUp(self):
+		#LAWD 37 and its 2019 source, as in the skyobj demo
+		self.lens = skyobj(id=1,ra=176.4549073,dec=-64.84295714,pmra=2662.03572627,
+			pmdec=-345.18255501,parallax=215.782333,epoch=2015.0)
+		self.source = skyobj(id=2,ra=176.46360456,dec=-64.84329779,pmra=-19.5,
+			pmdec=-17.89999962,epoch=2015.0)
+
+	def test_massGrid(self):
+		masses = np.linspace(0.5,0.8,4)
+		table = es.massGrid(self.lens,self.source,masses,accuracy=0.1)
+		self.assertEqual(table['centroid_shift'].shape,(4,))
+		minSep = self.lens.getMinDist(self.source)
+		for i,mass in enumerate(masses):
+			self.assertAlmostEqual(table['centroid_shift'][i],
+				self.lens.getCentroidShift(self.source,mass))
+			self.assertAlmostEqual(table['min_sep'][i],minSep)
+			self.assertAlmostEqual(table['enstien_R'][i],m.get_enstien_R(mass,m.get_dist(215.782333)))
+
+	def test_monteCarlo_no_errors(self):
+		#with no errors every draw is the nominal event
+		samples = es.monteCarlo(self.lens,self.source,0.65,nDraws=10,seed=1)
+		self.assertEqual(len(samples['min_sep']),10)
+		np.testing.assert_allclose(samples['min_sep'],self.lens.getMinDist(self.source),rtol=1e-6)
+		np.testing.assert_allclose(samples['centroid_shift'],
+			self.lens.getCentroidShift(self.source,0.65),rtol=1e-6)
+
+	def test_monteCarlo_quantiles(self):
+		errors = {'ra' : 0.03,'dec' : 0.03,'pmra' : 0.05,'pmdec' : 0.05,'parallax' : 0.05}
+		samples = es.monteCarlo(self.lens,self.source,np.array([0.55,0.65,0.75]),lensErrors=errors,
+			sourceErrors={'pmra' : 1.0,'pmdec' : 1.0},nDraws=500,seed=2)
+		summary = es.summarize(samples)
+		low,median,high = summary['centroid_shift']
+		self.assertLess(low,median)
+		self.assertLess(median,high)
+		self.assertAlmostEqual(summary['min_time'][1],self.lens.getMinTime(self.source),places=2)
+		self.assertEqual(set(samples['lens_mass']),set([0.55,0.65,0.75]))
+
+	def test_summarize_weights(self):
+		samples = {'x' : np.array([1.0,2.0,3.0])}
+		self.assertEqual(es.summarize(samples,quantiles=[0.5],weights=[0.0,0.0,1.0])['x'][0],3.0)
+		self.assertEqual(es.summarize(samples,quantiles=[0.5])['x'][0],2.0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,67 @@
+import time
+import numpy as np
+import fitting as ft
+import microlens as m
+from skycatalog import skycatalog
+import unittest
+
+class Testfitting(unittest.TestCase):
+
+	def setUp(self):
+		#LAWD 37 like lenses passing sources at a range of
+		#impact parameters
+		rng = np.random.RandomState(42)
+		n = 200
+		self.lenses = skycatalog(ra=np.full(n,176.4549073),dec=np.full(n,-64.84295714),
+			epoch=2015.0,pmra=np.full(n,2662.03572627),pmdec=np.full(n,-345.18255501),
+			parallax=np.full(n,215.782333))
+		#sources on the lens path in 2019 with offsets across it
+		ra,dec = self.lenses.getRaDecNoPlx(2019.5)
+		self.sources = skycatalog(ra=ra + rng.uniform(-300.0,300.0,n) / 3.6e6 / np.cos(np.deg2rad(dec)),
+			dec=dec + rng.uniform(-300.0,300.0,n) / 3.6e6,epoch=2015.0)
+		self.truth = np.stack((rng.normal(0.0,2.0,n),rng.normal(0.0,2.0,n),
+			rng.normal(-5.0,3.0,n),rng.normal(2.0,3.0,n),rng.uniform(0.2,2.0,n),
+			rng.uniform(0.4,1.0,n)),axis=-1)
+		self.epochs = np.linspace(2017.0,2022.0,120)
+		self.data = ft.prepare(self.lenses,self.sources,self.epochs)
+		self.rng = rng
+
+	def test_thetaE2(self):
+		self.assertAlmostEqual(ft.thetaE2(0.65,215.782333),
+			m.get_enstien_R(0.65,m.get_dist(215.782333))**2)
+
+	def test_jacobian(self):
+		params = self.truth[:5]
+		data = dict((k,v[:5]) for k,v in self.data.items())
+		xi,eta,jac = ft.model(params,data,jacobian=True)
+		for i,h in enumerate((1e-3,1e-3,1e-3,1e-3,1e-4,1e-6)):
+			dp = np.zeros(6)
+			dp[i] = h
+			xiP,etaP = ft.model(params + dp,data)
+			xiM,etaM = ft.model(params - dp,data)
+			np.testing.assert_allclose(jac[...,0,i],(xiP - xiM) / (2 * h),rtol=1e-5,atol=1e-6)
+			np.testing.assert_allclose(jac[...,1,i],(etaP - etaM) / (2 * h),rtol=1e-5,atol=1e-6)
+
+	def test_recovery(self):
+		sigma = 0.1
+		xi,eta = ft.model(self.truth,self.data)
+		xi = xi + self.rng.normal(0.0,sigma,xi.shape)
+		eta = eta + self.rng.normal(0.0,sigma,eta.shape)
+		#some missing observations
+		xi[::7,::5] = np.nan
+
+		start = time.time()
+		fit = ft.fitEvents(self.lenses,self.sources,self.epochs,xi,eta,sigma=sigma,mass=0.5)
+		self.assertLess(time.time() - start,10.0)
+
+		self.assertTrue(fit['converged'].all())
+		pull = (fit['params'] - self.truth) / fit['errors']
+		#fitted values agree with the truth within their errors
+		self.assertLess(np.abs(pull).max(),5.0)
+		self.assertLess(abs(np.std(pull[:,5]) - 1.0),0.3)
+		nObs = 2 * np.sum(~np.isnan(xi))
+		self.assertLess(abs(fit['chi2'].sum() / (nObs - 6 * len(xi)) - 1.0),0.1)
+		np.testing.assert_allclose(fit['ra'],self.sources.ra_0,atol=1e-5)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import lightcurve as lc
+from skycatalog import skycatalog
+from skyobj import skyobj
+import unittest
+
+class Testlightcurve(unittest.TestCase):
+
+	def setUp(self):
+		#LAWD 37 and its 2019 source, dark and luminous
+		self.lens = skyobj(id=1,ra=176.4549073,dec=-64.84295714,pmra=2662.03572627,
+			pmdec=-345.18255501,parallax=215.782333,epoch=2015.0)
+		self.source = skyobj(id=2,ra=176.46360456,dec=-64.84329779,pmra=-19.5,
+			pmdec=-17.89999962,epoch=2015.0,Gmag=18.9)
+		self.lenses = skycatalog(id=[1,3],ra=[176.4549073]*2,dec=[-64.84295714]*2,
+			epoch=2015.0,pmra=[2662.03572627]*2,pmdec=[-345.18255501]*2,
+			parallax=[215.782333]*2,Gmag=[np.nan,18.9])
+		self.sources = skycatalog.fromSkyobjs([self.source])
+		self.epochs = np.linspace(2019.5,2020.2,50)
+
+	def test_matches_trajectory(self):
+		sep,mag = lc.lightCurves(self.lenses,self.sources.take([0,0]),self.epochs,0.65)
+		self.assertEqual(mag.shape,(2,50))
+		track = self.lens.trajectory(self.epochs,self.source,lensMass=0.65)
+		np.testing.assert_allclose(sep[0],track['sep'],rtol=1e-10)
+		np.testing.assert_allclose(mag[0],track['magnification'],rtol=1e-10)
+		#an equally bright lens halves the excess
+		np.testing.assert_allclose(mag[1] - 1.0,0.5 * (mag[0] - 1.0),rtol=1e-10)
+
+	def test_chunks(self):
+		lensIdx = np.array([0,1,0,1,0])
+		sourceIdx = np.zeros(5,dtype=int)
+		masses = np.array([0.5,0.6,0.7,0.8,0.9])
+		sep,mag = lc.lightCurves(self.lenses.take(lensIdx),self.sources.take(sourceIdx),
+			self.epochs,masses)
+		chunks = list(lc.iterLightCurves(self.lenses,self.sources,lensIdx,sourceIdx,
+			self.epochs,masses,chunkSize=100))
+		self.assertEqual(len(chunks),3)
+		np.testing.assert_allclose(np.concatenate([c[2] for c in chunks]),mag)
+
+		tmp = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmp,'curves.csv')
+			nRows = lc.writeLightCurves(path,self.lenses,self.sources,lensIdx,sourceIdx,
+				self.epochs,masses,chunkSize=100)
+			self.assertEqual(nRows,250)
+			curves = np.genfromtxt(path,delimiter=',',names=True)
+			self.assertEqual(len(curves),250)
+			self.assertEqual(list(curves['lens_id'][:2]),[1,1])
+			self.assertEqual(curves['lens_id'][50],3)
+			np.testing.assert_allclose(curves['magnification'],mag.ravel(),rtol=1e-6)
+			np.testing.assert_allclose(curves['dmag'],-2.5 * np.log10(mag.ravel()),atol=2e-6)
+		finally:
+			shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,3 +1,4 @@
+import numpy as np
 import microlens as m
 import unittest
 
@@ -82,5 +83,60 @@ class TestmicroLens(unittest.TestCase):
 		self.assertAlmostEqual(m.get_source_centriod_shift(0.75,4.63,280.0),4.630332383)
 		self.assertAlmostEqual(m.get_source_centriod_shift(0.30,50.0,26.0),1.758598849)		
 
+	def test_get_lum_factor(self):
+		self.assertEqual(m.get_lum_factor(),1.0)
+		self.assertEqual(m.get_lum_factor(np.nan,18.0),1.0)
+		self.assertAlmostEqual(m.get_lum_factor(15.0,17.5),11.0)
+
+	def test_get_event_table(self):
+		#dark and luminous lenses in one table
+		lensMag = np.array([np.nan,15.3,17.6])
+		sourceMag = np.array([18.0,18.5,16.2])
+		lensMass = np.array([0.3,0.5])[:,None]
+		lensDist = np.array([57.7,57.7,169.3])
+		minSep = np.array([69.6,69.6,124.9])
+		table = m.get_event_table(lensMass,lensDist,minSep,lensMag=lensMag,
+			sourceMag=sourceMag,lensPmMag=527.0,accuracy=1.025)
+
+		for key in ('enstien_R','centroid_shift','source_centroid_shift','enstien_T','astrometric_T'):
+			self.assertEqual(table[key].shape,(2,3))
+
+		for i in range(2):
+			for j in range(3):
+				mass = lensMass[i,0]
+				mags = {} if j == 0 else {'lensMag' : lensMag[j], 'sourceMag' : sourceMag[j]}
+				self.assertAlmostEqual(table['centroid_shift'][i,j],
+					m.get_centroid_shift(mass,lensDist[j],minSep[j],**mags))
+				self.assertAlmostEqual(table['enstien_R'][i,j],m.get_enstien_R(mass,lensDist[j]))
+				self.assertAlmostEqual(table['source_centroid_shift'][i,j],
+					m.get_source_centriod_shift(mass,lensDist[j],minSep[j]))
+				self.assertAlmostEqual(table['astrometric_T'][i,j],
+					m.get_astrometric_T(mass,lensDist[j],minSep[j],1.025,527.0))
+
+	def test_get_event_table_source_dist(self):
+		table = m.get_event_table(0.3,57.7,69.6,sourceDist=[np.nan,np.inf,1000.0])
+		self.assertEqual(table['enstien_R'][0],table['enstien_R'][1])
+		self.assertAlmostEqual(table['enstien_R'][2],m.get_enstien_R(0.3,57.7,1000.0))
+		self.assertNotIn('enstien_T',table)
+
+	def test_get_magnification(self):
+		thetaE = m.get_enstien_R(0.5,20.0)
+		self.assertAlmostEqual(m.get_magnification(0.5,20.0,thetaE),3.0/np.sqrt(5.0))
+		mag = m.get_magnification(0.5,20.0,np.array([1.0,10.0,1e4])*thetaE)
+		self.assertTrue((np.diff(mag) < 0).all())
+		self.assertAlmostEqual(mag[-1],1.0)
+
+	def test_get_blended_magnification(self):
+		thetaE = m.get_enstien_R(0.5,20.0)
+		A = m.get_magnification(0.5,20.0,thetaE)
+		self.assertAlmostEqual(m.get_blended_magnification(0.5,20.0,thetaE),A)
+		#equal lens and source light halves the excess
+		blended = m.get_blended_magnification(0.5,20.0,thetaE,lensMag=15.0,sourceMag=15.0)
+		self.assertAlmostEqual(blended,0.5 * (A + 1.0))
+		blended = m.get_blended_magnification(0.5,20.0,np.array([thetaE,thetaE]),
+			lensMag=np.array([np.nan,10.0]),sourceMag=18.0)
+		self.assertAlmostEqual(blended[0],A)
+		self.assertLess(blended[1] - 1.0,(A - 1.0) * 1e-3)
+
 if __name__ == '__main__':
         unittest.main()
@@ -0,0 +1,80 @@
+import numpy as np
+import closestApproach as ca
+import pairFinder as pf
+from skycatalog import skycatalog
+import unittest
+
+class TestpairFinder(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.RandomState(42)
+		nLens = 50
+		nSource = 5000
+		#a 1 degree field of fast lenses and slow sources
+		self.lenses = skycatalog(ra=rng.uniform(100.0,101.0,nLens),dec=rng.uniform(-30.0,-29.0,nLens),
+			epoch=2015.5,pmra=rng.normal(0.0,1000.0,nLens),pmdec=rng.normal(0.0,1000.0,nLens),
+			parallax=rng.uniform(10.0,200.0,nLens))
+		self.sources = skycatalog(id=np.arange(nSource)+nLens,ra=rng.uniform(100.0,101.0,nSource),dec=rng.uniform(-30.0,-29.0,nSource),
+			epoch=2015.5,pmra=rng.normal(0.0,5.0,nSource),pmdec=rng.normal(0.0,5.0,nSource),
+			parallax=rng.uniform(0.0,2.0,nSource))
+
+	def test_unitVectors(self):
+		np.testing.assert_allclose(pf.unitVectors(90.0,0.0),[0.0,1.0,0.0],atol=1e-15)
+		np.testing.assert_allclose(pf.unitVectors(0.0,90.0),[0.0,0.0,1.0],atol=1e-15)
+
+	def test_findPairs_brute_force(self):
+		corridor = 2000.0
+		lensIdx,sourceIdx = pf.findPairs(self.lenses,self.sources,corridor=corridor)
+
+		#every pair, kept with the same criterion
+		allLens = np.repeat(np.arange(len(self.lenses)),len(self.sources))
+		allSource = np.tile(np.arange(len(self.sources)),len(self.lenses))
+		linSep = ca.linearMinSep(*ca.relativeMotion(self.lenses,self.sources,allLens,allSource),
+			tStart=ca.GAIA_MISSION[0],tEnd=ca.GAIA_MISSION[1])
+		keep = linSep - self.lenses.parallax[allLens] - self.sources.parallax[allSource] <= corridor
+
+		self.assertGreater(keep.sum(),0)
+		np.testing.assert_array_equal(lensIdx,allLens[keep])
+		np.testing.assert_array_equal(sourceIdx,allSource[keep])
+
+	def test_motion_bins(self):
+		#a fast and a near source get their own bins and
+		#leave the envelope of the others alone
+		self.sources.pmra[0] = 10000.0
+		self.sources.parallax[1] = 768.0
+		#each 0.5" from a lens at the reference epoch
+		self.sources.ra_0[:2] = self.lenses.ra_0[:2]
+		self.sources.dec_0[:2] = self.lenses.dec_0[:2] + 0.5 / 3600.0
+		index = pf.sourceIndex(self.sources,ca.GAIA_MISSION[0],ca.GAIA_MISSION[1])
+		self.assertLessEqual(index.envelope,pf.MOTION_BIN_MIN)
+		self.assertGreater(len(index.bins),2)
+		self.assertEqual(sorted(np.concatenate([rows for rows,tree,env in index.bins])),
+			list(range(len(self.sources))))
+
+		#and are still found, as by brute force
+		corridor = 2000.0
+		lensIdx,sourceIdx = pf.findPairs(self.lenses,self.sources,corridor=corridor,index=index)
+		allLens = np.repeat(np.arange(len(self.lenses)),len(self.sources))
+		allSource = np.tile(np.arange(len(self.sources)),len(self.lenses))
+		linSep = ca.linearMinSep(*ca.relativeMotion(self.lenses,self.sources,allLens,allSource),
+			tStart=ca.GAIA_MISSION[0],tEnd=ca.GAIA_MISSION[1])
+		keep = linSep - self.lenses.parallax[allLens] - self.sources.parallax[allSource] <= corridor
+		self.assertTrue(np.isin([0,1],allSource[keep]).all())
+		np.testing.assert_array_equal(lensIdx,allLens[keep])
+		np.testing.assert_array_equal(sourceIdx,allSource[keep])
+
+	def test_findPairs_same_catalog(self):
+		lensIdx,sourceIdx = pf.findPairs(self.lenses,self.lenses,corridor=1e6)
+		self.assertFalse((lensIdx == sourceIdx).any())
+
+	def test_findPairs_min_dist(self):
+		#the precise closest approach of a found pair
+		#is inside the corridor
+		corridor = 1000.0
+		lensIdx,sourceIdx = pf.findPairs(self.lenses,self.sources,corridor=corridor)
+		minTime,minSep,posAngle = ca.batchMinApproach(self.lenses,self.sources,lensIdx,sourceIdx)
+		self.assertTrue((minSep < corridor + 400.0).all())
+
+
+if __name__ == '__main__':
+	unittest.main()
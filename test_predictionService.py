@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from argparse import Namespace
+import numpy as np
+import candidateSearch as cs
+import catalogIO
+import predictionService as ps
+from skycatalog import skycatalog
+import unittest
+
+class TestpredictionService(unittest.TestCase):
+
+	def setUp(self):
+		#LAWD 37 and its 2019 source, plus a far away pair
+		self.lenses = skycatalog(id=[1,3],ra=[176.4549073,10.0],dec=[-64.84295714,10.0],
+			epoch=2015.0,pmra=[2662.03572627,1000.0],pmdec=[-345.18255501,0.0],
+			parallax=[215.782333,100.0],Gmag=[11.4,np.nan])
+		self.sources = skycatalog(id=[2,4,5],ra=[176.46360456,10.001,200.0],
+			dec=[-64.84329779,10.0,-20.0],epoch=2015.0,pmra=[-19.5,0.0,0.0],
+			pmdec=[-17.89999962,0.0,0.0],parallax=[0.0,0.5,0.5],Gmag=[18.9,np.nan,17.0])
+		self.options = Namespace(start=2014.5,end=2025.1,corridor=1000.0,mass=0.5,
+			min_shift=0.0,epoch=2015.0)
+
+	def query(self,service,queries):
+		#send each list of queries down its own connection
+		async def client(port,lines):
+			reader,writer = await asyncio.open_connection('127.0.0.1',port)
+			for q in lines:
+				writer.write((json.dumps(q) + '\n').encode())
+			await writer.drain()
+			replies = [json.loads(await reader.readline()) for q in lines]
+			writer.close()
+			return replies
+
+		async def session():
+			ready = asyncio.get_running_loop().create_future()
+			server = asyncio.ensure_future(service.serve('127.0.0.1',0,ready))
+			port = await ready
+			replies = []
+			for batch in queries:
+				replies.append(await asyncio.gather(*[client(port,lines) for lines in batch]))
+			server.cancel()
+			return replies
+
+		with service:
+			return asyncio.run(session())
+
+	def test_matches_search(self):
+		service = ps.predictionService(self.lenses,self.sources,self.options)
+		lawd = {'ra' : 176.4549073,'dec' : -64.84295714,'epoch' : 2015.0,
+			'pmra' : 2662.03572627,'pmdec' : -345.18255501,'parallax' : 215.782333,'Gmag' : 11.4}
+		replies = self.query(service,[[[{'id' : 'a','lens_id' : [1,3]}],
+			[{'id' : 'b','lenses' : [lawd]}],[{'id' : 'c','lens_id' : [1]}]]])[0]
+
+		expected = cs.solvePairs(self.lenses,self.sources,np.array([0,1]),np.array([0,1]),
+			self.options)
+		a = replies[0][0]
+		self.assertEqual(a['id'],'a')
+		self.assertEqual([e['source_id'] for e in a['events']],[4,2])
+		for e in a['events']:
+			row = expected[expected['source_id'] == e['source_id']][0]
+			self.assertEqual(e['lens_id'],row['lens_id'])
+			self.assertAlmostEqual(e['t_min'],row['t_min'],places=6)
+			self.assertAlmostEqual(e['min_sep'],row['min_sep'],places=4)
+			self.assertAlmostEqual(e['centroid_shift'],row['centroid_shift'],places=6)
+
+		#the same lens by coordinates
+		b = replies[1][0]['events']
+		self.assertEqual(len(b),1)
+		self.assertEqual(b[0]['lens_id'],-1)
+		self.assertAlmostEqual(b[0]['t_min'],2019.86,places=2)
+
+		#concurrent queries share one batch and lens 1 is
+		#solved once for both of its queries, the same
+		#astrometry without an id is another lens
+		self.assertEqual(service.stats['batches'],1)
+		self.assertEqual(service.stats['solved'],3)
+
+	def test_cache_and_errors(self):
+		service = ps.predictionService(self.lenses,self.sources,self.options)
+		replies = self.query(service,[[[{'id' : 1,'lens_id' : [1],'years' : 6.0}]],
+			[[{'id' : 2,'lens_id' : [1],'years' : 6.0},{'id' : 3,'lens_id' : [7]},
+			{'id' : 4,'lens_id' : [1],'start' : 2010.0},{'stats' : True}]]])
+		first = replies[0][0][0]
+		second,unknown,outside,stats = replies[1][0]
+		self.assertEqual(first['events'],second['events'])
+		self.assertEqual(service.stats['cache_hits'],1)
+		self.assertEqual(service.stats['batches'],1)
+		self.assertIn('unknown lens id 7',unknown['error'])
+		self.assertEqual(unknown['id'],3)
+		self.assertIn('not inside',outside['error'])
+		self.assertEqual(stats['stats']['queries'],2)
+
+	def test_skycat_sources(self):
+		#workers map a skycat directory given by path
+		dir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(dir,'sources')
+			catalogIO.writeCatalog(path,self.sources)
+			service = ps.predictionService(self.lenses,path,self.options)
+			events = self.query(service,[[[{'lens_id' : [1,3]}]]])[0][0][0]['events']
+		finally:
+			shutil.rmtree(dir)
+		self.assertEqual([e['source_id'] for e in events],[4,2])
+
+	def test_cache_size(self):
+		service = ps.predictionService(self.lenses,self.sources,self.options,cacheSize=1)
+		self.query(service,[[[{'lens_id' : [1,3]}]]])
+		self.assertEqual(len(service._cache),1)
+
+if __name__ == '__main__':
+	unittest.main()
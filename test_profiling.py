@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import closestApproach as ca
+import profiling as prof
+import tangentPlaneUtils as tp
+from skyobj import skyobj
+import unittest
+
+class Testprofiling(unittest.TestCase):
+
+	def setUp(self):
+		prof.reset()
+		tp.clearObserverCache()
+
+	def tearDown(self):
+		prof.disable()
+		prof.reset()
+
+	def test_disabled_records_nothing(self):
+		tp.s2tp(10.0,20.0,10.1,20.1)
+		tp.observerPosition(57000.0)
+		prof.count('anything')
+		with prof.timer('stage'):
+			pass
+		self.assertEqual(prof.report(),{'counters' : {},'timers' : {}})
+
+	def test_calls_and_cache_counts(self):
+		prof.enable()
+		for i in range(3):
+			tp.s2tp(10.0,20.0,10.1,20.1)
+		mjd = np.linspace(57000.0,57100.0,tp.OBSERVER_CACHE_MIN_EPOCHS)
+		tp.observerPosition(mjd)
+		tp.observerPosition(mjd)
+		report = prof.report()
+		self.assertEqual(report['timers']['tp.s2tp']['calls'],3)
+		self.assertGreaterEqual(report['timers']['tp.s2tp']['seconds'],0.0)
+		self.assertEqual(report['counters']['tp.observer_cache_miss'],1)
+		self.assertEqual(report['counters']['tp.observer_cache_hit'],1)
+
+	def test_optimizer_evaluations(self):
+		calls = []
+		def sepFunc(t):
+			calls.append(1)
+			return np.abs(t - 2017.3)
+
+		prof.enable()
+		ca.findMinima(sepFunc,2015.0,2020.0)
+		counters = prof.report()['counters']
+		self.assertEqual(counters['ca.sep_evaluations'],len(calls))
+		self.assertEqual(counters['ca.refine_iterations'],len(calls) - 4)
+		self.assertEqual(prof.report()['timers']['ca.findMinima']['calls'],1)
+
+	def test_skyobj_paths(self):
+		lens = skyobj(id=1,ra=176.4549073,dec=-64.84295714,pmra=2662.03572627,
+			pmdec=-345.18255501,parallax=215.7319,epoch=2015.0)
+		source = skyobj(id=2,ra=176.46360456,dec=-64.84329779,pmra=-1.0,pmdec=1.0,
+			parallax=0.5,epoch=2015.0)
+		prof.enable()
+		lens.getMinima(source,2015.0,2020.0)
+		timers = prof.report()['timers']
+		self.assertEqual(timers['skyobj.getMinima']['calls'],1)
+		self.assertIn('ca.findMinima',timers)
+
+	def test_merge_and_json(self):
+		prof.enable()
+		prof.count('a',2)
+		with prof.timer('stage'):
+			pass
+		first = prof.report()
+		total = prof.merge([first,first])
+		self.assertEqual(total['counters']['a'],4)
+		self.assertEqual(total['timers']['stage']['calls'],2)
+
+		tmp = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmp,'profile.json')
+			prof.toJSON(path,total)
+			with open(path) as f:
+				self.assertEqual(json.load(f),total)
+		finally:
+			shutil.rmtree(tmp)
+		self.assertEqual(json.loads(prof.toJSON())['counters']['a'],2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import shutil
+import tempfile
+import numpy as np
+import candidateSearch as cs
+import pairFinder as pf
+import resultStore as rs
+from skycatalog import skycatalog
+import unittest
+
+class TestresultStore(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir,'events.db')
+		rng = np.random.RandomState(7)
+		nL,nS = 100,1500
+		def field(n):
+			return rng.uniform(10.0,10.05,n), rng.uniform(-5.0,-4.95,n)
+		ra,dec = field(nL)
+		self.lenses = skycatalog(id=np.arange(nL),ra=ra,dec=dec,epoch=2016.0,
+			pmra=rng.normal(0.0,500.0,nL),pmdec=rng.normal(0.0,500.0,nL),
+			parallax=rng.uniform(1.0,50.0,nL),Gmag=rng.uniform(10.0,20.0,nL))
+		ra,dec = field(nS)
+		self.sources = skycatalog(id=np.arange(nS)+1000,ra=ra,dec=dec,epoch=2016.0,
+			pmra=rng.normal(0.0,5.0,nS),pmdec=rng.normal(0.0,5.0,nS),
+			parallax=rng.uniform(0.0,1.0,nS))
+		self.options = argparse.Namespace(start=2015.0,end=2020.0,corridor=2000.0,mass=0.5)
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def full(self,lenses,sources):
+		index = pf.sourceIndex(sources,self.options.start,self.options.end)
+		events = cs.searchShard(lenses,sources,index,self.options)
+		return events[np.lexsort((events['source_id'],events['lens_id']))]
+
+	def stored(self,store):
+		events = store.events()
+		return events[np.lexsort((events['source_id'],events['lens_id']))]
+
+	def assertSameEvents(self,a,b):
+		np.testing.assert_array_equal(a['lens_id'],b['lens_id'])
+		np.testing.assert_array_equal(a['source_id'],b['source_id'])
+		np.testing.assert_allclose(a['min_sep'],b['min_sep'])
+		np.testing.assert_allclose(a['centroid_shift'],b['centroid_shift'])
+
+	def test_rowHash(self):
+		h = rs.rowHash(self.sources)
+		self.assertEqual(len(np.unique(h)),len(self.sources))
+		np.testing.assert_array_equal(h,rs.rowHash(self.sources.take(slice(None))))
+		changed = self.sources.take(slice(None))
+		changed.pmra[3] += 1e-9
+		self.assertEqual(np.nonzero(rs.rowHash(changed) != h)[0].tolist(),[3])
+
+	def test_incremental_update(self):
+		with rs.resultStore(self.path) as store:
+			counts = store.update(self.lenses,self.sources,self.options)
+		full = self.full(self.lenses,self.sources)
+		self.assertGreater(len(full),10)
+		self.assertEqual(counts['events'],len(full))
+
+		#nothing changed, nothing recomputed
+		with rs.resultStore(self.path) as store:
+			counts = store.update(self.lenses,self.sources,self.options)
+			self.assertEqual(counts['pairs_recomputed'],0)
+			self.assertSameEvents(self.stored(store),full)
+
+		#move one event's source, drop a lens and add a source
+		ev = full[0]
+		sources = self.sources.take(slice(None))
+		sources.pmra[sources.id == ev['source_id']] += 50.0
+		keep = self.lenses.id != full[-1]['lens_id']
+		lenses = self.lenses.take(keep)
+		newSource = skycatalog(id=[9999],ra=[lenses.ra_0[0]+1e-4],dec=[lenses.dec_0[0]],epoch=2016.0)
+		sources = skycatalog(id=np.append(sources.id,9999),ra=np.append(sources.ra_0,newSource.ra_0),
+			dec=np.append(sources.dec_0,newSource.dec_0),epoch=2016.0,
+			pmra=np.append(sources.pmra,0.0),pmdec=np.append(sources.pmdec,0.0),
+			parallax=np.append(sources.parallax,0.0),Gmag=np.append(sources.gMag,np.nan))
+
+		with rs.resultStore(self.path) as store:
+			counts = store.update(lenses,sources,self.options)
+			self.assertEqual(counts['sources_changed'],2)
+			self.assertEqual(counts['lenses_removed'],1)
+			self.assertLess(counts['pairs_recomputed'],len(full) // 2)
+			self.assertSameEvents(self.stored(store),self.full(lenses,sources))
+			self.assertIn(9999,store.events()['source_id'])
+
+	def test_options_change(self):
+		with rs.resultStore(self.path) as store:
+			store.update(self.lenses,self.sources,self.options)
+			self.options.corridor = 500.0
+			counts = store.update(self.lenses,self.sources,self.options)
+			self.assertEqual(counts['lenses_changed'],len(self.lenses))
+			self.assertSameEvents(self.stored(store),self.full(self.lenses,self.sources))
+
+
+if __name__ == '__main__':
+	unittest.main()
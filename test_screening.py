@@ -0,0 +1,57 @@
+import numpy as np
+import closestApproach as ca
+import microlens as m
+import screening as sc
+from skycatalog import skycatalog
+import unittest
+
+class Testscreening(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.RandomState(11)
+		n = 2000
+		self.lenses = skycatalog(ra=np.full(n,176.4549073),dec=np.full(n,-64.84295714),
+			epoch=2015.0,pmra=rng.normal(0.0,1000.0,n),pmdec=rng.normal(0.0,1000.0,n),
+			parallax=rng.uniform(-5.0,200.0,n))
+		self.sources = skycatalog(ra=176.4549073+rng.uniform(-3.0,3.0,n)/3600.0,
+			dec=-64.84295714+rng.uniform(-3.0,3.0,n)/3600.0,epoch=2015.0,
+			pmra=rng.normal(0.0,5.0,n),pmdec=rng.normal(0.0,5.0,n),
+			parallax=rng.uniform(0.0,2.0,n))
+		self.rows = np.arange(n)
+
+	def test_bounds_are_conservative(self):
+		good = self.lenses.parallax > 0
+		rows = self.rows[good]
+		minTime,minSep,posAngle = ca.batchMinApproach(self.lenses,self.sources,rows,rows,2015.0,2020.0)
+		sepBound = sc.separationLowerBound(self.lenses,self.sources,rows,rows,2015.0,2020.0)
+		self.assertTrue((sepBound <= minSep + 1e-9).all())
+
+		shift = m.get_centroid_shift(1.4,m.get_dist(self.lenses.parallax[rows]),minSep)
+		shiftBound = sc.shiftUpperBound(self.lenses.parallax[rows],sepBound,1.4)
+		self.assertTrue((shiftBound >= shift - 1e-9).all())
+
+	def test_shiftUpperBound_peak(self):
+		thetaE = m.get_enstien_R(1.0,10.0)
+		self.assertAlmostEqual(sc.shiftUpperBound(100.0,0.0,1.0),thetaE/(2.0*np.sqrt(2.0)))
+		self.assertAlmostEqual(sc.shiftUpperBound(100.0,5.0*thetaE,1.0),
+			m.get_centroid_shift(1.0,10.0,5.0*thetaE))
+
+	def test_screenPairs(self):
+		keep,counts = sc.screenPairs(self.lenses,self.sources,self.rows,self.rows,2015.0,2020.0,
+			maxSep=500.0,minShift=0.5)
+		self.assertEqual(counts['pairs'],len(self.rows))
+		self.assertEqual(counts['parallax'],int((self.lenses.parallax <= 0).sum()))
+		self.assertEqual(counts['pairs']-sum(counts[s] for s in sc.STAGES),keep.sum())
+		self.assertGreater(counts['separation'],0)
+		self.assertGreater(counts['shift'],0)
+
+		#no survivor of the full solve is screened out
+		rows = self.rows[self.lenses.parallax > 0]
+		minTime,minSep,posAngle = ca.batchMinApproach(self.lenses,self.sources,rows,rows,2015.0,2020.0)
+		shift = m.get_centroid_shift(sc.MAX_MASS,m.get_dist(self.lenses.parallax[rows]),minSep)
+		passed = rows[(minSep <= 500.0) & (shift >= 0.5)]
+		self.assertTrue(keep[passed].all())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,68 @@
+import os
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+import candidateSearch as cs
+import sharedPool as sp
+from skycatalog import skycatalog
+import unittest
+
+def _crash(spec):
+	sp.attach(spec)
+	os._exit(1)
+
+class TestsharedPool(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.RandomState(5)
+		n = 50
+		self.lenses = skycatalog(id=np.arange(n)+100,ra=176.4549073+rng.uniform(-0.1,0.1,n),
+			dec=-64.84295714+rng.uniform(-0.1,0.1,n),epoch=2015.0,
+			pmra=rng.normal(0.0,500.0,n),pmdec=rng.normal(0.0,500.0,n),
+			parallax=rng.uniform(1.0,200.0,n),Gmag=np.where(rng.rand(n) < 0.5,np.nan,12.0))
+		self.sources = skycatalog(ra=176.4549073+rng.uniform(-0.1,0.1,n),
+			dec=-64.84295714+rng.uniform(-0.1,0.1,n),epoch=2015.0,
+			pmra=rng.normal(0.0,5.0,n),pmdec=rng.normal(0.0,5.0,n),
+			parallax=rng.uniform(0.0,2.0,n),Gmag=18.0)
+		self.lensIdx = rng.randint(0,n,120)
+		self.sourceIdx = rng.randint(0,n,120)
+		self.options = Namespace(start=2015.0,end=2020.0,mass=0.5)
+
+	def test_matches_solvePairs(self):
+		events = sp.solvePairs(self.lenses,self.sources,self.lensIdx,self.sourceIdx,
+			self.options,workers=2,chunkSize=25)
+		expected = cs.solvePairs(self.lenses,self.sources,self.lensIdx,self.sourceIdx,self.options)
+		self.assertEqual(events.dtype,expected.dtype)
+		self.assertEqual(list(events['lens_id']),list(expected['lens_id']))
+		np.testing.assert_allclose(events['t_min'],expected['t_min'])
+		np.testing.assert_allclose(events['centroid_shift'],expected['centroid_shift'])
+
+		empty = sp.solvePairs(self.lenses,self.sources,[],[],self.options,workers=1)
+		self.assertEqual(len(empty),0)
+
+	def test_attachCatalog(self):
+		with sp.sharedArrays() as shared:
+			specs = shared.shareCatalog(self.lenses)
+			blocks,cat = sp.attachCatalog(specs)
+			self.assertEqual(list(cat.id),list(self.lenses.id))
+			np.testing.assert_array_equal(cat.gMag,self.lenses.gMag)
+			np.testing.assert_array_equal(cat.getXiEta(2017.0)[0],self.lenses.getXiEta(2017.0)[0])
+			del cat
+			for block in blocks:
+				block.close()
+
+	def test_unlinked_after_crash(self):
+		with self.assertRaises(BrokenProcessPool):
+			with sp.sharedArrays() as shared:
+				spec = shared.share(np.arange(10))
+				names = [block.name for block in shared.blocks]
+				with ProcessPoolExecutor(max_workers=1) as pool:
+					pool.submit(_crash,spec).result()
+		for name in names:
+			with self.assertRaises(FileNotFoundError):
+				shared_memory.SharedMemory(name=name)
+
+if __name__ == '__main__':
+	unittest.main()
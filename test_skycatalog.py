@@ -0,0 +1,75 @@
+import numpy as np
+from skyobj import skyobj
+from skycatalog import skycatalog
+import unittest
+
+class Testskycatalog(unittest.TestCase):
+
+	def setUp(self):
+		self.lens = skyobj(id=1,ra=176.4549073,dec=-64.84295714,pmra=2662.03572627,
+			pmdec=-345.18255501,parallax=215.782333,epoch=2015.0)
+		self.source = skyobj(id=2,ra=176.46360456,dec=-64.84329779,pmra=-19.5,
+			pmdec=-17.89999962,parallax=1.2,epoch=2015.5)
+		self.cat = skycatalog.fromSkyobjs([self.lens,self.source])
+		self.epochs = np.array([2014.0,2017.3,2019.9])
+
+	def test_missing_values(self):
+		cat = skycatalog(ra=[30.0,40.0],dec=[60.0,50.0],epoch=2015.0,pmra=[np.nan,1.0])
+		self.assertEqual(cat.pmra[0],0.0)
+		self.assertEqual(cat.pmdec[1],0.0)
+		self.assertEqual(cat.parallax[1],0.0)
+		self.assertTrue(np.isnan(cat.gMag).all())
+		self.assertEqual(cat.epoch_0[1],2015.0)
+
+	def test_rowsOf(self):
+		cat = skycatalog(id=[5,7,9],ra=[0.0,1.0,2.0],dec=[0.0,0.0,0.0],epoch=2015.0)
+		self.assertEqual(list(cat.rowsOf([9,5,7])),[2,0,1])
+		self.assertEqual(cat.rowsOf(7),1)
+		with self.assertRaises(ValueError):
+			cat.rowsOf([7,8,100])
+		#an empty catalog has no ids
+		empty = cat.take(slice(0,0))
+		self.assertEqual(len(empty.rowsOf([])),0)
+		with self.assertRaises(ValueError):
+			empty.rowsOf([5])
+
+	def test_getObj(self):
+		obj = self.cat.getObj(0)
+		self.assertEqual(obj.id,1)
+		self.assertEqual(obj.pmra,self.lens.pmra)
+		self.assertIsNone(obj.gMag)
+
+	def test_getXiEta(self):
+		xi,eta = self.cat.getXiEta(self.epochs)
+		self.assertEqual(xi.shape,(2,3))
+		for i,obj in enumerate([self.lens,self.source]):
+			for j,t in enumerate(self.epochs):
+				x,e = obj.getXiEta(t)
+				self.assertAlmostEqual(xi[i,j],x)
+				self.assertAlmostEqual(eta[i,j],e)
+
+	def test_getRaDec(self):
+		ra,dec = self.cat.getRaDec(2019.9)
+		for i,obj in enumerate([self.lens,self.source]):
+			r,d = obj.getRaDec(2019.9)
+			self.assertAlmostEqual(ra[i],r)
+			self.assertAlmostEqual(dec[i],d)
+
+	def test_getRaDecNoPlx(self):
+		ra,dec = self.cat.getRaDecNoPlx(self.epochs)
+		r,d = self.lens.getRaDecNoPlx(self.epochs[1])
+		self.assertAlmostEqual(ra[0,1],r)
+		self.assertAlmostEqual(dec[0,1],d)
+
+	def test_getSeparation(self):
+		lenses = skycatalog.fromSkyobjs([self.lens])
+		sources = skycatalog.fromSkyobjs([self.source])
+		sep = lenses.getSeparation(self.epochs,sources)
+		for j,t in enumerate(self.epochs):
+			self.assertAlmostEqual(sep[0,j],self.lens.getSeparation(t,self.source))
+		#the source catalog is left untouched
+		self.assertEqual(sources.xi_0[0],0.0)
+
+
+if __name__ == '__main__':
+	unittest.main()
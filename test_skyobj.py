@@ -1,5 +1,8 @@
 import sys
-from skyobj import skyobj
+import subprocess
+import numpy as np
+from skyobj import skyobj, skyobjView, toRecords, TRAJECTORY_DTYPE
+import microlens as m
 import unittest
 
 class Testskyobj(unittest.TestCase):
@@ -45,6 +48,82 @@ class Testskyobj(unittest.TestCase):
 	def test_eta_init(self):
                 self.assertEqual(self.obj2.eta_0,0.0)
 
+	def test_getRaDec_epochs(self):
+		epochs = np.array([2015.0,2016.5,2018.0])
+		ra,dec = self.obj1.getRaDec(epochs)
+		for i,epoch in enumerate(epochs):
+			self.assertAlmostEqual(ra[i],self.obj1.getRaDec(epoch)[0])
+			self.assertAlmostEqual(dec[i],self.obj1.getRaDec(epoch)[1])
+
+	def test_getSeparation_no_side_effects(self):
+		lens = skyobj(1,30.0,60.0,2015.0,1000.0,-500.0,100.0)
+		sep = lens.getSeparation(2016.0,self.obj1)
+		self.assertEqual(self.obj1.xi_0,0.0)
+		self.assertEqual(self.obj1.eta_0,0.0)
+		context = lens.getContext(self.obj1)
+		self.assertEqual(lens.getSeparation(2016.0,self.obj1,context),sep)
+		self.assertRaises(ValueError,lens.getSeparation,2016.0,self.obj2,context)
+
+	#one source shared by many lenses across threads
+	def test_getSeparation_threads(self):
+		from concurrent.futures import ThreadPoolExecutor
+		lenses = [skyobj(i,30.0+0.001*i,60.0,2015.0,1000.0,-500.0,100.0) for i in range(16)]
+		epochs = np.linspace(2015.0,2020.0,101)
+		serial = [lens.getSeparation(epochs,self.obj1) for lens in lenses]
+		with ThreadPoolExecutor(4) as pool:
+			threaded = list(pool.map(lambda lens: lens.getSeparation(epochs,self.obj1),lenses))
+		for a,b in zip(serial,threaded):
+			np.testing.assert_array_equal(a,b)
+
+	def test_slots(self):
+		self.assertFalse(hasattr(self.obj1,'__dict__'))
+
+	def test_skyobjView(self):
+		records = toRecords([self.obj1,self.obj2])
+		view1,view2 = skyobjView.views(records)
+		self.assertFalse(hasattr(view1,'__dict__'))
+		for name in ('id','ra_0','dec_0','epoch_0','pmra','pmdec','parallax','xi_0','eta_0'):
+			self.assertEqual(getattr(view1,name),getattr(self.obj1,name))
+		self.assertIsNone(view2.gMag)
+		self.assertEqual(view1.getXiEta(2016.3),self.obj1.getXiEta(2016.3))
+		self.assertEqual(view1.getSeparation(2016.3,view2),self.obj1.getSeparation(2016.3,self.obj2))
+		#attributes write through to the shared array
+		view2.pmra = 5.0
+		view2.gMag = 17.0
+		self.assertEqual(records['pmra'][1],5.0)
+		self.assertEqual(skyobjView(records,1).gMag,17.0)
+
+	def test_trajectory(self):
+		lens = skyobj(1,30.0,60.0,2015.0,1000.0,-500.0,100.0,Gmag=12.0)
+		source = skyobj(2,30.0003,59.9999,2015.0,2.0,1.0,0.5,Gmag=17.0)
+		epochs = np.linspace(2015.0,2017.0,11)
+		track = lens.trajectory(epochs,source,lensMass=0.6)
+		for i,t in enumerate(epochs):
+			ra,dec = lens.getRaDec(t)
+			self.assertAlmostEqual(track['ra'][i],ra)
+			self.assertAlmostEqual(track['dec'][i],dec)
+			self.assertAlmostEqual(track['sep'][i],lens.getSeparation(t,source))
+			self.assertAlmostEqual(track['shift'][i],
+				lens.getCentriodShift_at(source,0.6,track['sep'][i]))
+		self.assertAlmostEqual(track['magnification'][0],
+			m.get_blended_magnification(0.6,10.0,track['sep'][0],lensMag=12.0,sourceMag=17.0))
+		#a luminous lens dilutes the magnification
+		self.assertLess(track['magnification'][0],m.get_magnification(0.6,10.0,track['sep'][0]))
+
+		#a preallocated output is filled in place
+		out = np.zeros(11,dtype=TRAJECTORY_DTYPE)
+		self.assertIs(lens.trajectory(epochs,out=out),out)
+		np.testing.assert_array_equal(out['xi'],track['xi'])
+		self.assertTrue(np.isnan(out['sep']).all())
+		self.assertRaises(ValueError,lens.trajectory,epochs,out=np.zeros(3,dtype=TRAJECTORY_DTYPE))
+
+	#importing skyobj should be quiet and cheap
+	def test_import_side_effects(self):
+		out = subprocess.check_output([sys.executable,'-c','import sys, skyobj; '
+			'print([k for k in ("astropy","scipy","matplotlib") if k in sys.modules])'],
+			universal_newlines=True)
+		self.assertEqual(out.strip(),'[]')
+
 
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import shutil
+import tempfile
+import numpy as np
+import catalogIO
+import candidateSearch as cs
+import pairFinder as pf
+import streamSearch as ss
+from skycatalog import skycatalog
+import unittest
+
+class TeststreamSearch(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		rng = np.random.RandomState(5)
+		#a 0.05 degree field across ra=0, split into
+		#narrow zones so pairs cross chunk edges
+		nL,nS = 300,3000
+		def field(n):
+			return rng.uniform(-0.025,0.025,n) % 360.0, rng.uniform(-0.025,0.025,n)
+		ra,dec = field(nL)
+		self.lenses = skycatalog(id=np.arange(nL),ra=ra,dec=dec,epoch=2016.0,
+			pmra=rng.normal(0.0,500.0,nL),pmdec=rng.normal(0.0,500.0,nL),
+			parallax=rng.uniform(-1.0,50.0,nL),Gmag=rng.uniform(10.0,20.0,nL))
+		ra,dec = field(nS)
+		self.sources = skycatalog(id=np.arange(nS)+nL,ra=ra,dec=dec,epoch=2016.0,
+			pmra=rng.normal(0.0,5.0,nS),pmdec=rng.normal(0.0,5.0,nS),
+			parallax=rng.uniform(0.0,1.0,nS),Gmag=rng.uniform(15.0,21.0,nS))
+		catalogIO.writeCatalog(os.path.join(self.dir,'lenses'),self.lenses,zoneHeight=0.01)
+		catalogIO.writeCatalog(os.path.join(self.dir,'sources'),self.sources,zoneHeight=0.01)
+		self.options = argparse.Namespace(start=2015.0,end=2020.0,corridor=2000.0,mass=0.5)
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def open(self):
+		return (catalogIO.mappedCatalog(os.path.join(self.dir,'lenses')),
+			catalogIO.mappedCatalog(os.path.join(self.dir,'sources')))
+
+	def test_chunks_match_full_search(self):
+		lenses = self.lenses.take(self.lenses.parallax > 0)
+		index = pf.sourceIndex(self.sources,self.options.start,self.options.end)
+		full = cs.searchShard(lenses,self.sources,index,self.options)
+		self.assertGreater(len(full),10)
+
+		mappedL,mappedS = self.open()
+		chunks = list(ss.iterChunks(mappedL,mappedS,2015.0,2020.0,2000.0,chunkSize=7))
+		self.assertGreater(len(chunks),20)
+		#lenses are split into disjoint chunks
+		allRows = np.concatenate([l for l,s in chunks])
+		self.assertEqual(len(allRows),len(self.lenses))
+		self.assertEqual(len(np.unique(allRows)),len(self.lenses))
+
+		streamed = np.concatenate(list(ss.streamEvents(mappedL,mappedS,self.options,chunkSize=7)))
+		key = lambda e: sorted(zip(e['lens_id'],e['source_id']))
+		self.assertEqual(key(streamed),key(full))
+		order = np.lexsort((full['source_id'],full['lens_id']))
+		sOrder = np.lexsort((streamed['source_id'],streamed['lens_id']))
+		np.testing.assert_allclose(streamed['min_sep'][sOrder],full['min_sep'][order])
+
+	def test_maxSources_splits(self):
+		mappedL,mappedS = self.open()
+		for lensRows,sourceRows in ss.iterChunks(mappedL,mappedS,2015.0,2020.0,2000.0,
+				chunkSize=50,maxSources=100):
+			self.assertTrue(len(sourceRows) <= 100 or len(lensRows) == 1)
+
+	def test_main(self):
+		output = os.path.join(self.dir,'out.csv')
+		ss.main([os.path.join(self.dir,'lenses'),os.path.join(self.dir,'sources'),
+			'-o',output,'--start','2015','--end','2020','--corridor','2000',
+			'--chunk-size','11'])
+		events = np.genfromtxt(output,delimiter=',',names=True)
+		self.assertEqual(events.dtype.names[:2],('lens_id','source_id'))
+		self.assertGreater(len(events),10)
+
+
+if __name__ == '__main__':
+	unittest.main()
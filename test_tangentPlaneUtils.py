@@ -1,3 +1,4 @@
+import numpy as np
 import tangentPlaneUtils as tp
 import unittest
 
@@ -13,5 +14,74 @@ class TesttangentPlaneUtils(unittest.TestCase):
 		self.assertAlmostEqual(tp.tp2s(0.0,0.0,30.0,60.0)[0],30.0)
 		self.assertAlmostEqual(tp.tp2s(0.0,0.0,30.0,60.0)[1],60.0)
 
+	def test_broadcast_round_trip(self):
+		ra = np.array([0.5,120.0,359.9])
+		dec = np.array([-80.0,10.0,45.0])
+		coords = tp.s2tp(ra[:,None]+0.001,dec[:,None]-0.001,ra[:,None],dec[:,None]+np.zeros(4))
+		self.assertEqual(coords.shape,(2,3,4))
+		radec = tp.tp2s(coords[0],coords[1],ra[:,None],dec[:,None])
+		np.testing.assert_allclose(radec[0],np.broadcast_to(ra[:,None]+0.001,(3,4)))
+		np.testing.assert_allclose(radec[1],np.broadcast_to(dec[:,None]-0.001,(3,4)))
+
+	def test_out_and_dtype(self):
+		out = np.empty((2,3))
+		self.assertIs(tp.s2tp([30.0,30.1,30.2],60.0,30.0,60.0,out=out),out)
+		self.assertIs(tp.tp2s(out[0],out[1],30.0,60.0,out=out),out)
+		np.testing.assert_allclose(out[0],[30.0,30.1,30.2])
+		self.assertEqual(tp.s2tp(30.1,60.0,30.0,60.0,dtype=np.float32).dtype,np.float32)
+
+	def test_decimalYear2mjd(self):
+		self.assertEqual(tp.decimalYear2mjd(2000.0),51544.0)
+		self.assertEqual(tp.decimalYear2mjd(2016.5),tp.decimalYear2mjd(2016.0)+183.0)
+
+	# the numpy path against the astropy reference path,
+	# see the note on REFERENCE_EPHEMERIS.
+	def test_reference_ephemeris(self):
+		epochs = np.linspace(1990.0,2040.0,2001)
+		mjd = tp.decimalYear2mjd(epochs,reference=True)
+		self.assertLess(np.abs(tp.decimalYear2mjd(epochs)-mjd).max(),2e-5)
+		self.assertLess(np.abs(tp.RdotW(mjd,176.45)-tp.RdotW(mjd,176.45,reference=True)).max(),2e-6)
+		self.assertLess(np.abs(tp.RdotN(mjd,176.45,-64.8)-
+			tp.RdotN(mjd,176.45,-64.8,reference=True)).max(),2e-6)
+
+	def test_observer_cache(self):
+		tp.clearObserverCache()
+		mjd = tp.decimalYear2mjd(np.linspace(2015.0,2016.0,tp.OBSERVER_CACHE_MIN_EPOCHS))
+		R = tp.observerPosition(mjd)
+		self.assertIs(tp.observerPosition(mjd.copy()),R)
+		self.assertFalse(R.flags.writeable)
+		np.testing.assert_allclose(R,tp.makeR(tp.lSol(mjd),tp.epsilonSol(mjd)))
+		#the reference path is cached separately
+		self.assertIsNot(tp.observerPosition(mjd,reference=True),R)
+		for i in range(tp.OBSERVER_CACHE_SIZE):
+			tp.observerPosition(mjd + i + 1)
+		self.assertEqual(len(tp._observerCache),tp.OBSERVER_CACHE_SIZE)
+		self.assertIsNot(tp.observerPosition(mjd),R)
+
+	def test_observer_cache_bounds(self):
+		tp.clearObserverCache()
+		#short arrays are not cached
+		tp.observerPosition(57000.0)
+		tp.observerPosition(np.arange(3) + 57000.0)
+		self.assertEqual(len(tp._observerCache),0)
+		#the cache holds at most OBSERVER_CACHE_BYTES
+		n = tp.OBSERVER_CACHE_BYTES // (3 * 8) // 3 + 1
+		for i in range(3):
+			tp.observerPosition(np.arange(n) + 57000.0 + i)
+		self.assertEqual(len(tp._observerCache),2)
+		self.assertLessEqual(tp._observerBytes[0],tp.OBSERVER_CACHE_BYTES)
+		self.assertEqual(tp._observerBytes[0],sum(R.nbytes for R in tp._observerCache.values()))
+		tp.clearObserverCache()
+
+	def test_parallaxFactors(self):
+		mjd = tp.decimalYear2mjd(np.linspace(2015.0,2016.0,7))
+		ra = np.array([10.0,176.45,300.0])
+		dec = np.array([-30.0,-64.8,80.0])
+		fW,fN = tp.parallaxFactors(mjd,ra,dec)
+		self.assertEqual(fW.shape,(3,7))
+		for i in range(3):
+			np.testing.assert_allclose(fW[i],tp.RdotW(mjd,ra[i]))
+			np.testing.assert_allclose(fN[i],tp.RdotN(mjd,ra[i],dec[i]))
+
 if __name__ == '__main__':
 	unittest.main()